@@ -0,0 +1,78 @@
+"""Concurrent load test for /chat against a running backend.
+
+Usage:
+    python bench_chat_load.py [--url http://localhost:8000] [--requests 40] [--concurrency 10]
+
+Fires /chat requests from a thread pool while probing /health in the
+background. With a blocking chat pipeline the health probes queue up behind
+model calls; with the async pipeline they stay fast and throughput scales
+with concurrency. Run it against both versions of the server to compare.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def chat(url, i):
+    start = time.perf_counter()
+    response = requests.post(
+        f"{url}/chat",
+        json={"message": f"Load test message {i}: what is a good book?", "user_id": f"load_user_{i % 5}"},
+        timeout=120
+    )
+    return response.status_code, time.perf_counter() - start
+
+
+def probe_health(url, stop, latencies):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(f"{url}/health", timeout=60)
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    health_latencies = []
+    prober = threading.Thread(target=probe_health, args=(args.url, stop, health_latencies), daemon=True)
+    prober.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda i: chat(args.url, i), range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    prober.join()
+
+    latencies = [latency for _, latency in results]
+    errors = sum(1 for status, _ in results if status != 200)
+    print(f"requests:        {args.requests} (concurrency {args.concurrency}, {errors} errors)")
+    print(f"throughput:      {args.requests / elapsed:.2f} req/s")
+    print(f"chat latency:    p50 {statistics.median(latencies):.3f}s  p95 {percentile(latencies, 95):.3f}s")
+    print(f"/health latency: p50 {statistics.median(health_latencies or [0]):.3f}s  "
+          f"max {max(health_latencies or [0]):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Synthetic memory corpora and chat messages for the benchmark suite.
+
+Corpora are deterministic for a given seed. Users are drawn from one of
+``DISTRIBUTIONS``:
+
+- ``uniform``: every user equally likely
+- ``zipf``: a few heavy users and a long tail (weight ``1 / rank``)
+- ``single``: everything belongs to one user
+"""
+import bisect
+import itertools
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from memory_record import conversation_source
+
+DISTRIBUTIONS = ("uniform", "zipf", "single")
+
+TOPICS = [
+    "hiking", "jazz", "python", "coffee", "chess", "gardening", "sushi", "running",
+    "photography", "history", "tennis", "baking", "astronomy", "poetry", "cycling", "yoga",
+]
+CATEGORIES = ["preference", "explicit_remember", "goal", "identity", "dislike"]
+TEMPLATES = [
+    ("preference", "I love {a} and I try to spend time on it every week, especially {b}"),
+    ("preference", "My favorite weekend activity is {a}, followed by some {b}"),
+    ("goal", "I want to get better at {a} this year and maybe start {b}"),
+    ("identity", "I work as a {a} instructor and teach {b} on the side"),
+    ("dislike", "I don't like {a} very much but {b} is fine"),
+    ("explicit_remember", "Remember that my {a} class moved to Thursday after {b}"),
+]
+CHAT_MESSAGES = [
+    "Hi there!",
+    "What's the weather in Chennai today?",
+    "Can you explain how transformers work in simple terms?",
+    "Write a haiku about autumn leaves.",
+    "What are the latest news headlines?",
+    "Translate 'good morning' into Japanese.",
+    "How do I reverse a list in Python?",
+    "Summarize the plot of Dune in three sentences.",
+]
+
+
+def user_picker(users: int, distribution: str, rng: random.Random) -> Callable[[], str]:
+    """Function returning a user id drawn from ``distribution``."""
+    if distribution == "single":
+        return lambda: "user_0"
+    if distribution == "uniform":
+        return lambda: f"user_{rng.randrange(users)}"
+    if distribution == "zipf":
+        cumulative = list(itertools.accumulate(1 / rank for rank in range(1, users + 1)))
+        total = cumulative[-1]
+        return lambda: f"user_{bisect.bisect_left(cumulative, rng.random() * total)}"
+    raise ValueError(f"Unknown distribution: {distribution} (expected one of {', '.join(DISTRIBUTIONS)})")
+
+
+def make_corpus(size: int, users: int, distribution: str = "uniform", seed: int = 0) -> List[Dict[str, object]]:
+    """
+    Build ``size`` stored memories, in the format the storage engines write.
+
+    About one in five is an explicit ``key: value`` memory, the rest are
+    memory-worthy conversation turns.
+    """
+    rng = random.Random(seed)
+    pick_user = user_picker(users, distribution, rng)
+    start = datetime(2025, 1, 1)
+    memories = []
+    for i in range(size):
+        a, b = rng.sample(TOPICS, 2)
+        timestamp = (start + timedelta(seconds=i * 7, microseconds=rng.randrange(1000000))).isoformat()
+        memory_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        if i % 5 == 0:
+            memories.append({
+                "id": memory_id,
+                "content": f"favorite_{a}: {b}",
+                "user_id": pick_user(),
+                "timestamp": timestamp,
+                "source": "Explicit user request",
+                "metadata": {"key": f"favorite_{a}", "type": "explicit"}
+            })
+            continue
+        category, template = rng.choice(TEMPLATES)
+        content = template.format(a=a, b=b)
+        memories.append({
+            "id": memory_id,
+            "content": content,
+            "user_id": pick_user(),
+            "timestamp": timestamp,
+            "source": conversation_source(content),
+            "metadata": {
+                "type": "conversation",
+                "category": category,
+                "assistant_response": f"That's great! {a.title()} sounds like a wonderful way to relax."
+            }
+        })
+    return memories
+
+
+def make_queries(count: int, users: int, distribution: str = "uniform", seed: int = 1) -> List[Tuple[str, str]]:
+    """``(user_id, query)`` pairs, with users drawn like the corpus."""
+    rng = random.Random(seed)
+    pick_user = user_picker(users, distribution, rng)
+    queries = []
+    for _ in range(count):
+        topic = rng.choice(TOPICS)
+        query = rng.choice([f"what do I think about {topic}", f"{topic}", f"do I like {topic} or {rng.choice(TOPICS)}"])
+        queries.append((pick_user(), query))
+    return queries
+
+
+def make_messages(count: int, memory_worthy_fraction: float = 0.3, seed: int = 2) -> List[str]:
+    """Chat messages, about ``memory_worthy_fraction`` of which should be remembered."""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        if rng.random() < memory_worthy_fraction:
+            _, template = rng.choice(TEMPLATES)
+            a, b = rng.sample(TOPICS, 2)
+            messages.append(template.format(a=a, b=b))
+        else:
+            messages.append(rng.choice(CHAT_MESSAGES))
+    return messages
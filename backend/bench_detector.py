@@ -0,0 +1,88 @@
+"""Microbenchmark for memory-worthiness detection.
+
+Usage:
+    python bench_detector.py [--messages 200000]
+
+Compares the original detector (five regex searches over a lowercased copy
+per message) with the compiled single-pass MemoryDetector on a corpus of
+realistic chat messages, and checks both agree on every message.
+"""
+import argparse
+import random
+import re
+import time
+
+from memory_detector import MemoryDetector
+
+CORPUS = [
+    "Hi there!",
+    "What's the weather in Chennai today?",
+    "Can you explain how transformers work in simple terms?",
+    "My name is Alex and I work as a data engineer.",
+    "I love hiking on weekends, especially in the mountains.",
+    "Remember that my sister's birthday is on March 3rd.",
+    "Please summarize this article for me: the economy grew by 2% last quarter...",
+    "I'm trying to learn Spanish before my trip next year.",
+    "Write a haiku about autumn leaves.",
+    "I don't like spicy food at all.",
+    "What are the latest news headlines?",
+    "Translate 'good morning' into Japanese.",
+    "My favorite band is Coldplay.",
+    "How do I reverse a linked list in Python?",
+    "Thanks, that was helpful!",
+    "I always drink coffee before 9am.",
+    "Give me three ideas for a birthday gift under $50.",
+    "Keep in mind that I'm vegetarian when suggesting recipes.",
+    "Who won the football match yesterday?",
+    "Can you recommend a good science fiction book? " * 3,
+]
+
+LEGACY_PATTERNS = [
+    r'\b(i like|i love|i prefer|my favorite|i enjoy)\b',
+    r'\b(remember|don\'t forget|keep in mind|note that)\b',
+    r'\b(i want to|i\'m trying to|i always|i never|my goal)\b',
+    r'\b(my name is|i am|i work as|i live in|i\'m from)\b',
+    r'\b(i hate|i dislike|i don\'t like)\b',
+]
+
+
+def legacy_detect(message: str) -> bool:
+    """The original MemoryManager._detect_memory_worthy_content."""
+    message_lower = message.lower()
+    for pattern in LEGACY_PATTERNS:
+        if re.search(pattern, message_lower):
+            return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = [rng.choice(CORPUS) for _ in range(args.messages)]
+    detector = MemoryDetector()
+
+    mismatches = [m for m in CORPUS if legacy_detect(m) != (detector.detect(m) is not None)]
+    if mismatches:
+        print(f"WARNING: detectors disagree on {len(mismatches)} messages: {mismatches}")
+
+    start = time.perf_counter()
+    for message in messages:
+        legacy_detect(message)
+    legacy = (time.perf_counter() - start) / len(messages)
+
+    start = time.perf_counter()
+    for message in messages:
+        detector.detect(message)
+    compiled = (time.perf_counter() - start) / len(messages)
+
+    worthy = sum(1 for m in CORPUS if detector.detect(m))
+    print(f"{len(messages)} messages ({worthy}/{len(CORPUS)} corpus messages are memory-worthy)")
+    print(f"legacy:   {legacy * 1e6:.2f} us/message")
+    print(f"compiled: {compiled * 1e6:.2f} us/message ({legacy / compiled:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Deterministic local stand-ins for Gemini and Tavily, for offline benchmarks.
+
+``FakeGenerativeModel`` mimics the parts of ``genai.GenerativeModel`` the
+backend uses (``start_chat`` / ``send_message_async`` with tools and
+streaming, ``generate_content_async``); ``FakeTavilyClient`` mimics
+``TavilyClient.search``. Both answer after a configurable latency and can
+inject 429 errors, and both derive their output from the request text, so
+a run is reproducible.
+
+``install()`` swaps them in before the app starts::
+
+    import bench_fakes
+    bench_fakes.install(FakeConfig(latency_ms=300, rate_limit_probability=0.05))
+    import main  # ConversationHandler now builds FakeGenerativeModel
+"""
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+P = genai.protos
+
+# Messages mentioning these make the fake model call search_web first
+SEARCH_TRIGGERS = ("weather", "news", "latest", "price", "score", "today")
+
+WORDS = (
+    "sure happy help that sounds great idea remember you mentioned before "
+    "here some thoughts let me know more about what like best"
+).split()
+
+
+@dataclass
+class FakeConfig:
+    """Behaviour of the fake backends."""
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    search_latency_ms: float = 300.0
+    rate_limit_probability: float = 0.0
+    search_error_probability: float = 0.0
+    stream_chunks: int = 4
+    response_words: int = 40
+    seed: int = 0
+
+
+class _Random:
+    """Seeded RNG shared by all fakes, safe to use from worker threads."""
+
+    def __init__(self, seed: int):
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+
+def _digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _reply_text(prompt: str, words: int) -> str:
+    rng = random.Random(_digest(prompt))
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return " ".join(part.text for part in content.parts if part.text)
+
+
+class FakeResponse:
+    """The subset of ``GenerateContentResponse`` the backend reads."""
+
+    def __init__(self, content: "P.Content"):
+        self.candidates = [P.Candidate(content=content)]
+        self.parts = content.parts
+
+    @property
+    def text(self) -> str:
+        return "".join(part.text for part in self.parts if part.text)
+
+
+class FakeStream:
+    """Async iterator of response chunks, like a streamed response."""
+
+    def __init__(self, chunks: List[FakeResponse], delay: float):
+        self._chunks = chunks
+        self._delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self._chunks:
+            await asyncio.sleep(self._delay)
+            yield chunk
+
+
+class FakeChatSession:
+    """Chat with a ``history`` list of ``protos.Content``, like ``genai.ChatSession``."""
+
+    def __init__(self, model: "FakeGenerativeModel", history: Optional[list] = None):
+        self.model = model
+        self.history = list(history or [])
+
+    async def send_message_async(self, content: Any, *, stream: bool = False, tool_config: Any = None, **kwargs):
+        if isinstance(content, str):
+            message = P.Content(role="user", parts=[P.Part(text=content)])
+        else:
+            message = P.Content(role=content.role or "user", parts=content.parts)
+
+        await self.model._wait()
+        reply = self.model._reply(message, tools_allowed=self.model.tools_enabled and tool_config is None)
+        self.history.extend([message, reply])
+
+        if not stream:
+            return FakeResponse(reply)
+        text = reply.parts[0].text
+        if not text:
+            return FakeStream([FakeResponse(reply)], 0.0)
+        n = max(1, self.model.config.stream_chunks)
+        size = -(-len(text) // n)
+        chunks = [
+            FakeResponse(P.Content(role="model", parts=[P.Part(text=text[i:i + size])]))
+            for i in range(0, len(text), size)
+        ]
+        return FakeStream(chunks, self.model.config.latency_ms / 1000 / n / 4)
+
+
+class FakeGenerativeModel:
+    """Stand-in for ``genai.GenerativeModel``."""
+
+    config = FakeConfig()
+    _random = _Random(0)
+    calls = 0
+    rate_limited = 0
+
+    def __init__(self, model_name: str = "fake", tools: Any = None, system_instruction: Any = None, **kwargs):
+        self.model_name = model_name
+        self.tools_enabled = bool(tools)
+
+    async def _wait(self) -> None:
+        cls = FakeGenerativeModel
+        cls.calls += 1
+        if self._random.random() < self.config.rate_limit_probability:
+            cls.rate_limited += 1
+            await asyncio.sleep(0.005)
+            raise google_exceptions.ResourceExhausted("429 Resource has been exhausted (fake quota)")
+        jitter = (self._random.random() * 2 - 1) * self.config.jitter_ms
+        await asyncio.sleep(max(0.0, self.config.latency_ms + jitter) / 1000)
+
+    def _reply(self, message: "P.Content", tools_allowed: bool) -> "P.Content":
+        text = _text_of(message)
+        if tools_allowed and text and any(word in text.lower() for word in SEARCH_TRIGGERS):
+            call = P.FunctionCall(name="search_web", args={"query": text.splitlines()[-1][-80:]})
+            return P.Content(role="model", parts=[P.Part(function_call=call)])
+        if not text:
+            # Function responses: answer from the search results
+            text = " ".join(str(part.function_response.response) for part in message.parts)
+        return P.Content(role="model", parts=[P.Part(text=_reply_text(text, self.config.response_words))])
+
+    def start_chat(self, history: Optional[list] = None, **kwargs) -> FakeChatSession:
+        return FakeChatSession(self, history)
+
+    async def generate_content_async(self, prompt: Any, **kwargs) -> FakeResponse:
+        await self._wait()
+        text = _reply_text(_text_of(prompt), self.config.response_words // 2)
+        return FakeResponse(P.Content(role="model", parts=[P.Part(text=text)]))
+
+
+class FakeTavilyClient:
+    """Stand-in for ``tavily.TavilyClient``; blocking, like the real client."""
+
+    config = FakeConfig()
+    _random = _Random(1)
+    calls = 0
+
+    def __init__(self, api_key: Optional[str] = None, **kwargs):
+        pass
+
+    def search(self, query: str, max_results: int = 5, search_depth: str = "basic", **kwargs) -> Dict[str, Any]:
+        FakeTavilyClient.calls += 1
+        if self._random.random() < self.config.search_error_probability:
+            raise RuntimeError("429 Too Many Requests (fake)")
+        time.sleep(self.config.search_latency_ms / 1000)
+        return {
+            "results": [
+                {
+                    "title": f"Result {i} for {query}",
+                    "content": _reply_text(f"{query}:{i}", 25),
+                    "url": f"https://example.com/{_digest(query) % 10000}/{i}"
+                }
+                for i in range(1, max_results + 1)
+            ]
+        }
+
+
+def install(config: Optional[FakeConfig] = None) -> None:
+    """
+    Route Gemini and Tavily calls to the fakes.
+
+    Call before the app's lifespan starts (``ConversationHandler`` builds its
+    models then); the already-created web search client is replaced too.
+    """
+    config = config or FakeConfig()
+    FakeGenerativeModel.config = config
+    FakeGenerativeModel._random = _Random(config.seed)
+    FakeTavilyClient.config = config
+    FakeTavilyClient._random = _Random(config.seed + 1)
+
+    genai.configure = lambda *args, **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+
+    import web_search
+    web_search.TavilyClient = FakeTavilyClient
+    web_search.web_search.client = FakeTavilyClient()
+
+
+def stats() -> Dict[str, int]:
+    return {
+        "gemini_calls": FakeGenerativeModel.calls,
+        "gemini_rate_limited": FakeGenerativeModel.rate_limited,
+        "tavily_calls": FakeTavilyClient.calls,
+    }
@@ -0,0 +1,219 @@
+"""End-to-end load test of the FastAPI app with fake Gemini and Tavily backends.
+
+Usage:
+    python bench_load.py [--requests 500] [--concurrency 20]
+                         [--mix chat=6,stream=1,recall=2,remember=1,enhance=1]
+                         [--latency-ms 200] [--rate-limit-probability 0.0]
+                         [--memories 10000] [--users 100] [--distribution zipf]
+                         [--output load.json] [--baseline previous.json]
+
+Runs the real app in-process (full lifespan, middleware, memory store and
+background writer) with Gemini and Tavily replaced by the deterministic
+fakes in bench_fakes.py, so no API keys or network are needed. The store
+is prefilled with a synthetic corpus (bench_corpus.py), then --concurrency
+clients send --requests requests drawn from --mix. Reports p50/p95/p99
+latency and requests per second per endpoint and overall; with --output
+the results are written as JSON (bench_report.py).
+
+Clients share the event loop with the app, so absolute numbers include
+client overhead; compare runs made with the same parameters.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(ENDPOINTS)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+async def _chat(client, user_id, message):
+    return await client.post("/chat", json={"message": message, "user_id": user_id})
+
+
+async def _stream(client, user_id, message):
+    async with client.stream("POST", "/chat/stream", json={"message": message, "user_id": user_id}) as response:
+        body = b"".join([chunk async for chunk in response.aiter_bytes()])
+    if b"event: error" in body:
+        response.status_code = 599
+    return response
+
+
+async def _recall(client, user_id, message):
+    return await client.post("/recall", json={"query": message, "user_id": user_id, "limit": 5})
+
+
+async def _remember(client, user_id, message):
+    return await client.post("/remember", json={"key": "note", "value": message, "user_id": user_id})
+
+
+async def _enhance(client, user_id, message):
+    return await client.post("/enhance", json={"prompt": message})
+
+
+ENDPOINTS = {
+    "chat": _chat,
+    "stream": _stream,
+    "recall": _recall,
+    "remember": _remember,
+    "enhance": _enhance,
+}
+
+
+def configure_environment(args, directory: Path) -> None:
+    """Settings are read at import time, so set them before importing the app."""
+    os.environ.update({
+        "GEMINI_API_KEY": "fake",
+        "TAVILY_API_KEY": "fake",
+        "MEMORY_FILE_PATH": str(directory / "memories.json"),
+        "MEMORY_STORAGE_BACKEND": args.backend,
+        "WEB_SEARCH_CACHE_PATH": "",
+        "GEMINI_MAX_RPS": str(args.gemini_rps),
+        "GEMINI_BURST": str(max(1, int(args.gemini_rps))),
+    })
+
+
+def prefill(args, directory: Path) -> None:
+    from bench_corpus import make_corpus
+    from storage import JSONFileStorage
+    JSONFileStorage(str(directory / "memories.json")).rewrite(
+        make_corpus(args.memories, args.users, args.distribution)
+    )
+
+
+async def run_load(args, plan):
+    import httpx
+    import main
+
+    samples = []
+
+    async def worker(queue):
+        while True:
+            try:
+                endpoint, user_id, message = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await ENDPOINTS[endpoint](client, user_id, message)
+                status = response.status_code
+            except Exception:
+                status = 0
+            samples.append((endpoint, status, time.perf_counter() - start))
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            warmup = asyncio.Queue()
+            for item in plan[:args.warmup]:
+                warmup.put_nowait(item)
+            await asyncio.gather(*(worker(warmup) for _ in range(args.concurrency)))
+            samples.clear()
+
+            queue = asyncio.Queue()
+            for item in plan[args.warmup:]:
+                queue.put_nowait(item)
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(queue) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+
+            server_stats = (await client.get("/stats")).json()
+    return samples, elapsed, server_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--mix", default="chat=6,stream=1,recall=2,remember=1,enhance=1")
+    parser.add_argument("--search-fraction", type=float, default=0.2,
+                        help="share of chat messages that make the model call search_web")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake Gemini latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--search-latency-ms", type=float, default=300.0, help="fake Tavily latency")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0,
+                        help="chance that a Gemini call fails with 429")
+    parser.add_argument("--gemini-rps", type=float, default=1000.0,
+                        help="GEMINI_MAX_RPS for the client-side rate limiter")
+    parser.add_argument("--memories", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--distribution", default="zipf")
+    parser.add_argument("--backend", choices=["json", "log"], default="log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        configure_environment(args, directory)
+        prefill(args, directory)
+
+        import bench_fakes
+        from bench_corpus import make_messages, user_picker
+        from bench_report import finish, summarize
+
+        bench_fakes.install(bench_fakes.FakeConfig(
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            search_latency_ms=args.search_latency_ms,
+            rate_limit_probability=args.rate_limit_probability,
+            seed=args.seed
+        ))
+
+        rng = random.Random(args.seed)
+        pick_user = user_picker(args.users, args.distribution, rng)
+        total = args.warmup + args.requests
+        messages = make_messages(total, seed=args.seed)
+        plan = []
+        for i, message in enumerate(messages):
+            endpoint = rng.choices(list(mix), weights=list(mix.values()))[0]
+            if endpoint in ("chat", "stream") and rng.random() < args.search_fraction:
+                message = f"What's the latest news about {message.split()[-1].strip('.?!')}?"
+            plan.append((endpoint, pick_user(), message))
+
+        samples, elapsed, server_stats = asyncio.run(run_load(args, plan))
+
+    results = []
+    for endpoint in mix:
+        latencies = [latency for name, _, latency in samples if name == endpoint]
+        if not latencies:
+            continue
+        statuses = Counter(status for name, status, _ in samples if name == endpoint)
+        results.append(summarize(
+            f"load/{endpoint}", latencies, elapsed,
+            errors=sum(count for status, count in statuses.items() if status != 200),
+            statuses={str(status): count for status, count in sorted(statuses.items())}
+        ))
+    statuses = Counter(status for _, status, _ in samples)
+    results.append(summarize(
+        "load/all", [latency for _, _, latency in samples], elapsed,
+        errors=sum(count for status, count in statuses.items() if status != 200),
+        concurrency=args.concurrency,
+        **bench_fakes.stats()
+    ))
+
+    print(f"{len(samples)} requests in {elapsed:.2f}s at concurrency {args.concurrency}")
+    scheduler = server_stats.get("gemini_scheduler", {})
+    print(f"gemini: {scheduler.get('calls', 0)} calls, {scheduler.get('rate_limited', 0)} rate limited, "
+          f"{scheduler.get('rejected', 0)} rejected; tools: {server_stats.get('tools', {}).get('rounds', 0)} rounds\n")
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    finish("load", params, results, args.output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
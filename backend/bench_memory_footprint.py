@@ -0,0 +1,96 @@
+"""Measure bytes per memory held by MemoryManager.memories.
+
+Usage:
+    python bench_memory_footprint.py [--memories 1000000] [--users 1000]
+
+Builds a synthetic store (mostly conversation memories, some explicit ones),
+serializes it the way JSONFileStorage does, and measures with tracemalloc
+how much Python heap the loaded list takes as plain dicts and as compact
+MemoryRecord objects. Both representations are checked to be equal.
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+from memory_record import MemoryRecord, conversation_source
+
+TOPICS = ["hiking", "jazz", "python", "coffee", "chess", "gardening", "sushi", "running", "photography", "history"]
+CATEGORIES = ["preference", "explicit_remember", "goal", "identity", "dislike"]
+
+
+def make_memories(count: int, users: int) -> list:
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    memories = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        timestamp = (start + timedelta(seconds=i * 7, microseconds=rng.randrange(1000000))).isoformat()
+        if i % 5:
+            content = f"I love {topic} and I try to spend time on it every week, especially {rng.choice(TOPICS)}"
+            memory = {
+                "id": str(uuid.uuid4()),
+                "content": content,
+                "user_id": f"user_{rng.randrange(users)}",
+                "timestamp": timestamp,
+                "source": conversation_source(content),
+                "metadata": {
+                    "type": "conversation",
+                    "category": rng.choice(CATEGORIES),
+                    "assistant_response": f"That's great! {topic.title()} is a wonderful way to relax."
+                }
+            }
+        else:
+            memory = {
+                "id": str(uuid.uuid4()),
+                "content": f"favorite_{topic}: {rng.choice(TOPICS)}",
+                "user_id": f"user_{rng.randrange(users)}",
+                "timestamp": timestamp,
+                "source": "Explicit user request",
+                "metadata": {"key": f"favorite_{topic}", "type": "explicit"}
+            }
+        memories.append(memory)
+    return memories
+
+
+def traced(build) -> tuple:
+    """Return (result, bytes allocated by ``build`` that are still live)."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--memories", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    args = parser.parse_args()
+
+    text = json.dumps(make_memories(args.memories, args.users))
+    content_bytes = sum(len(m["content"].encode("utf-8")) for m in json.loads(text)) / args.memories
+
+    dicts, dict_size = traced(lambda: json.loads(text))
+
+    def build_records():
+        return [MemoryRecord.from_dict(memory) for memory in json.loads(text)]
+
+    records, record_size = traced(build_records)
+
+    if any(dict(record) != memory for record, memory in zip(records, dicts)):
+        raise SystemExit("FAIL: records differ from the original dicts")
+
+    print(f"{args.memories:,} memories, {args.users} users, {content_bytes:.0f} bytes of content each")
+    print(f"{'dicts':<16}{dict_size / args.memories:>10.0f} bytes/memory {dict_size / 2**20:>10.1f} MB")
+    print(f"{'MemoryRecord':<16}{record_size / args.memories:>10.0f} bytes/memory {record_size / 2**20:>10.1f} MB"
+          f"  ({dict_size / record_size:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Microbenchmarks for the memory pipeline on synthetic corpora.
+
+Usage:
+    python bench_micro.py [--sizes 1000,10000,100000] [--users 100]
+                          [--distributions uniform,zipf] [--backend log]
+                          [--output micro.json] [--baseline previous.json]
+
+For every corpus size and user distribution (see bench_corpus.py) this
+measures, per operation:
+
+- ``load_memories``: ``MemoryManager._load_memories`` reading the store
+- ``startup``: building a ``MemoryManager`` (load plus indexing)
+- ``retrieve_memories/keyword`` and ``/semantic``
+- ``store_memory``: one persisted write at a time
+
+plus ``detect_memory_worthy`` once over a corpus of chat messages. No
+network access or API keys are needed. Results are printed and, with
+--output, written as JSON (see bench_report.py).
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench_corpus import DISTRIBUTIONS, make_corpus, make_messages, make_queries
+from bench_report import finish, summarize
+from memory_manager import MemoryManager
+from storage import create_storage
+
+
+def timed(function, args_list):
+    """Call ``function(*args)`` for each entry; return per-call durations."""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        function(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_size(args, size: int, distribution: str, directory: Path) -> list:
+    tag = f"n={size}/{distribution}"
+    path = directory / f"memories_{size}_{distribution}.json"
+    corpus = make_corpus(size, args.users, distribution, seed=size)
+    storage = create_storage(args.backend, str(path))
+    storage.rewrite(corpus)
+    storage.close()
+    results = []
+
+    def new_manager():
+        return MemoryManager(storage_path=str(path), storage=create_storage(args.backend, str(path)))
+
+    manager = new_manager()
+    results.append(summarize(
+        f"load_memories/{tag}", timed(manager._load_memories, [()] * args.load_repeats),
+        size=size, distribution=distribution
+    ))
+    startup = []
+    for _ in range(args.load_repeats):
+        start = time.perf_counter()
+        new_manager().storage.close()
+        startup.append(time.perf_counter() - start)
+    results.append(summarize(f"startup/{tag}", startup, size=size, distribution=distribution))
+
+    queries = make_queries(args.queries, args.users, distribution, seed=size + 1)
+    for mode in ("keyword", "semantic"):
+        # One untimed pass so lazily built per-user state is not counted
+        for user_id, query in queries[:50]:
+            manager.retrieve_memories(query, user_id=user_id, limit=5, mode=mode)
+        latencies = timed(
+            lambda user_id, query: manager.retrieve_memories(query, user_id=user_id, limit=5, mode=mode),
+            queries
+        )
+        results.append(summarize(f"retrieve_memories/{mode}/{tag}", latencies, size=size, distribution=distribution))
+
+    writes = [(f"I love benchmark write {i}", queries[i % len(queries)][0]) for i in range(args.writes)]
+    latencies = timed(lambda content, user_id: manager.store_memory(content, user_id=user_id), writes)
+    results.append(summarize(f"store_memory/{args.backend}/{tag}", latencies, size=size, distribution=distribution))
+    manager.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--distributions", default="uniform,zipf",
+                        help=f"comma-separated, from: {', '.join(DISTRIBUTIONS)}")
+    parser.add_argument("--backend", choices=["json", "log"], default="log",
+                        help="storage engine for the store_memory writes")
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50000)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    distributions = args.distributions.split(",")
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        empty = MemoryManager(storage_path=str(Path(directory) / "empty.json"))
+        messages = [(message,) for message in make_messages(args.messages)]
+        results.append(summarize(
+            "detect_memory_worthy", timed(empty._detect_memory_worthy_content, messages)
+        ))
+
+        for size in sizes:
+            for distribution in distributions:
+                print(f"... {size} memories, {distribution} users", flush=True)
+                results.extend(bench_size(args, size, distribution, Path(directory)))
+
+    params = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    finish("micro", params, results, args.output, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Evaluate recall ranking quality and latency: BM25 alone against the hybrid ranker.
+
+Usage:
+    python bench_ranking.py [--users 50] [--noise 500] [--limit 5]
+                            [--recency-weight 0.2] [--type-weight 0.15]
+                            [--frequency-weight 0.1] [--half-life-days 30]
+                            [--output ranking.json] [--baseline previous.json]
+
+Each synthetic user stated a preference per category several times, in
+near-identical words, so keyword relevance alone can barely tell the
+versions apart. Which version is correct depends on the category's
+scenario:
+
+- ``recency``: conversation memories of different ages; the newest is right
+- ``type``: one explicit (/remember) memory among conversation ones of similar age
+- ``frequency``: one memory mentioned many times among ones mentioned once
+- ``prefix``: a single matching memory, asked for by a word prefix ("recip")
+
+Every query has one relevant memory, so hit@1, MRR and nDCG@limit are
+reported per ranker and scenario, with per-query latency. Results are
+printed and, with --output, written as JSON (see bench_report.py).
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from math import log2
+
+from bench_report import finish, summarize
+from memory_index import InvertedIndex
+from memory_ranker import HybridRanker
+
+CATEGORIES = [
+    "color", "food", "sport", "city", "book", "movie", "band", "car", "drink",
+    "game", "season", "animal", "language", "dessert", "flower", "holiday",
+]
+VALUES = [
+    "purple", "pizza", "tennis", "chennai", "dune", "inception", "coldplay",
+    "tesla", "coffee", "chess", "winter", "otter", "python", "brownies",
+    "tulip", "diwali", "teal", "sushi", "cricket", "lisbon",
+]
+PREFIXES = {
+    "recipes": "recip", "marathon": "marat", "photography": "photo",
+    "gardening": "garden", "guitar": "guit", "astronomy": "astro",
+}
+FILLER = (
+    "i the a my is and to of in it that was for on you with as have be at "
+    "this we what so like just really think today about had been"
+).split()
+SCENARIOS = ("recency", "type", "frequency", "prefix")
+
+
+def _memory(user_id, key, content, now, age_days, memory_type="conversation", mentions=1):
+    return {
+        "id": f"{user_id}-{key}",
+        "user_id": user_id,
+        "content": content,
+        "timestamp": (now - timedelta(days=age_days)).isoformat(),
+        "source": "chat",
+        "metadata": {"type": memory_type, "mentions": mentions},
+    }
+
+
+def build_corpus(users: int, noise: int, seed: int = 7):
+    """Memories and ``(scenario, user_id, query, relevant id)`` queries."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    memories, queries = [], []
+    for u in range(users):
+        user_id = f"user_{u}"
+        for c, category in enumerate(CATEGORIES):
+            scenario = SCENARIOS[c % 3]
+            values = rng.sample(VALUES, 3)
+            ages = sorted(rng.uniform(1, 180) for _ in values)
+            if scenario != "recency":
+                # Similar ages, so recency does not decide
+                ages = [rng.uniform(20, 40) for _ in values]
+            gold = rng.randrange(len(values)) if scenario != "recency" else 0
+            for v, value in enumerate(values):
+                content = f"My favorite {category} is {value} " + " ".join(rng.choices(FILLER, k=rng.randint(0, 3)))
+                memory_type = "explicit" if scenario == "type" and v == gold else "conversation"
+                mentions = rng.randint(6, 10) if scenario == "frequency" and v == gold else 1
+                memories.append(_memory(user_id, f"{category}-{v}", content.strip(), now, ages[v], memory_type, mentions))
+            queries.append((scenario, user_id, f"What is my favorite {category}?", f"{user_id}-{category}-{gold}"))
+        for topic, prefix in PREFIXES.items():
+            memories.append(_memory(user_id, topic, f"I spend my weekends on {topic}", now, rng.uniform(1, 180)))
+            queries.append(("prefix", user_id, f"anything about {prefix}", f"{user_id}-{topic}"))
+        for n in range(noise):
+            words = rng.choices(FILLER, k=rng.randint(6, 16))
+            memories.append(_memory(user_id, f"n{n}", " ".join(words), now, rng.uniform(1, 365)))
+    rng.shuffle(memories)
+    return memories, queries
+
+
+def evaluate(name, search, queries, limit):
+    """One result per scenario (and overall) with latency, hit@1, MRR and nDCG."""
+    by_scenario = {}
+    for scenario, user_id, query, relevant in queries:
+        start = time.perf_counter()
+        ids = [m["id"] for m, _ in search(query, user_id, limit)]
+        latency = time.perf_counter() - start
+        rank = ids.index(relevant) + 1 if relevant in ids else 0
+        by_scenario.setdefault(scenario, []).append((latency, rank))
+
+    results = []
+    for scenario, rows in sorted(by_scenario.items()) + [("all", [r for rows in by_scenario.values() for r in rows])]:
+        ranks = [rank for _, rank in rows]
+        results.append(summarize(
+            f"{name}/{scenario}",
+            [latency for latency, _ in rows],
+            queries=len(rows),
+            hit_at_1=round(sum(rank == 1 for rank in ranks) / len(rows), 4),
+            mrr=round(sum(1 / rank for rank in ranks if rank) / len(rows), 4),
+            # One relevant memory per query, so the ideal DCG is 1
+            ndcg=round(sum(1 / log2(rank + 1) for rank in ranks if rank) / len(rows), 4)
+        ))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--noise", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--lexical-weight", type=float, default=1.0)
+    parser.add_argument("--recency-weight", type=float, default=0.2)
+    parser.add_argument("--type-weight", type=float, default=0.15)
+    parser.add_argument("--frequency-weight", type=float, default=0.1)
+    parser.add_argument("--half-life-days", type=float, default=30.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args()
+
+    memories, queries = build_corpus(args.users, args.noise)
+    print(f"{len(memories)} memories, {len(queries)} queries, limit={args.limit}\n")
+
+    ranker = HybridRanker(
+        lexical_weight=args.lexical_weight,
+        recency_weight=args.recency_weight,
+        type_weight=args.type_weight,
+        frequency_weight=args.frequency_weight,
+        half_life_days=args.half_life_days
+    )
+    index = InvertedIndex(memories)
+    results = evaluate("bm25", index.search, queries, args.limit)
+    results += evaluate(
+        "hybrid", lambda q, u, k: index.search(q, u, k, ranker=ranker), queries, args.limit
+    )
+
+    finish("ranking", vars(args), results, args.output, args.baseline)
+    print(f"\n{'ranker/scenario':<20}{'hit@1':>8}{'MRR':>8}{'nDCG':>8}")
+    for r in results:
+        print(f"{r['name']:<20}{r['hit_at_1']:>8.3f}{r['mrr']:>8.3f}{r['ndcg']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
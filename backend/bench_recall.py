@@ -0,0 +1,111 @@
+"""Compare recall latency and ranking quality of the BM25 and semantic indexes
+against the old overlap scorer.
+
+Usage:
+    python bench_recall.py [--users 50] [--noise 2000] [--limit 5]
+
+Each synthetic user gets one "my favorite <category> is <value>" memory per
+category plus --noise filler memories made of common words. Every query asks
+for one category, so the relevant memory is known and hit@1 / MRR can be
+computed for each ranker.
+"""
+import argparse
+import random
+import time
+
+from memory_index import InvertedIndex
+from semantic_index import SemanticIndex
+
+CATEGORIES = [
+    "color", "food", "sport", "city", "book", "movie", "band", "car", "drink",
+    "game", "season", "animal", "language", "dessert", "flower", "holiday",
+]
+VALUES = [
+    "purple", "pizza", "tennis", "chennai", "dune", "inception", "coldplay",
+    "tesla", "coffee", "chess", "winter", "otter", "python", "brownies",
+    "tulip", "diwali",
+]
+FILLER = (
+    "i the a my is and to of in it that was for on you with as have be at "
+    "this we what so like just really think today about had been"
+).split()
+
+
+def build_corpus(users: int, noise: int, seed: int = 7):
+    rng = random.Random(seed)
+    memories, queries = [], []
+    for u in range(users):
+        user_id = f"user_{u}"
+        for category, value in zip(CATEGORIES, rng.sample(VALUES, len(VALUES))):
+            memory = {
+                "id": f"{user_id}-{category}",
+                "user_id": user_id,
+                "content": f"My favorite {category} is {value} and I really like it",
+            }
+            memories.append(memory)
+            queries.append((user_id, f"What is my favorite {category}?", memory["id"]))
+        for n in range(noise):
+            words = rng.choices(FILLER, k=rng.randint(6, 16))
+            memories.append({"id": f"{user_id}-n{n}", "user_id": user_id, "content": " ".join(words)})
+    rng.shuffle(memories)
+    return memories, queries
+
+
+def overlap_search(memories, query, user_id, limit):
+    """The original linear-scan overlap scorer from MemoryManager.retrieve_memories."""
+    user_memories = [m for m in memories if m.get("user_id") == user_id]
+    query_lower = query.lower()
+    query_words = set(query_lower.split())
+    scored = []
+    for memory in user_memories:
+        content_lower = memory["content"].lower()
+        overlap = len(query_words & set(content_lower.split()))
+        if overlap > 0 or query_lower in content_lower:
+            scored.append((memory, overlap))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [m[0] for m in scored[:limit]]
+
+
+def evaluate(name, search, queries, limit):
+    hits, reciprocal_ranks = 0, 0.0
+    start = time.perf_counter()
+    results = [search(query, user_id, limit) for user_id, query, _ in queries]
+    elapsed = time.perf_counter() - start
+
+    for (_, _, relevant), result in zip(queries, results):
+        ids = [m["id"] for m in result]
+        if ids and ids[0] == relevant:
+            hits += 1
+        if relevant in ids:
+            reciprocal_ranks += 1 / (ids.index(relevant) + 1)
+
+    n = len(queries)
+    print(f"{name:<10}{elapsed / n * 1000:>12.3f}{hits / n:>10.3f}{reciprocal_ranks / n:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--noise", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=5)
+    args = parser.parse_args()
+
+    memories, queries = build_corpus(args.users, args.noise)
+    print(f"{len(memories)} memories, {len(queries)} queries, limit={args.limit}")
+
+    start = time.perf_counter()
+    index = InvertedIndex(memories)
+    semantic = SemanticIndex(index.memories)
+    for user_id in {m["user_id"] for m in memories}:
+        semantic.search("", user_id, 1)
+    print(f"index build: {time.perf_counter() - start:.2f}s\n")
+
+    print(f"{'ranker':<10}{'ms/query':>12}{'hit@1':>10}{'MRR':>10}")
+    print("-" * 42)
+    evaluate("overlap", lambda q, u, k: overlap_search(memories, q, u, k), queries, args.limit)
+    evaluate("bm25", lambda q, u, k: [m for m, _ in index.search(q, u, k)], queries, args.limit)
+    evaluate("semantic", lambda q, u, k: [m for m, _ in semantic.search(q, u, k)], queries, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Machine-readable benchmark results: latency summaries, JSON output, comparison.
+
+Every suite writes one JSON document::
+
+    {"suite": "micro", "environment": {...}, "params": {...},
+     "results": [{"name": "retrieve_memories/keyword/n=10000/uniform",
+                  "ops": 2000, "ops_per_sec": ..., "p50_ms": ..., ...}]}
+
+``name`` identifies a result across runs, so ``--baseline old.json``
+prints the change of each result against an earlier run.
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(len(ordered) * pct / 100)
+    return ordered[min(len(ordered), max(1, rank)) - 1]
+
+
+def summarize(name: str, latencies: List[float], elapsed: Optional[float] = None, **extra) -> Dict[str, Any]:
+    """
+    Latency distribution of ``latencies`` (seconds) as a result entry.
+
+    Args:
+        name: Stable identifier of the measurement
+        latencies: One duration per operation, in seconds
+        elapsed: Wall time of the whole run; defaults to the sum of latencies
+        extra: Additional fields to record (sizes, error counts, ...)
+    """
+    ordered = sorted(latencies)
+    elapsed = sum(ordered) if elapsed is None else elapsed
+    result = {
+        "name": name,
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+    result.update(extra)
+    return result
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def report(suite: str, params: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"suite": suite, "environment": environment(), "params": params, "results": results}
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    width = max((len(r["name"]) for r in results), default=10)
+    print(f"{'benchmark':<{width}} {'ops':>8} {'ops/s':>11} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for r in results:
+        print(f"{r['name']:<{width}} {r['ops']:>8} {r['ops_per_sec']:>11.1f} "
+              f"{r['p50_ms']:>10.3f} {r['p95_ms']:>10.3f} {r['p99_ms']:>10.3f}")
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Print each result's p50, p99 and throughput change against a previous run."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    def change(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+7.1f}%" if old else "    n/a"
+
+    print(f"\nChange vs {baseline_path} (negative latency / positive ops/s is better):")
+    for r in results:
+        old = baseline.get(r["name"])
+        if old is None:
+            print(f"  {r['name']}: new")
+            continue
+        print(f"  {r['name']}: p50 {change(r['p50_ms'], old['p50_ms'])}  "
+              f"p99 {change(r['p99_ms'], old['p99_ms'])}  ops/s {change(r['ops_per_sec'], old['ops_per_sec'])}")
+
+
+def finish(suite: str, params: Dict[str, Any], results: List[Dict[str, Any]],
+           output: Optional[str], baseline: Optional[str]) -> None:
+    """Print the results, write them as JSON to ``output`` and compare with ``baseline``."""
+    print_table(results)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report(suite, params, results), f, indent=2)
+        print(f"\nWrote {output}")
+    if baseline:
+        compare(results, baseline)
@@ -0,0 +1,122 @@
+"""Benchmark cold-start time and resident memory of the memory backends.
+
+Usage:
+    python bench_startup.py [--sizes 10000,100000,1000000] [--users 10000]
+                            [--engines json,log,sqlite,packed]
+
+For each size a synthetic store is written once per engine, then a fresh
+Python process constructs the manager (what the app does before it can
+answer /health) and runs a first recall for one user. Reported per engine:
+time until the manager is ready, time of that first recall (which is when
+the packed engine decodes the user), and the child's peak RSS.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+
+def make_memory(i: int, users: int) -> dict:
+    content = f"I like topic number {i} and I want to learn more about it"
+    return {
+        "id": str(uuid.uuid4()),
+        "content": content,
+        "user_id": f"user_{i % users}",
+        "timestamp": datetime.utcnow().isoformat(),
+        "source": f"User: {content[:100]}...",
+        "metadata": {"type": "conversation"}
+    }
+
+
+def build_stores(directory: Path, size: int, users: int, engines) -> None:
+    from storage import JSONFileStorage, LogStorage
+
+    memories = [make_memory(i, users) for i in range(size)]
+    json_path = directory / "memories.json"
+    JSONFileStorage(str(json_path)).rewrite(memories)
+    if "log" in engines:
+        # Separate directory so the log engine doesn't migrate memories.json
+        (directory / "log").mkdir()
+        LogStorage(str(directory / "log" / "memories.json")).rewrite(memories)
+    if "sqlite" in engines:
+        from sqlite_memory import SQLiteMemoryManager
+        SQLiteMemoryManager(str(directory / "memories.db"), import_path=str(json_path)).close()
+    if "packed" in engines:
+        from packed_memory import write_pack, _group_by_user
+        write_pack(directory / "memories.pack", _group_by_user(memories), segment=0)
+
+
+def child(engine: str, directory: str) -> None:
+    """Run in a fresh process: construct the manager, recall once, report."""
+    directory = Path(directory)
+    start = time.perf_counter()
+    if engine == "json":
+        from memory_manager import MemoryManager
+        manager = MemoryManager(str(directory / "memories.json"))
+    elif engine == "log":
+        from memory_manager import MemoryManager
+        from storage import LogStorage
+        manager = MemoryManager(storage=LogStorage(str(directory / "log" / "memories.json")))
+    elif engine == "sqlite":
+        from sqlite_memory import SQLiteMemoryManager
+        manager = SQLiteMemoryManager(str(directory / "memories.db"))
+    else:
+        from packed_memory import PackedMemoryManager
+        manager = PackedMemoryManager(str(directory / "memories.pack"))
+    ready = time.perf_counter() - start
+
+    start = time.perf_counter()
+    manager.retrieve_memories("topic learn", user_id="user_1", limit=5)
+    first_query = time.perf_counter() - start
+
+    print(json.dumps({"ready": ready, "first_query": first_query, "peak_rss_mb": peak_rss_mb()}))
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss survives fork+exec on Linux, so prefer this process's own high-water mark
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--engines", default="json,log,sqlite,packed")
+    parser.add_argument("--child", nargs=2, metavar=("ENGINE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+        return
+
+    engines = args.engines.split(",")
+    print(f"{'engine':<8}{'memories':>10}{'ready s':>10}{'1st query ms':>14}{'peak RSS MB':>13}")
+    print("-" * 55)
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            build_stores(Path(tmp), size, args.users, engines)
+            for engine in engines:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", engine, tmp],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{engine:<8}{size:>10}{result['ready']:>10.3f}"
+                      f"{result['first_query'] * 1000:>14.2f}{result['peak_rss_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark write latency of the memory storage engines as the store grows.
+
+Usage:
+    python bench_storage.py [--sizes 1000,10000,100000,1000000] [--writes 200]
+
+The JSON engine rewrites the whole file per write, so it is skipped above
+--json-max to keep the run short. "sharded" is the JSON engine split into
+--shards per-user files, where a write rewrites only its user's shard.
+"""
+import argparse
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from memory_manager import MemoryManager
+from sharded_memory import ShardedMemoryManager, reshard
+from storage import JSONFileStorage, LogStorage
+
+
+def make_memory(i: int) -> dict:
+    content = f"I like topic number {i} and I want to learn more about it"
+    return {
+        "id": str(uuid.uuid4()),
+        "content": content,
+        "user_id": f"user_{i % 100}",
+        "timestamp": datetime.utcnow().isoformat(),
+        "source": f"User: {content[:100]}...",
+        "metadata": {"type": "conversation"}
+    }
+
+
+def prefill(storage, size: int) -> None:
+    storage.rewrite([make_memory(i) for i in range(size)])
+
+
+def time_writes(manager: MemoryManager, writes: int) -> float:
+    start = time.perf_counter()
+    for i in range(writes):
+        manager.store_memory(f"I love benchmark write {i}", user_id="bench_user")
+    return (time.perf_counter() - start) / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000")
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--json-max", type=int, default=100000)
+    parser.add_argument("--shards", type=int, default=64)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(f"{'engine':<8}{'memories':>12}{'ms/write':>12}")
+    print("-" * 32)
+
+    for size in sizes:
+        for name, engine_cls in (("json", JSONFileStorage), ("log", LogStorage)):
+            if name == "json" and size > args.json_max:
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                storage = engine_cls(str(Path(tmp) / "memories.json"))
+                prefill(storage, size)
+                # Disable compaction so the measurement isolates append cost
+                if isinstance(storage, LogStorage):
+                    storage.compact_threshold = float("inf")
+                manager = MemoryManager(storage=storage)
+                per_write = time_writes(manager, args.writes)
+                manager.close()
+            print(f"{name:<8}{size:>12}{per_write * 1000:>12.3f}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            shard_dir = str(Path(tmp) / "memories.shards")
+            reshard((make_memory(i) for i in range(size)), shard_dir, args.shards)
+            manager = ShardedMemoryManager(shard_dir, shards=args.shards, persist_vectors=False)
+            per_write = time_writes(manager, args.writes)
+            manager.close()
+        print(f"{'sharded':<8}{size:>12}{per_write * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
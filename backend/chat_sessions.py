@@ -0,0 +1,170 @@
+"""Per-user Gemini chat sessions with bounded, token-trimmed history."""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict
+
+import google.generativeai as genai
+
+from prompt_builder import estimate_tokens
+
+
+def _content_tokens(content: "genai.protos.Content") -> int:
+    tokens = 0
+    for part in content.parts:
+        if part.text:
+            tokens += estimate_tokens(part.text)
+        else:
+            # Function calls and responses: size of their JSON form
+            tokens += estimate_tokens(type(part).to_json(part))
+    return tokens
+
+
+def _is_user_text(content: "genai.protos.Content") -> bool:
+    return content.role == "user" and any(part.text for part in content.parts)
+
+
+class ChatTurn:
+    """One exchange on a chat; ``reset`` undoes whatever it added so far."""
+
+    def __init__(self, chat, history_tokens: int = 0):
+        self.chat = chat
+        self.start = len(chat.history)
+        # Approximate tokens of earlier turns sent along with this one
+        self.history_tokens = history_tokens
+
+    def reset(self) -> None:
+        self.chat.history = self.chat.history[:self.start]
+
+
+class ChatSession:
+    __slots__ = ("chat", "lock", "last_used", "history_tokens")
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.history_tokens = 0
+
+
+class ChatSessionCache:
+    """
+    Keeps one chat session per user so follow-up turns carry the conversation.
+
+    At most ``max_sessions`` sessions are kept; the least recently used is
+    evicted beyond that, and sessions idle for ``idle_ttl`` seconds expire.
+    After each turn the user message stored in history is stripped of the
+    memory context it was sent with (that is recalled afresh every turn),
+    and the oldest exchanges are dropped until the history fits in
+    ``history_token_budget``. Turns for the same user are serialized, and a
+    failed turn leaves the history as it was before it.
+    """
+
+    def __init__(
+        self,
+        start_chat: Callable[[], Any],
+        max_sessions: int = 1000,
+        idle_ttl: float = 1800,
+        history_token_budget: int = 2000
+    ):
+        """
+        Args:
+            start_chat: Creates an empty chat session (e.g. ``model.start_chat``)
+            max_sessions: Maximum number of users with a live session
+            idle_ttl: Seconds of inactivity after which a session expires
+            history_token_budget: Approximate tokens of history kept per user
+        """
+        self.start_chat = start_chat
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.history_token_budget = history_token_budget
+
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.created = 0
+        self.reused = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.trimmed_messages = 0
+
+    def _session(self, user_id: str) -> ChatSession:
+        now = time.monotonic()
+        with self._lock:
+            # Sessions are kept in last-used order, so expired ones are at the front
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if now - oldest.last_used < self.idle_ttl:
+                    break
+                self._sessions.popitem(last=False)
+                self.expirations += 1
+
+            session = self._sessions.get(user_id)
+            if session is None:
+                session = self._sessions[user_id] = ChatSession(self.start_chat())
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._sessions.move_to_end(user_id)
+                self.reused += 1
+            session.last_used = now
+        return session
+
+    @asynccontextmanager
+    async def turn(self, user_id: str, user_message: str) -> AsyncIterator[ChatTurn]:
+        """Run one exchange on ``user_id``'s session."""
+        session = self._session(user_id)
+        async with session.lock:
+            turn = ChatTurn(session.chat, session.history_tokens)
+            try:
+                yield turn
+            except BaseException:
+                turn.reset()
+                raise
+            self._finish(session, turn, user_message)
+
+    def _finish(self, session: ChatSession, turn: ChatTurn, user_message: str) -> None:
+        """Store the plain user message and trim history to the token budget."""
+        history = list(session.chat.history)
+        if len(history) > turn.start:
+            history[turn.start] = genai.protos.Content(role="user", parts=[genai.protos.Part(text=user_message)])
+
+        tokens = [_content_tokens(content) for content in history]
+        total = sum(tokens)
+        dropped = 0
+        # Drop whole exchanges: keep going until history starts with a user message
+        while history and (total > self.history_token_budget or not _is_user_text(history[0])):
+            total -= tokens[dropped]
+            history.pop(0)
+            dropped += 1
+
+        session.chat.history = history
+        session.history_tokens = total
+        session.last_used = time.monotonic()
+        with self._lock:
+            self.trimmed_messages += dropped
+
+    def clear(self, user_id: str) -> None:
+        """Forget a user's conversation."""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "active_sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "history_token_budget": self.history_token_budget,
+            "history_tokens": sum(session.history_tokens for session in sessions),
+            "created": self.created,
+            "reused": self.reused,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "trimmed_messages": self.trimmed_messages,
+        }
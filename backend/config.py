@@ -1,5 +1,7 @@
 """Configuration management for the AI Agent backend."""
+import json
 import os
+from pathlib import Path
 from typing import List
 from dotenv import load_dotenv
 
@@ -15,9 +17,36 @@ class Settings:
         
         # Tavily API Configuration (for web search)
         self.tavily_api_key = os.getenv("TAVILY_API_KEY", "")
+        self.web_search_cache_ttl = float(os.getenv("WEB_SEARCH_CACHE_TTL", "600"))
+        self.web_search_cache_size = int(os.getenv("WEB_SEARCH_CACHE_SIZE", "1024"))
+        self.web_search_cache_path = os.getenv("WEB_SEARCH_CACHE_PATH", "")
         
         # Memory Configuration
         self.memory_file_path = os.getenv("MEMORY_FILE_PATH", "./memories.json")
+        self.memory_storage_backend = os.getenv("MEMORY_STORAGE_BACKEND", "json")
+        self.memory_log_compact_threshold = int(os.getenv("MEMORY_LOG_COMPACT_THRESHOLD", "10000"))
+        # Lets several worker processes (uvicorn --workers N) share the log backend
+        self.memory_multiprocess = os.getenv("MEMORY_MULTIPROCESS", "false").lower() in ("1", "true", "yes")
+        self.memory_sqlite_path = os.getenv(
+            "MEMORY_SQLITE_PATH",
+            str(Path(self.memory_file_path).with_suffix(".db"))
+        )
+        self.memory_pack_path = os.getenv(
+            "MEMORY_PACK_PATH",
+            str(Path(self.memory_file_path).with_suffix(".pack"))
+        )
+        # Split the json/log backends into this many per-user shards; 0 keeps one file
+        self.memory_shards = int(os.getenv("MEMORY_SHARDS", "0"))
+        self.memory_shard_dir = os.getenv(
+            "MEMORY_SHARD_DIR",
+            str(Path(self.memory_file_path).with_suffix(".shards"))
+        )
+        # Users whose memories the "packed" backend keeps decoded in RAM
+        self.memory_pack_hot_users = int(os.getenv("MEMORY_PACK_HOT_USERS", "1000"))
+        self.memory_vector_path = os.getenv(
+            "MEMORY_VECTOR_PATH",
+            str(Path(self.memory_file_path).with_suffix(".vectors.npz"))
+        )
         
         # CORS Configuration
         self.cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173,http://localhost:3000")
@@ -29,8 +58,56 @@ class Settings:
         # Model Configuration
         self.gemini_model = "models/gemini-2.0-flash-lite"
         
+        # Prompt enhancement cache
+        self.enhance_cache_ttl = float(os.getenv("ENHANCE_CACHE_TTL", "3600"))
+        self.enhance_cache_size = int(os.getenv("ENHANCE_CACHE_SIZE", "512"))
+        
         # Memory Configuration
         self.max_memory_results = 5
+        # Users with the most memories get their own series on /metrics
+        self.metrics_top_users = int(os.getenv("METRICS_TOP_USERS", "20"))
+        
+        # Client-side rate limiting of Gemini calls
+        self.gemini_max_rps = float(os.getenv("GEMINI_MAX_RPS", "1"))
+        self.gemini_burst = int(os.getenv("GEMINI_BURST", "5"))
+        self.gemini_queue_size = int(os.getenv("GEMINI_QUEUE_SIZE", "100"))
+        self.gemini_max_queue_wait = float(os.getenv("GEMINI_MAX_QUEUE_WAIT", "30"))
+        self.gemini_max_retries = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+        
+        # Tool calls made by the model
+        self.tool_call_timeout = float(os.getenv("TOOL_CALL_TIMEOUT", "10"))
+        self.tool_max_rounds = int(os.getenv("TOOL_MAX_ROUNDS", "3"))
+        
+        # Per-user chat sessions (recent turns kept between requests)
+        self.chat_session_max = int(os.getenv("CHAT_SESSION_MAX", "1000"))
+        self.chat_session_idle_ttl = float(os.getenv("CHAT_SESSION_IDLE_TTL", "1800"))
+        self.chat_history_token_budget = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+        # Approximate tokens of memory context added to each chat prompt
+        self.memory_context_token_budget = int(os.getenv("MEMORY_CONTEXT_TOKEN_BUDGET", "400"))
+        self.memory_recall_mode = os.getenv("MEMORY_RECALL_MODE", "keyword")
+        self.memory_writer_batch_size = int(os.getenv("MEMORY_WRITER_BATCH_SIZE", "100"))
+        # Seconds between writes of recall counts (the ranking frequency signal); 0 writes them only at shutdown
+        self.memory_recall_flush_interval = float(os.getenv("MEMORY_RECALL_FLUSH_INTERVAL", "30"))
+        # Extra memory-worthiness phrases as JSON: {"category": ["regex", ...]}
+        self.memory_detector_patterns = json.loads(os.getenv("MEMORY_DETECTOR_PATTERNS", "{}"))
+        # Merge new memories into stored duplicates instead of appending them
+        self.memory_dedup = os.getenv("MEMORY_DEDUP", "true").lower() in ("1", "true", "yes")
+        self.memory_dedup_threshold = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.9"))
+        # Seconds between background passes merging stored duplicates; 0 disables them
+        self.memory_consolidation_interval = float(os.getenv("MEMORY_CONSOLIDATION_INTERVAL", "3600"))
+        # Retention: days to keep each memory type as JSON, e.g. {"conversation": 90}
+        self.memory_ttl_days = json.loads(os.getenv("MEMORY_TTL_DAYS", "{}"))
+        # Most memories kept per user (lowest-scoring evicted first); 0 means unlimited
+        self.memory_user_quota = int(os.getenv("MEMORY_USER_QUOTA", "0"))
+        self.memory_decay_half_life_days = float(os.getenv("MEMORY_DECAY_HALF_LIFE_DAYS", "30"))
+        # Recall ranking: weights of relevance, recency, explicit type and mention/recall frequency
+        self.memory_rank_lexical_weight = float(os.getenv("MEMORY_RANK_LEXICAL_WEIGHT", "1.0"))
+        self.memory_rank_recency_weight = float(os.getenv("MEMORY_RANK_RECENCY_WEIGHT", "0.2"))
+        self.memory_rank_type_weight = float(os.getenv("MEMORY_RANK_TYPE_WEIGHT", "0.15"))
+        self.memory_rank_frequency_weight = float(os.getenv("MEMORY_RANK_FREQUENCY_WEIGHT", "0.1"))
+        # Seconds between retention sweeps of the next batch of users; 0 disables them
+        self.memory_sweep_interval = float(os.getenv("MEMORY_SWEEP_INTERVAL", "60"))
+        self.memory_sweep_batch_users = int(os.getenv("MEMORY_SWEEP_BATCH_USERS", "100"))
     
     @property
     def cors_origins_list(self) -> List[str]:
@@ -41,6 +118,11 @@ class Settings:
         """Validate that required settings are present."""
         if not self.gemini_api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
+        if self.memory_multiprocess and self.memory_storage_backend != "log":
+            # Other backends would let each worker overwrite or miss the others' writes
+            raise ValueError(
+                f"MEMORY_MULTIPROCESS requires MEMORY_STORAGE_BACKEND=log, not {self.memory_storage_backend!r}"
+            )
 
 
 # Global settings instance
@@ -1,18 +1,58 @@
 """Simplified conversation handling using Google Generative AI SDK directly."""
-from typing import List, Dict, Any
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, AsyncIterator, Tuple, Optional
 import google.generativeai as genai
 from google.generativeai.types import FunctionDeclaration, Tool
 from config import settings
 from memory_manager import MemoryManager
+from memory_writer import MemoryWriter
+from cache import TTLCache
+from chat_sessions import ChatSessionCache, ChatTurn
+from gemini_scheduler import GeminiScheduler, INTERACTIVE, BACKGROUND
+from metrics import CHAT_STAGE_SECONDS
+from prompt_builder import PromptBuilder, BuiltPrompt
+from tool_executor import ToolExecutor, ToolResult, NO_TOOLS, function_calls
 from web_search import web_search
 
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = """You are Memora, a helpful AI assistant with long-term memory capabilities and internet access.
+
+You can:
+1. Remember information about the user across conversations
+2. Search the internet for current information using the search_web function
+
+When the user asks about:
+- Current weather, news, events → Use search_web
+- Stock prices, sports scores → Use search_web  
+- Any real-time or recent information → Use search_web
+
+When relevant memories are provided, use them naturally in your responses.
+
+Be conversational, friendly, and helpful."""
+
 
 class ConversationHandler:
     """Handles conversations with memory-augmented context and web search."""
     
-    def __init__(self, memory_manager: MemoryManager):
-        """Initialize conversation handler."""
+    def __init__(self, memory_manager: MemoryManager, memory_writer: Optional[MemoryWriter] = None):
+        """
+        Initialize conversation handler.
+        
+        Args:
+            memory_manager: Memory store used for recall
+            memory_writer: Background writer for memory extraction; without one,
+                extraction runs inline before the response is returned
+        """
         self.memory_manager = memory_manager
+        self.memory_writer = memory_writer
+        self.enhance_cache = TTLCache(
+            max_size=settings.enhance_cache_size,
+            ttl_seconds=settings.enhance_cache_ttl
+        )
         
         # Configure Gemini
         genai.configure(api_key=settings.gemini_api_key)
@@ -33,118 +73,274 @@ class ConversationHandler:
             }
         )
         
+        # The system prompt is sent as the model's system instruction rather
+        # than repeated in every user turn
+        self.system_prompt = SYSTEM_PROMPT
+        self.prompt_builder = PromptBuilder(
+            self.system_prompt,
+            memory_token_budget=settings.memory_context_token_budget
+        )
+        
         # Create model with tools
         self.model = genai.GenerativeModel(
             settings.gemini_model,
-            tools=[Tool(function_declarations=[search_function])]
+            tools=[Tool(function_declarations=[search_function])],
+            system_instruction=self.prompt_builder.system_instruction
         )
+        # Prompt enhancement needs neither the chat persona nor the tools
+        self.enhance_model = genai.GenerativeModel(settings.gemini_model)
         
-        # System prompt
-        self.system_prompt = """You are Memora, a helpful AI assistant with long-term memory capabilities and internet access.
-
-You can:
-1. Remember information about the user across conversations
-2. Search the internet for current information using the search_web function
-
-When the user asks about:
-- Current weather, news, events → Use search_web
-- Stock prices, sports scores → Use search_web  
-- Any real-time or recent information → Use search_web
+        # Every Gemini call goes through one rate limiter; chat before enhance
+        self.scheduler = GeminiScheduler(
+            max_rate=settings.gemini_max_rps,
+            burst=settings.gemini_burst,
+            max_queue=settings.gemini_queue_size,
+            max_wait=settings.gemini_max_queue_wait,
+            max_retries=settings.gemini_max_retries
+        )
+        
+        # Function calls from the model run through the tool executor
+        self.tools = ToolExecutor(
+            timeout=settings.tool_call_timeout,
+            max_rounds=settings.tool_max_rounds
+        )
+        self.tools.register("search_web", web_search.search_async)
+        
+        # Per-user chat sessions carry recent turns between requests
+        self.sessions = ChatSessionCache(
+            lambda: self.model.start_chat(),
+            max_sessions=settings.chat_session_max,
+            idle_ttl=settings.chat_session_idle_ttl,
+            history_token_budget=settings.chat_history_token_budget
+        )
+    
+    def _enhance_cache_key(self, prompt: str) -> str:
+        """Content address of a prompt: hash of its normalized text and the model name."""
+        normalized = " ".join(prompt.lower().split())
+        return hashlib.sha256(f"{settings.gemini_model}\0{normalized}".encode("utf-8")).hexdigest()
+    
+    async def enhance_prompt(self, prompt: str) -> str:
+        """
+        Rewrite a prompt to be more detailed and effective.
+        
+        Results are cached by normalized prompt, and identical requests that
+        arrive while one is in flight share its model call.
+        """
+        async def enhance() -> str:
+            enhancement_instruction = f"""You are a prompt enhancement assistant. Take the user's simple prompt and make it more detailed, specific, and effective for an AI conversation.
 
-When relevant memories are provided, use them naturally in your responses.
+User's original prompt: "{prompt}"
 
-Be conversational, friendly, and helpful."""
+Enhanced prompt (return ONLY the enhanced prompt, nothing else):"""
+            
+            response = await self.scheduler.run(
+                lambda: self.enhance_model.generate_content_async(enhancement_instruction),
+                BACKGROUND
+            )
+            return response.text.strip()
+        
+        return await self.enhance_cache.get_or_compute_async(self._enhance_cache_key(prompt), enhance)
+    
+    async def _retrieve_memories(
+        self,
+        user_message: str,
+        user_id: str,
+        memory_enabled: bool
+    ) -> List[Dict[str, Any]]:
+        """Retrieve memories relevant to the message, if memory is enabled."""
+        if not memory_enabled:
+            return []
+        return await asyncio.to_thread(
+            self.memory_manager.retrieve_memories,
+            query=user_message,
+            user_id=user_id,
+            limit=settings.max_memory_results,
+            mode=settings.memory_recall_mode
+        )
+    
+    def _build_prompt(self, user_message: str, memories: List[Dict[str, Any]], turn: ChatTurn) -> BuiltPrompt:
+        """Build the user turn: budgeted memory context followed by the message."""
+        prompt = self.prompt_builder.build(user_message, memories, turn.history_tokens)
+        logger.info(
+            f"Prompt: ~{prompt.input_tokens} input tokens ({prompt.history_tokens} history), "
+            f"~{prompt.tokens_saved} saved "
+            f"({len(prompt.memories)} memories, {prompt.memories_dropped} dropped, "
+            f"{prompt.memories_truncated} truncated)"
+        )
+        return prompt
+    
+    @asynccontextmanager
+    async def _chat_turn(self, user_id: str, user_message: str, memory_enabled: bool) -> AsyncIterator[ChatTurn]:
+        """Run a turn on the user's session, or on a throwaway chat when memory is off."""
+        if memory_enabled:
+            async with self.sessions.turn(user_id, user_message) as turn:
+                yield turn
+        else:
+            yield ChatTurn(self.model.start_chat())
+    
+    async def _send(self, chat, message, **kwargs):
+        """Send a chat message through the scheduler at interactive priority."""
+        with CHAT_STAGE_SECONDS.time(stage="gemini"):
+            return await self.scheduler.run(lambda: chat.send_message_async(message, **kwargs), INTERACTIVE)
     
-    def _format_memories_for_context(self, memories: List[Dict[str, Any]]) -> str:
-        """Format retrieved memories into context string."""
-        if not memories:
-            return ""
-        
-        context_parts = ["Here's what I remember about our previous conversations:\n"]
-        for i, memory in enumerate(memories, 1):
-            content = memory['content']
-            timestamp = memory.get('timestamp', 'unknown time')
-            context_parts.append(f"{i}. {content} (from {timestamp[:10]})")
-        
-        return "\n".join(context_parts)
+    async def _resolve_tool_calls(self, chat, response):
+        """
+        Answer the model's function calls until it replies in text.
+        
+        Each round runs every call in the response concurrently and sends
+        the results back in one message. After ``max_rounds`` rounds, any
+        remaining calls are answered without running them and the model is
+        asked to reply with tools disabled.
+        """
+        for _ in range(self.tools.max_rounds):
+            calls = function_calls(response.candidates[0].content.parts)
+            if not calls:
+                return response
+            with CHAT_STAGE_SECONDS.time(stage="tools"):
+                results = await self.tools.run(calls)
+            response = await self._send(chat, self.tools.content(results))
+        
+        calls = function_calls(response.candidates[0].content.parts)
+        if calls:
+            response = await self._send(
+                chat,
+                self.tools.content(self.tools.skip(calls)),
+                tool_config=NO_TOOLS
+            )
+        return response
+    
+    @staticmethod
+    def _tool_event(result: ToolResult) -> Dict[str, Any]:
+        """``tool_call`` event data for a finished call."""
+        return {
+            "name": result.name,
+            "args": result.args,
+            "status": "finished" if result.status == "ok" else result.status,
+            "latency_ms": round(result.latency * 1000, 3)
+        }
+    
+    async def _remember_conversation(
+        self,
+        user_message: str,
+        response_text: str,
+        user_id: str,
+        memory_enabled: bool
+    ) -> None:
+        """Process conversation for potential memory storage."""
+        if not memory_enabled:
+            return
+        if self.memory_writer:
+            self.memory_writer.submit(user_message, response_text, user_id)
+        else:
+            await asyncio.to_thread(
+                self.memory_manager.process_conversation_for_memory,
+                user_message=user_message,
+                assistant_response=response_text,
+                user_id=user_id
+            )
     
-    def generate_response(
+    async def generate_response(
         self,
         user_message: str,
         user_id: str = "default_user",
         memory_enabled: bool = True
     ) -> tuple[str, List[Dict[str, Any]]]:
-        """Generate a response to user message with memory context and web search."""
-        memories_used = []
+        """
+        Generate a response to user message with memory context and web search.
         
-        # Retrieve relevant memories if enabled
-        if memory_enabled:
-            memories_used = self.memory_manager.retrieve_memories(
-                query=user_message,
-                user_id=user_id,
-                limit=settings.max_memory_results
-            )
+        Model calls use the SDK's async API and go through the shared
+        scheduler, which retries rate-limited calls; web search and memory
+        I/O run in worker threads so the event loop stays free for other
+        requests.
+        """
+        with CHAT_STAGE_SECONDS.time(stage="retrieve_memories"):
+            memories = await self._retrieve_memories(user_message, user_id, memory_enabled)
         
-        # Build prompt with system instructions and memory context
-        full_prompt = self.system_prompt
+        async with self._chat_turn(user_id, user_message, memory_enabled) as turn:
+            # Built inside the turn, so the history it is sent with is known
+            with CHAT_STAGE_SECONDS.time(stage="build_prompt"):
+                prompt = self._build_prompt(user_message, memories, turn)
+            memories_used = prompt.memories
+            chat = turn.chat
+            response = await self._send(chat, prompt.text)
+            
+            # Handle function calls
+            response = await self._resolve_tool_calls(chat, response)
+            
+            # Get final text response
+            response_text = response.text
         
-        if memories_used:
-            memory_context = self._format_memories_for_context(memories_used)
-            full_prompt += f"\n\n{memory_context}"
+        with CHAT_STAGE_SECONDS.time(stage="remember"):
+            await self._remember_conversation(user_message, response_text, user_id, memory_enabled)
         
-        full_prompt += f"\n\nUser: {user_message}\n\nAssistant:"
+        return response_text, memories_used
+    
+    async def stream_response(
+        self,
+        user_message: str,
+        user_id: str = "default_user",
+        memory_enabled: bool = True
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a response as ``(event, data)`` pairs.
         
-        # Generate response with retry logic and function calling
-        max_retries = 3
-        base_delay = 1
+        Events, in order:
+        - ``memories``: memories retrieved for context
+        - ``tool_call``: a tool call starting (``status="started"``), then its
+          outcome (``finished``, ``error``, ``timeout`` or ``skipped``)
+        - ``chunk``: a piece of response text as the model produces it
+        - ``done``: the full response text and memories used
         
-        for attempt in range(max_retries):
-            try:
-                # Start chat with function calling enabled
-                chat = self.model.start_chat()
-                response = chat.send_message(full_prompt)
-                
-                # Handle function calls
-                while response.candidates[0].content.parts[0].function_call:
-                    function_call = response.candidates[0].content.parts[0].function_call
-                    
-                    # Execute web search
-                    if function_call.name == "search_web":
-                        query = function_call.args.get("query", "")
-                        search_results = web_search.search(query)
-                        
-                        # Send results back to model
-                        response = chat.send_message(
-                            genai.protos.Content(
-                                parts=[genai.protos.Part(
-                                    function_response=genai.protos.FunctionResponse(
-                                        name="search_web",
-                                        response={"result": search_results}
-                                    )
-                                )]
-                            )
-                        )
+        Memory extraction runs after ``done`` has been yielded, so it never
+        delays the final event.
+        """
+        with CHAT_STAGE_SECONDS.time(stage="retrieve_memories"):
+            memories = await self._retrieve_memories(user_message, user_id, memory_enabled)
+        
+        text_parts = []
+        rounds = 0
+        send_options = {}
+        
+        async with self._chat_turn(user_id, user_message, memory_enabled) as turn:
+            # Built inside the turn, so the history it is sent with is known
+            with CHAT_STAGE_SECONDS.time(stage="build_prompt"):
+                prompt = self._build_prompt(user_message, memories, turn)
+            memories_used = prompt.memories
+            yield "memories", {"memories_used": memories_used}
+            
+            message = prompt.text
+            chat = turn.chat
+            while True:
+                response = await self._send(chat, message, stream=True, **send_options)
+                calls = []
+                async for chunk in response:
+                    for part in chunk.parts:
+                        if part.function_call:
+                            calls.append(part.function_call)
+                        elif part.text:
+                            text_parts.append(part.text)
+                            yield "chunk", {"text": part.text}
                 
-                # Get final text response
-                response_text = response.text
-                break
+                # Stop after the final send with tools disabled, even if it still returned calls
+                if not calls or send_options:
+                    break
                 
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    import time
-                    import random
-                    delay = (base_delay * (2 ** attempt)) + (random.random() * 0.5)
-                    print(f"Rate limit hit, retrying in {delay:.2f}s...")
-                    time.sleep(delay)
+                if rounds < self.tools.max_rounds:
+                    # Run all calls concurrently and send the results back together
+                    for call in calls:
+                        yield "tool_call", {"name": call.name, "args": dict(call.args or {}), "status": "started"}
+                    with CHAT_STAGE_SECONDS.time(stage="tools"):
+                        results = await self.tools.run(calls)
+                    rounds += 1
                 else:
-                    raise e
+                    results = self.tools.skip(calls)
+                    send_options = {"tool_config": NO_TOOLS}
+                for result in results:
+                    yield "tool_call", self._tool_event(result)
+                message = self.tools.content(results)
         
-        # Process conversation for potential memory storage
-        if memory_enabled:
-            self.memory_manager.process_conversation_for_memory(
-                user_message=user_message,
-                assistant_response=response_text,
-                user_id=user_id
-            )
+        response_text = "".join(text_parts)
+        yield "done", {"response": response_text, "memories_used": memories_used}
         
-        return response_text, memories_used
+        with CHAT_STAGE_SECONDS.time(stage="remember"):
+            await self._remember_conversation(user_message, response_text, user_id, memory_enabled)
@@ -0,0 +1,267 @@
+"""Client-side rate limiting and prioritization of Gemini calls."""
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+from metrics import GEMINI_QUEUE_WAIT_SECONDS, GEMINI_RATE_LIMITED, GEMINI_REJECTED, GEMINI_RETRIES
+
+T = TypeVar("T")
+
+# Lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class SchedulerBusy(Exception):
+    """Raised instead of queueing a call that would wait too long."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini is rate limited; retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    return isinstance(error, google_exceptions.ResourceExhausted) or "429" in str(error)
+
+
+class QueueWait:
+    __slots__ = ("count", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        avg = self.total_seconds / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(avg * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+class GeminiScheduler:
+    """
+    Shared admission control for every Gemini call made by the backend.
+
+    Calls take a token from a bucket holding up to ``burst`` tokens and
+    refilled at ``rate`` per second. The rate adapts to the quota actually
+    available: a 429 halves it (down to ``min_rate``), empties the bucket
+    and pauses all calls for an exponentially growing backoff, while each
+    success raises it additively back towards ``max_rate``. Calls that find
+    no token wait in a priority queue, interactive before background; a
+    call is rejected with ``SchedulerBusy`` when the queue holds
+    ``max_queue`` calls or its expected wait exceeds ``max_wait`` seconds,
+    and an interactive call arriving at a full queue displaces the newest
+    background one. Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_rate: float = 1.0,
+        burst: int = 5,
+        min_rate: float = 0.05,
+        max_queue: int = 100,
+        max_wait: float = 30.0,
+        max_retries: int = 3
+    ):
+        """
+        Args:
+            max_rate: Upper bound for the call rate, in calls per second
+            burst: Bucket capacity, i.e. calls allowed back to back
+            min_rate: Lower bound the rate is never cut below
+            max_queue: Maximum number of waiting calls
+            max_wait: Longest expected queue wait accepted, in seconds
+            max_retries: Attempts per call when Gemini answers 429
+        """
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+
+        self.rate = max_rate
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._cooldown_until = 0.0
+        self._backoff = 0.0
+
+        self._queue: List[tuple] = []
+        self._seq = itertools.count()
+        self._dispatcher: "asyncio.Task | None" = None
+
+        self.calls = 0
+        self.rate_limited = 0
+        self.retries = 0
+        self.rejected = 0
+        self.displaced = 0
+        self._waits = {priority: QueueWait() for priority in PRIORITY_NAMES}
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _expected_wait(self, priority: int, now: float) -> float:
+        ahead = sum(1 for entry in self._queue if entry[0] <= priority and not entry[2].done())
+        shortfall = max(0.0, ahead + 1 - self.tokens)
+        return max(0.0, self._cooldown_until - now) + shortfall / self.rate
+
+    def check(self, priority: int = INTERACTIVE) -> None:
+        """
+        Raise ``SchedulerBusy`` if a call at ``priority`` would be rejected now.
+
+        Lets endpoints that cannot report errors once started (streams)
+        refuse work up front.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        expected = self._expected_wait(priority, now)
+        if expected > self.max_wait:
+            self.rejected += 1
+            GEMINI_REJECTED.inc(priority=PRIORITY_NAMES[priority])
+            raise SchedulerBusy(expected)
+        if len(self._queue) < self.max_queue:
+            return
+
+        waiting = [entry for entry in self._queue if not entry[2].done()]
+        if len(waiting) != len(self._queue):
+            self._queue = waiting
+            heapq.heapify(self._queue)
+            if len(self._queue) < self.max_queue:
+                return
+
+        # Full: make room by displacing the newest lower-priority call, if any
+        worst = max(self._queue, default=None)
+        if worst is None or worst[0] <= priority:
+            self.rejected += 1
+            GEMINI_REJECTED.inc(priority=PRIORITY_NAMES[priority])
+            raise SchedulerBusy(expected)
+        self._queue.remove(worst)
+        heapq.heapify(self._queue)
+        worst[2].set_exception(SchedulerBusy(self._expected_wait(worst[0], now)))
+        self.displaced += 1
+        GEMINI_REJECTED.inc(priority=PRIORITY_NAMES[worst[0]])
+
+    async def acquire(self, priority: int = INTERACTIVE) -> None:
+        """Wait for a token, in priority order."""
+        start = time.monotonic()
+        self._refill(start)
+        if not self._queue and self.tokens >= 1 and start >= self._cooldown_until:
+            self.tokens -= 1
+        else:
+            self.check(priority)
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), future))
+            if self._dispatcher is None:
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            await future
+
+        wait = time.monotonic() - start
+        stats = self._waits[priority]
+        stats.count += 1
+        stats.total_seconds += wait
+        stats.max_seconds = max(stats.max_seconds, wait)
+        GEMINI_QUEUE_WAIT_SECONDS.observe(wait, priority=PRIORITY_NAMES[priority])
+
+    async def _dispatch(self) -> None:
+        """Hand out tokens to queued calls as they become available."""
+        try:
+            while self._queue:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._cooldown_until:
+                    await asyncio.sleep(self._cooldown_until - now)
+                    continue
+                if self.tokens < 1:
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+                    continue
+                _, _, future = heapq.heappop(self._queue)
+                if future.done():
+                    # Cancelled by its caller or displaced
+                    continue
+                self.tokens -= 1
+                future.set_result(None)
+        finally:
+            self._dispatcher = None
+
+    def _on_rate_limited(self) -> None:
+        self.rate_limited += 1
+        GEMINI_RATE_LIMITED.inc()
+        now = time.monotonic()
+        if now < self._cooldown_until:
+            # Other calls already reported this episode
+            return
+        self.rate = max(self.min_rate, self.rate / 2)
+        self._backoff = min(MAX_BACKOFF_SECONDS, self._backoff * 2 or 1.0)
+        self._cooldown_until = now + self._backoff * (1 + random.random() * 0.25)
+        self.tokens = 0.0
+        self._updated = now
+
+    def _on_success(self) -> None:
+        self._backoff = 0.0
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    async def run(self, call: Callable[[], Awaitable[T]], priority: int = INTERACTIVE) -> T:
+        """
+        Run ``call`` once admitted, retrying it when Gemini answers 429.
+
+        Args:
+            call: Makes the Gemini request; invoked again for each retry
+            priority: ``INTERACTIVE`` or ``BACKGROUND``
+
+        Returns:
+            The result of ``call``
+
+        Raises:
+            SchedulerBusy: The queue is full, or Gemini kept answering 429
+        """
+        for attempt in range(self.max_retries):
+            await self.acquire(priority)
+            self.calls += 1
+            try:
+                result = await call()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self._on_rate_limited()
+                if attempt == self.max_retries - 1:
+                    raise SchedulerBusy(max(1.0, self._cooldown_until - time.monotonic())) from e
+                self.retries += 1
+                GEMINI_RETRIES.inc()
+                continue
+            self._on_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "rate_per_second": round(self.rate, 3),
+            "max_rate_per_second": self.max_rate,
+            "tokens": round(self.tokens, 2),
+            "cooldown_seconds": round(max(0.0, self._cooldown_until - now), 3),
+            "queue_depth": sum(1 for entry in self._queue if not entry[2].done()),
+            "max_queue": self.max_queue,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "displaced": self.displaced,
+            "queue_wait": {name: self._waits[priority].stats() for priority, name in PRIORITY_NAMES.items()},
+        }
+
+
+def retry_after_header(error: SchedulerBusy) -> Dict[str, str]:
+    """``Retry-After`` header for a rejected request, in whole seconds."""
+    return {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
@@ -1,19 +1,40 @@
 """FastAPI backend for AI Agent with Memory."""
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import datetime, timezone
+import asyncio
+import heapq
+import json
 import logging
+import time
+from typing import Any, Dict, Optional
 
 from config import settings
 from models import (
     ChatRequest, ChatResponse,
     RememberRequest, RememberResponse,
     RecallRequest, RecallResponse,
-    StatusResponse
+    BulkRememberRequest, BulkRememberResponse,
+    BulkRecallRequest, BulkRecallResponse,
+    ForgetResponse, StatusResponse
 )
 from memory_manager import MemoryManager
+from packed_memory import PackedMemoryManager
+from sharded_memory import ShardedMemoryManager
+from sqlite_memory import SQLiteMemoryManager
+from memory_writer import MemoryWriter
+from memory_consolidator import MemoryConsolidator
+from memory_dedup import client_metadata
+from memory_lifecycle import MemorySweeper, RetentionPolicy
+from memory_ranker import HybridRanker
+from memory_detector import MemoryDetector
+from storage import create_storage
 from conversation_handler import ConversationHandler
+from gemini_scheduler import SchedulerBusy, INTERACTIVE, retry_after_header
+import metrics
+from web_search import web_search
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,13 +42,43 @@ logger = logging.getLogger(__name__)
 
 # Global instances
 memory_manager: MemoryManager = None
+memory_writer: MemoryWriter = None
+memory_consolidator: MemoryConsolidator = None
+memory_sweeper: MemorySweeper = None
 conversation_handler: ConversationHandler = None
 
 
+def _register_metric_functions() -> None:
+    """Point the scrape-time metrics at the live instances."""
+    def cache_counts(attribute: str) -> Dict[str, int]:
+        return {
+            "web_search": getattr(web_search.cache, attribute),
+            "enhance": getattr(conversation_handler.enhance_cache, attribute),
+        }
+    
+    def top_users() -> Dict[str, int]:
+        counts = memory_manager.user_counts()
+        return dict(heapq.nlargest(settings.metrics_top_users, counts.items(), key=lambda item: item[1]))
+    
+    def last_write() -> Dict[tuple, float]:
+        last_update = memory_manager.get_memory_stats()["last_update"]
+        if not last_update:
+            return {}
+        return {(): datetime.fromisoformat(last_update).replace(tzinfo=timezone.utc).timestamp()}
+    
+    metrics.CACHE_HITS.set_function(lambda: cache_counts("hits"))
+    metrics.CACHE_MISSES.set_function(lambda: cache_counts("misses"))
+    metrics.MEMORIES.set_function(lambda: memory_manager.get_memory_stats()["total_memories"])
+    metrics.USERS.set_function(lambda: len(memory_manager.user_counts()))
+    metrics.USER_MEMORIES.set_function(top_users)
+    metrics.LAST_WRITE.set_function(last_write)
+    metrics.CHAT_SESSIONS.set_function(lambda: conversation_handler.sessions.stats()["active_sessions"])
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
-    global memory_manager, conversation_handler
+    global memory_manager, memory_writer, memory_consolidator, memory_sweeper, conversation_handler
     
     # Startup
     logger.info("Starting AI Agent backend...")
@@ -41,11 +92,90 @@ async def lifespan(app: FastAPI):
     
     # Initialize memory manager
     logger.info("Initializing Memory Manager...")
-    memory_manager = MemoryManager()
+    dedup_threshold = settings.memory_dedup_threshold if settings.memory_dedup else None
+    retention = RetentionPolicy(
+        ttl_days=settings.memory_ttl_days,
+        user_quota=settings.memory_user_quota,
+        half_life_days=settings.memory_decay_half_life_days
+    )
+    ranker = HybridRanker(
+        lexical_weight=settings.memory_rank_lexical_weight,
+        recency_weight=settings.memory_rank_recency_weight,
+        type_weight=settings.memory_rank_type_weight,
+        frequency_weight=settings.memory_rank_frequency_weight,
+        half_life_days=settings.memory_decay_half_life_days
+    )
+    if settings.memory_storage_backend == "sqlite":
+        memory_manager = SQLiteMemoryManager(
+            db_path=settings.memory_sqlite_path,
+            import_path=settings.memory_file_path,
+            vector_path=settings.memory_vector_path,
+            detector=MemoryDetector(settings.memory_detector_patterns),
+            dedup_threshold=dedup_threshold,
+            retention=retention,
+            ranker=ranker
+        )
+    elif settings.memory_storage_backend == "packed":
+        memory_manager = PackedMemoryManager(
+            pack_path=settings.memory_pack_path,
+            import_path=settings.memory_file_path,
+            vector_path=settings.memory_vector_path,
+            detector=MemoryDetector(settings.memory_detector_patterns),
+            max_hot_users=settings.memory_pack_hot_users,
+            compact_threshold=settings.memory_log_compact_threshold,
+            dedup_threshold=dedup_threshold,
+            retention=retention,
+            ranker=ranker
+        )
+    elif settings.memory_shards:
+        memory_manager = ShardedMemoryManager(
+            shard_dir=settings.memory_shard_dir,
+            shards=settings.memory_shards,
+            backend=settings.memory_storage_backend,
+            import_path=settings.memory_file_path,
+            detector=MemoryDetector(settings.memory_detector_patterns),
+            dedup_threshold=dedup_threshold,
+            retention=retention,
+            compact_threshold=settings.memory_log_compact_threshold,
+            shared=settings.memory_multiprocess,
+            ranker=ranker
+        )
+    else:
+        memory_manager = MemoryManager(
+            storage_path=settings.memory_file_path,
+            storage=create_storage(
+                settings.memory_storage_backend,
+                settings.memory_file_path,
+                compact_threshold=settings.memory_log_compact_threshold,
+                shared=settings.memory_multiprocess
+            ),
+            vector_path=settings.memory_vector_path,
+            detector=MemoryDetector(settings.memory_detector_patterns),
+            dedup_threshold=dedup_threshold,
+            retention=retention,
+            ranker=ranker
+        )
+    
+    # Start background memory writer
+    memory_writer = MemoryWriter(
+        memory_manager,
+        batch_size=settings.memory_writer_batch_size,
+        recall_flush_interval=settings.memory_recall_flush_interval
+    )
+    memory_writer.start()
+    memory_consolidator = MemoryConsolidator(memory_manager, interval=settings.memory_consolidation_interval)
+    memory_consolidator.start()
+    memory_sweeper = MemorySweeper(
+        memory_manager,
+        interval=settings.memory_sweep_interval,
+        batch_users=settings.memory_sweep_batch_users
+    )
+    memory_sweeper.start()
     
     # Initialize conversation handler
     logger.info("Initializing Conversation Handler...")
-    conversation_handler = ConversationHandler(memory_manager)
+    conversation_handler = ConversationHandler(memory_manager, memory_writer=memory_writer)
+    _register_metric_functions()
     
     logger.info("Backend ready!")
     
@@ -53,6 +183,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down AI Agent backend...")
+    await memory_consolidator.stop()
+    await memory_sweeper.stop()
+    logger.info("Draining memory writer...")
+    await memory_writer.drain()
+    await asyncio.to_thread(memory_manager.close)
+    web_search.close()
 
 
 # Create FastAPI app
@@ -73,6 +209,25 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    """Time every request, labelled by route template rather than raw path."""
+    start = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        metrics.REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            endpoint=route.path if route else "unmatched",
+            status=status_code
+        )
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -94,7 +249,7 @@ async def chat(request: ChatRequest):
         logger.info(f"Chat request from user: {request.user_id}")
         
         # Generate response with memory context
-        response_text, memories_used = conversation_handler.generate_response(
+        response_text, memories_used = await conversation_handler.generate_response(
             user_message=request.message,
             user_id=request.user_id,
             memory_enabled=request.memory_enabled
@@ -106,11 +261,63 @@ async def chat(request: ChatRequest):
             timestamp=datetime.utcnow()
         )
         
+    except SchedulerBusy as e:
+        logger.warning(f"Chat request rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing chat: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming chat endpoint using Server-Sent Events.
+    
+    Emits a `memories` event, `tool_call` events for tool calls, `chunk`
+    events with response text as it is generated, and a final `done` event
+    carrying the same fields as the /chat response.
+    """
+    logger.info(f"Streaming chat request from user: {request.user_id}")
+    
+    # Refuse up front when Gemini is saturated; once the stream has started
+    # errors can only be reported as events
+    try:
+        conversation_handler.scheduler.check(INTERACTIVE)
+    except SchedulerBusy as e:
+        logger.warning(f"Streaming chat request rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
+    
+    async def event_stream():
+        try:
+            async for event, data in conversation_handler.stream_response(
+                user_message=request.message,
+                user_id=request.user_id,
+                memory_enabled=request.memory_enabled
+            ):
+                if event == "done":
+                    data = ChatResponse(
+                        response=data["response"],
+                        memories_used=data["memories_used"],
+                        timestamp=datetime.utcnow()
+                    ).model_dump(mode="json")
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        except SchedulerBusy as e:
+            logger.warning(f"Chat stream rejected: {e}")
+            error = {"detail": str(e), "retry_after": e.retry_after}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+        except Exception as e:
+            logger.error(f"Error in chat stream: {e}")
+            error = {"detail": f"Error processing chat: {str(e)}"}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/enhance")
 async def enhance_prompt(request: dict):
     """
@@ -124,26 +331,35 @@ async def enhance_prompt(request: dict):
         if not user_prompt.strip():
             raise HTTPException(status_code=400, detail="Prompt cannot be empty")
         
-        # Use AI to enhance the prompt
-        enhancement_instruction = f"""You are a prompt enhancement assistant. Take the user's simple prompt and make it more detailed, specific, and effective for an AI conversation.
-
-User's original prompt: "{user_prompt}"
-
-Enhanced prompt (return ONLY the enhanced prompt, nothing else):"""
-        
-        response = conversation_handler.model.generate_content(enhancement_instruction)
-        enhanced_prompt = response.text.strip()
+        enhanced_prompt = await conversation_handler.enhance_prompt(user_prompt)
         
         return {
             "original": user_prompt,
             "enhanced": enhanced_prompt
         }
         
+    except SchedulerBusy as e:
+        logger.warning(f"Enhance request rejected: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         logger.error(f"Error in enhance endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Error enhancing prompt: {str(e)}")
 
 
+def _explicit_memory(key: str, value: str, user_id: str, metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Memory item for an explicit /remember request."""
+    return {
+        "content": f"{key}: {value}",
+        "user_id": user_id,
+        "metadata": {
+            "key": key,
+            "type": "explicit",
+            **client_metadata(metadata)
+        },
+        "source": "Explicit user request"
+    }
+
+
 @app.post("/remember", response_model=RememberResponse)
 async def remember(request: RememberRequest):
     """
@@ -155,16 +371,10 @@ async def remember(request: RememberRequest):
         logger.info(f"Remember request from user: {request.user_id}")
         
         # Store memory
-        memory_id = memory_manager.store_memory(
-            content=f"{request.key}: {request.value}",
-            user_id=request.user_id,
-            metadata={
-                "key": request.key,
-                "type": "explicit",
-                **(request.metadata or {})
-            },
-            source="Explicit user request"
-        )
+        memory_id = (await asyncio.to_thread(
+            memory_manager.store_memories,
+            [_explicit_memory(request.key, request.value, request.user_id, request.metadata)]
+        ))[0]
         
         return RememberResponse(
             success=True,
@@ -182,16 +392,19 @@ async def recall(request: RecallRequest):
     """
     Memory recall endpoint.
     
-    Retrieves memories based on semantic similarity to query.
+    Retrieves memories by BM25 keyword relevance or, with mode="semantic",
+    by embedding similarity to the query.
     """
     try:
         logger.info(f"Recall request from user: {request.user_id}")
         
         # Retrieve memories
-        memories = memory_manager.retrieve_memories(
+        memories = await asyncio.to_thread(
+            memory_manager.retrieve_memories,
             query=request.query,
             user_id=request.user_id,
-            limit=request.limit
+            limit=request.limit,
+            mode=request.mode
         )
         
         return RecallResponse(
@@ -204,6 +417,107 @@ async def recall(request: RecallRequest):
         raise HTTPException(status_code=500, detail=f"Error recalling memories: {str(e)}")
 
 
+@app.post("/remember/bulk", response_model=BulkRememberResponse)
+async def remember_bulk(request: BulkRememberRequest):
+    """
+    Bulk memory storage endpoint.
+    
+    Stores all items for one user with a single persistence flush, e.g. when
+    importing a user's history.
+    """
+    try:
+        logger.info(f"Bulk remember request from user: {request.user_id} ({len(request.items)} items)")
+        
+        memory_ids = await asyncio.to_thread(
+            memory_manager.store_memories,
+            [
+                _explicit_memory(item.key, item.value, request.user_id, item.metadata)
+                for item in request.items
+            ]
+        )
+        
+        return BulkRememberResponse(
+            success=True,
+            memory_ids=memory_ids,
+            # Items merged into the same memory share its id
+            count=len(set(memory_ids))
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in bulk remember endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error storing memories: {str(e)}")
+
+
+@app.post("/recall/bulk", response_model=BulkRecallResponse)
+async def recall_bulk(request: BulkRecallRequest):
+    """
+    Bulk memory recall endpoint.
+    
+    Answers every query against the user's memories in one pass.
+    """
+    try:
+        logger.info(f"Bulk recall request from user: {request.user_id} ({len(request.queries)} queries)")
+        
+        results = await asyncio.to_thread(
+            memory_manager.retrieve_memories_bulk,
+            queries=request.queries,
+            user_id=request.user_id,
+            limit=request.limit,
+            mode=request.mode
+        )
+        
+        return BulkRecallResponse(
+            results=[RecallResponse(memories=memories, count=len(memories)) for memories in results]
+        )
+        
+    except Exception as e:
+        logger.error(f"Error in bulk recall endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error recalling memories: {str(e)}")
+
+
+@app.delete("/memories/{memory_id}", response_model=ForgetResponse)
+async def forget_memory(memory_id: str, user_id: str = "default_user"):
+    """
+    Delete one of a user's memories.
+    
+    Costs time proportional to that user's memories, not the whole store.
+    """
+    try:
+        logger.info(f"Forget request from user: {user_id} ({memory_id})")
+        
+        deleted = await asyncio.to_thread(memory_manager.delete_memories, user_id, [memory_id])
+        
+    except Exception as e:
+        logger.error(f"Error in forget endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error deleting memory: {str(e)}")
+    
+    if not deleted:
+        raise HTTPException(status_code=404, detail=f"Memory {memory_id} not found for user {user_id}")
+    return ForgetResponse(success=True, deleted=deleted, message=f"Deleted memory {memory_id}")
+
+
+@app.delete("/memories", response_model=ForgetResponse)
+async def forget_user(user_id: str):
+    """
+    Delete all of a user's memories and their chat session.
+    
+    Conversation turns already queued for the memory writer are stored
+    first, so none of them reappears after the user is forgotten.
+    """
+    try:
+        logger.info(f"Forget-all request from user: {user_id}")
+        
+        await memory_writer.flush()
+        deleted = await asyncio.to_thread(memory_manager.delete_memories, user_id)
+        conversation_handler.sessions.clear(user_id)
+        
+        return ForgetResponse(success=True, deleted=deleted, message=f"Deleted {deleted} memories of {user_id}")
+        
+    except Exception as e:
+        logger.error(f"Error in forget-all endpoint: {e}")
+        raise HTTPException(status_code=500, detail=f"Error deleting memories: {str(e)}")
+
+
 @app.get("/status", response_model=StatusResponse)
 async def status(user_id: str = "default_user"):
     """
@@ -213,12 +527,12 @@ async def status(user_id: str = "default_user"):
     """
     try:
         # Get memory stats
-        stats = memory_manager.get_memory_stats(user_id=user_id)
+        stats = await asyncio.to_thread(memory_manager.get_memory_stats, user_id=user_id)
         
         return StatusResponse(
             status="operational",
             memory_count=stats.get("total_memories", 0),
-            last_update=datetime.utcnow(),
+            last_update=stats.get("last_update"),
             storage_status=stats.get("status", "unknown")
         )
         
@@ -227,6 +541,29 @@ async def status(user_id: str = "default_user"):
         raise HTTPException(status_code=500, detail=f"Error getting status: {str(e)}")
 
 
+@app.get("/stats")
+async def stats():
+    """Internal runtime statistics for background workers and caches."""
+    return {
+        "memory_writer": memory_writer.stats(),
+        "memory_consolidation": memory_consolidator.stats(),
+        "memory_sweeper": memory_sweeper.stats(),
+        "web_search_cache": web_search.stats(),
+        "enhance_cache": conversation_handler.enhance_cache.stats(),
+        "prompt": conversation_handler.prompt_builder.stats(),
+        "chat_sessions": conversation_handler.sessions.stats(),
+        "tools": conversation_handler.tools.stats(),
+        "gemini_scheduler": conversation_handler.scheduler.stats()
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Metrics in the Prometheus text exposition format."""
+    body = await asyncio.to_thread(metrics.REGISTRY.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/health")
 async def health():
     """Health check endpoint for deployment platforms."""
@@ -0,0 +1,101 @@
+"""Background job that merges duplicate memories already in the store."""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from memory_manager import MemoryManager
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryConsolidator:
+    """
+    Runs ``MemoryManager.consolidate`` every ``interval`` seconds on an asyncio task.
+
+    Write-time deduplication only compares new memories with stored ones;
+    this catches duplicates stored before it was enabled, or written by
+    another process, and keeps running totals of what it reclaimed.
+    """
+
+    def __init__(self, memory_manager: MemoryManager, interval: float = 3600.0):
+        self.memory_manager = memory_manager
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+        self.runs = 0
+        self.scanned = 0
+        self.reclaimed = 0
+        self.last_run: Optional[str] = None
+        self.last_result: Dict[str, Any] = {}
+
+    def start(self) -> None:
+        """Start the periodic task on the running event loop (no-op if ``interval`` is 0)."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="memory-consolidator")
+
+    async def stop(self) -> None:
+        """Cancel the periodic task; a pass already running in its thread finishes first."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Consolidate the store now, in a worker thread."""
+        result = await asyncio.to_thread(self.memory_manager.consolidate)
+        self.runs += 1
+        self.scanned += result["scanned"]
+        self.reclaimed += result["reclaimed"]
+        self.last_run = datetime.utcnow().isoformat()
+        self.last_result = result
+        if result["reclaimed"]:
+            logger.info(f"Consolidation reclaimed {result['reclaimed']} of {result['scanned']} memories")
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Error consolidating memories: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "runs": self.runs,
+            "memories_scanned": self.scanned,
+            "memories_reclaimed": self.reclaimed,
+            "last_run": self.last_run,
+            "last_result": self.last_result,
+        }
+
+
+if __name__ == "__main__":
+    from storage import create_storage
+
+    parser = argparse.ArgumentParser(description="Merge duplicate memories in an existing store.")
+    parser.add_argument("path", help="Memory file (json/log backends), SQLite database or pack file")
+    parser.add_argument("--backend", choices=["json", "log", "sqlite", "packed"], default="json")
+    parser.add_argument("--threshold", type=float, default=None, help="near-duplicate similarity (0-1)")
+    args = parser.parse_args()
+
+    options = {"dedup_threshold": args.threshold} if args.threshold is not None else {}
+    if args.backend == "sqlite":
+        from sqlite_memory import SQLiteMemoryManager
+        manager = SQLiteMemoryManager(args.path, **options)
+    elif args.backend == "packed":
+        from packed_memory import PackedMemoryManager
+        manager = PackedMemoryManager(args.path, **options)
+    else:
+        manager = MemoryManager(args.path, storage=create_storage(args.backend, args.path), **options)
+    result = manager.consolidate()
+    manager.close()
+    print(f"Scanned {result['scanned']} memories of {result['users']} users, "
+          f"reclaimed {result['reclaimed']} in {result['seconds']}s")
@@ -0,0 +1,258 @@
+"""Exact and near-duplicate detection for memories, using SimHash over word shingles."""
+from collections import namedtuple
+from collections.abc import Mapping
+from typing import List, Dict, Any, Tuple, Callable, Iterable, Optional, FrozenSet
+
+import numpy as np
+
+from memory_index import TOKEN_PATTERN
+from memory_lifecycle import mention_count, recall_count
+
+DEFAULT_THRESHOLD = 0.9
+# Memories whose SimHashes differ in more bits are never compared
+MAX_DISTANCE = 12
+# Closest candidates verified per lookup
+MAX_CANDIDATES = 16
+# Shorter texts only merge when their normalized forms are identical
+MIN_NEAR_TOKENS = 4
+MASK64 = (1 << 64) - 1
+# Set bits of every byte value; np.bitwise_count only exists from NumPy 2.0
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+# Metadata maintained by the store; client-supplied values are dropped
+BOOKKEEPING_KEYS = frozenset({"mentions", "last_seen", "recalls"})
+
+Fingerprint = namedtuple("Fingerprint", ["normalized", "shingles", "simhash"])
+
+
+def normalize(text: str) -> str:
+    """Lowercase ``text`` and reduce it to its words separated by single spaces."""
+    return " ".join(TOKEN_PATTERN.findall(text.lower()))
+
+
+def shingles(normalized: str) -> FrozenSet[str]:
+    """Words and word bigrams of a normalized text; stopwords are kept so negations count."""
+    words = normalized.split()
+    return frozenset(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def simhashes(feature_sets: List[FrozenSet[str]]) -> np.ndarray:
+    """
+    64-bit SimHash of each feature set, computed in one vectorized pass.
+
+    Similar feature sets give hashes a small Hamming distance apart; an
+    empty set hashes to 0.
+    """
+    lengths = np.fromiter((len(features) for features in feature_sets), dtype=np.int64, count=len(feature_sets))
+    result = np.zeros(len(feature_sets), dtype=np.uint64)
+    if not lengths.sum():
+        return result
+    # Fingerprints are never persisted, so the per-process string hash will do
+    hashes = np.fromiter(
+        (hash(feature) & MASK64 for features in feature_sets for feature in features),
+        dtype=np.uint64, count=int(lengths.sum())
+    )
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(len(hashes), 64)
+    nonempty = lengths > 0
+    starts = (np.cumsum(lengths) - lengths)[nonempty]
+    counts = np.add.reduceat(bits, starts, axis=0, dtype=np.int64)
+    majority = counts * 2 > lengths[nonempty, None]
+    result[nonempty] = np.packbits(majority, axis=1).view(np.uint64)[:, 0]
+    return result
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Number of set bits of each uint64 in ``values``."""
+    return POPCOUNT[values.view(np.uint8)].reshape(len(values), 8).sum(axis=1, dtype=np.int64)
+
+
+def simhash(features: FrozenSet[str]) -> int:
+    """SimHash of a single feature set (cheaper than ``simhashes`` for one)."""
+    if not features:
+        return 0
+    hashes = np.fromiter((hash(feature) & MASK64 for feature in features), dtype=np.uint64, count=len(features))
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(len(features), 64)
+    return int(np.packbits(bits.sum(axis=0) * 2 > len(features)).view(np.uint64)[0])
+
+
+def fingerprint_of(content: str) -> Fingerprint:
+    normalized = normalize(content)
+    features = shingles(normalized)
+    return Fingerprint(normalized, features, simhash(features))
+
+
+def fingerprints(contents: Iterable[str]) -> List[Fingerprint]:
+    """``fingerprint_of`` for many texts, with the SimHashes computed in one pass."""
+    normalized = [normalize(content) for content in contents]
+    features = [shingles(text) for text in normalized]
+    return list(map(Fingerprint, normalized, features, simhashes(features).tolist()))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _kind(memory: Mapping) -> Tuple[Any, Any]:
+    """Only memories of the same type (and, for explicit ones, the same key) can merge."""
+    metadata = memory.get("metadata") or {}
+    return metadata.get("type"), metadata.get("key")
+
+
+def client_metadata(metadata: Optional[Mapping]) -> Dict[str, Any]:
+    """Client-supplied metadata without the keys the store maintains itself."""
+    return {key: value for key, value in (metadata or {}).items() if key not in BOOKKEEPING_KEYS}
+
+
+def _seen_at(memory: Mapping) -> str:
+    """ISO time of a memory's latest mention, ignoring a malformed ``last_seen``."""
+    value = (memory.get("metadata") or {}).get("last_seen")
+    return value if isinstance(value, str) and value else memory.get("timestamp") or ""
+
+
+def merge_metadata(existing: Mapping, duplicate: Mapping) -> Dict[str, Any]:
+    """
+    Metadata of ``existing`` after folding ``duplicate`` into it.
+
+    Newer metadata values win; ``mentions`` counts how often the memory was
+    stored, ``last_seen`` is the timestamp of the latest mention and
+    ``recalls`` adds up how often either was recalled.
+    """
+    old = existing.get("metadata") or {}
+    new = duplicate.get("metadata") or {}
+    merged = {**old, **new}
+    merged["mentions"] = int(mention_count(existing) + mention_count(duplicate))
+    merged["last_seen"] = max(_seen_at(existing), _seen_at(duplicate))
+    recalls = int(recall_count(existing) + recall_count(duplicate))
+    if recalls:
+        merged["recalls"] = recalls
+    return merged
+
+
+class UserFingerprints:
+    """
+    SimHashes of one user's memories in a contiguous array.
+
+    With ``keep_fingerprints`` the full fingerprints are kept too, so
+    candidates need not be re-normalized; that trades memory for speed in
+    one-off passes such as ``find_duplicates``.
+    """
+
+    def __init__(self, keep_fingerprints: bool = False):
+        self.memories: List[Mapping] = []
+        self.hashes = np.zeros(16, dtype=np.uint64)
+        self.fingerprints: Optional[List[Fingerprint]] = [] if keep_fingerprints else None
+
+    def add(self, memory: Mapping, fingerprint: Fingerprint) -> None:
+        size = len(self.memories)
+        if size == len(self.hashes):
+            grown = np.zeros(size * 2, dtype=np.uint64)
+            grown[:size] = self.hashes
+            self.hashes = grown
+        self.hashes[size] = fingerprint.simhash
+        self.memories.append(memory)
+        if self.fingerprints is not None:
+            self.fingerprints.append(fingerprint)
+
+    def candidates(self, simhash_value: int) -> List[Tuple[Mapping, Fingerprint]]:
+        """``(memory, fingerprint)`` within ``MAX_DISTANCE`` bits of ``simhash_value``, closest first."""
+        distances = popcount64(self.hashes[:len(self.memories)] ^ np.uint64(simhash_value))
+        rows = np.flatnonzero(distances <= MAX_DISTANCE)
+        rows = rows[np.argsort(distances[rows], kind="stable")[:MAX_CANDIDATES]]
+        if self.fingerprints is not None:
+            return [(self.memories[row], self.fingerprints[row]) for row in rows.tolist()]
+        return [(self.memories[row], None) for row in rows.tolist()]
+
+
+class DedupIndex:
+    """
+    Finds a stored memory that a new one duplicates.
+
+    A user's memories are fingerprinted the first time that user stores
+    something; after that new memories are added as they are stored. Two
+    memories of the same kind are duplicates when their normalized text is
+    identical, or when both have at least ``MIN_NEAR_TOKENS`` words and the
+    Jaccard similarity of their word shingles reaches ``threshold``. SimHash
+    distance preselects the candidates that are compared.
+    """
+
+    def __init__(
+        self,
+        user_memories: Callable[[str], List[Mapping]],
+        threshold: float = DEFAULT_THRESHOLD,
+        keep_fingerprints: bool = False
+    ):
+        """
+        Args:
+            user_memories: Returns the stored memories of a user, oldest first
+            threshold: Minimum shingle Jaccard similarity of a near-duplicate
+            keep_fingerprints: Keep normalized text and shingles, not just SimHashes
+        """
+        self.user_memories = user_memories
+        self.threshold = threshold
+        self.keep_fingerprints = keep_fingerprints
+        self._users: Dict[str, UserFingerprints] = {}
+
+    def _user(self, user_id: str) -> UserFingerprints:
+        user = self._users.get(user_id)
+        if user is None:
+            user = UserFingerprints(self.keep_fingerprints)
+            memories = self.user_memories(user_id)
+            for memory, fingerprint in zip(memories, fingerprints(memory["content"] for memory in memories)):
+                user.add(memory, fingerprint)
+            self._users[user_id] = user
+        return user
+
+    def find(self, memory: Mapping, fingerprint: Optional[Fingerprint] = None) -> Optional[Mapping]:
+        """Return the stored memory ``memory`` duplicates, or None."""
+        fingerprint = fingerprint or fingerprint_of(memory["content"])
+        if not fingerprint.normalized:
+            return None
+        kind = _kind(memory)
+        near = len(fingerprint.normalized.split()) >= MIN_NEAR_TOKENS
+        for candidate, candidate_fingerprint in self._user(memory["user_id"]).candidates(fingerprint.simhash):
+            if _kind(candidate) != kind:
+                continue
+            candidate_fingerprint = candidate_fingerprint or fingerprint_of(candidate["content"])
+            if candidate_fingerprint.normalized == fingerprint.normalized:
+                return candidate
+            if near and jaccard(candidate_fingerprint.shingles, fingerprint.shingles) >= self.threshold:
+                return candidate
+        return None
+
+    def add(self, memory: Mapping, fingerprint: Optional[Fingerprint] = None) -> None:
+        """Fingerprint a newly stored memory if its user's fingerprints are already built."""
+        user = self._users.get(memory["user_id"])
+        if user is not None:
+            user.add(memory, fingerprint or fingerprint_of(memory["content"]))
+
+    def drop(self, user_id: str) -> None:
+        """Forget a user's fingerprints; they are rebuilt on that user's next write."""
+        self._users.pop(user_id, None)
+
+
+def find_duplicates(
+    memories: Iterable[Mapping],
+    threshold: float = DEFAULT_THRESHOLD
+) -> Tuple[List[Mapping], List[Tuple[Mapping, Mapping]]]:
+    """
+    Split memories into the ones to keep and the duplicates to fold into them.
+
+    Each memory is compared with the kept memories before it, so the oldest
+    of a group of duplicates survives.
+
+    Returns:
+        ``(kept, merges)`` where ``merges`` holds ``(kept memory, duplicate)``
+        pairs in input order
+    """
+    memories = list(memories)
+    index = DedupIndex(lambda user_id: [], threshold, keep_fingerprints=True)
+    kept, merges = [], []
+    for memory, fingerprint in zip(memories, fingerprints(memory["content"] for memory in memories)):
+        match = index.find(memory, fingerprint)
+        if match is None:
+            index.add(memory, fingerprint)
+            kept.append(memory)
+        else:
+            merges.append((match, memory))
+    return kept, merges
@@ -0,0 +1,69 @@
+"""Single-pass detection of memory-worthy chat messages."""
+import re
+from typing import Dict, List, Optional
+
+# Category -> phrase patterns. Categories are tried in this order when two
+# phrases match at the same position.
+DEFAULT_PATTERNS: Dict[str, List[str]] = {
+    # User expresses a preference
+    "preference": [r"i like", r"i love", r"i prefer", r"my favorite", r"i enjoy"],
+    # User asks to remember something
+    "explicit_remember": [r"remember", r"don't forget", r"keep in mind", r"note that"],
+    # Long-term goals or habits
+    "goal": [r"i want to", r"i'm trying to", r"i always", r"i never", r"my goal"],
+    # Personal information
+    "identity": [r"my name is", r"i am", r"i work as", r"i live in", r"i'm from"],
+    "dislike": [r"i hate", r"i dislike", r"i don't like"],
+}
+
+
+class MemoryDetector:
+    """
+    Detects memory-worthy messages with one precompiled regex.
+
+    All phrases are combined into a single alternation with one named group
+    per category, so a message is scanned once no matter how many patterns
+    are configured, and the matching group names the category. When every
+    phrase starts with a literal character, a lookahead on those first
+    characters lets the scan skip most positions without trying each phrase.
+    Patterns are matched against the lowercased message.
+    """
+
+    def __init__(self, extra_patterns: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            extra_patterns: Additional ``{category: [regex, ...]}`` entries;
+                phrases for an existing category are appended to it
+        """
+        patterns = {category: list(phrases) for category, phrases in DEFAULT_PATTERNS.items()}
+        for category, phrases in (extra_patterns or {}).items():
+            if not category.isidentifier():
+                raise ValueError(f"Invalid memory pattern category: {category!r}")
+            patterns.setdefault(category, []).extend(phrases)
+
+        groups = "|".join(
+            f"(?P<{category}>{'|'.join(phrases)})"
+            for category, phrases in patterns.items()
+            if phrases
+        )
+        self.categories = list(patterns)
+        self._pattern = re.compile(rf"\b{self._first_char_filter(patterns)}(?:{groups})\b")
+
+    @staticmethod
+    def _first_char_filter(patterns: Dict[str, List[str]]) -> str:
+        """Lookahead on the phrases' possible first characters, if all are literal."""
+        first_chars = set()
+        for phrases in patterns.values():
+            for phrase in phrases:
+                if not phrase or not (phrase[0].isalnum() or phrase[0] == "'"):
+                    return ""
+                first_chars.add(phrase[0].lower())
+        return f"(?=[{re.escape(''.join(sorted(first_chars)))}])"
+
+    def detect(self, message: str) -> Optional[str]:
+        """Return the category of the first memory-worthy phrase, or None."""
+        match = self._pattern.search(message.lower())
+        if match is None:
+            return None
+        # Extra patterns may contain their own groups, so don't rely on lastgroup
+        return next(category for category, text in match.groupdict().items() if text is not None)
@@ -0,0 +1,241 @@
+"""Per-user inverted index and BM25 ranking over memory content."""
+import bisect
+import heapq
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Tuple, Iterable, Optional, Callable
+
+import numpy as np
+
+from memory_ranker import HybridRanker, MemoryFeatures, select
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been
+before being below between both but by can did do does doing down during each
+few for from further had has have having he her here hers herself him himself
+his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there
+these they this those through to too under until up very was we were what
+when where which while who whom why will with you your yours yourself
+yourselves i'm i've i'd i'll it's don't
+""".split())
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Unknown query tokens at least this long match indexed tokens they prefix
+MIN_PREFIX = 3
+# Most indexed tokens one query token expands to
+MAX_EXPANSIONS = 16
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase ``text``, split it into words and drop stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class UserIndex:
+    """Postings and BM25 statistics for a single user's memories."""
+
+    def __init__(self):
+        # Memories in insertion order; postings refer to positions in this list
+        self.memories: List[Dict[str, Any]] = []
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        # token -> [(doc, term frequency)]; document frequency is len(postings[token])
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        # Indexed tokens in sorted order, for prefix lookups
+        self.vocabulary: List[str] = []
+        self.features = MemoryFeatures()
+        # id(memory) -> doc, built the first time a memory's features are updated
+        self._docs: Optional[Dict[int, int]] = None
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        doc = len(self.memories)
+        # Everything that can fail runs before the first column grows, so the columns stay aligned
+        tokens = tokenize(memory["content"])
+        row = self.features.row(memory)
+        self.memories.append(memory)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        self.features.append(row)
+        if self._docs is not None:
+            self._docs[id(memory)] = doc
+        for token, tf in Counter(tokens).items():
+            postings = self.postings[token]
+            if not postings:
+                bisect.insort(self.vocabulary, token)
+            postings.append((doc, tf))
+
+    def update(self, memory: Dict[str, Any]) -> None:
+        """Refresh the ranking features of an indexed memory whose metadata changed."""
+        if self._docs is None:
+            self._docs = {id(m): doc for doc, m in enumerate(self.memories)}
+        doc = self._docs.get(id(memory))
+        if doc is not None:
+            self.features.update(doc, memory)
+
+    def expand(self, token: str) -> List[str]:
+        """Indexed tokens that start with ``token`` (for tokens not indexed themselves)."""
+        if len(token) < MIN_PREFIX:
+            return []
+        vocabulary = self.vocabulary
+        start = bisect.bisect_left(vocabulary, token)
+        matches = []
+        for candidate in vocabulary[start:start + MAX_EXPANSIONS]:
+            if not candidate.startswith(token):
+                break
+            matches.append(candidate)
+        return matches
+
+    def score(self, query_tokens: Iterable[str]) -> Dict[int, float]:
+        """
+        Return ``{doc: bm25}`` for every memory sharing a query token.
+
+        A query token that is not indexed is replaced by the indexed tokens
+        it is a prefix of, so "hik" still finds "hiking".
+        """
+        n_docs = len(self.memories)
+        avg_length = self.total_length / n_docs if n_docs else 0.0
+        doc_lengths = self.doc_lengths
+        scores: Dict[int, float] = defaultdict(float)
+
+        terms = set()
+        for token in set(query_tokens):
+            terms.update([token] if token in self.postings else self.expand(token))
+        for token in terms:
+            postings = self.postings.get(token)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc, tf in postings:
+                norm = K1 * (1 - B + B * doc_lengths[doc] / avg_length) if avg_length else K1
+                scores[doc] += idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+
+class InvertedIndex:
+    """Maps user_id -> token -> posting list, maintained incrementally."""
+
+    def __init__(self, memories: Iterable[Dict[str, Any]] = ()):
+        self._users: Dict[str, UserIndex] = {}
+        for memory in memories:
+            self.add(memory)
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        """Index a newly stored memory."""
+        user_id = memory.get("user_id")
+        user_index = self._users.get(user_id)
+        if user_index is None:
+            user_index = self._users[user_id] = UserIndex()
+        user_index.add(memory)
+
+    def drop(self, user_id: str) -> None:
+        """Forget a user's postings (e.g. when evicting a cold user)."""
+        self._users.pop(user_id, None)
+
+    def update(self, memory: Dict[str, Any]) -> None:
+        """Refresh the ranking features of a stored memory after its metadata changed."""
+        user_index = self._users.get(memory.get("user_id"))
+        if user_index is not None:
+            user_index.update(memory)
+
+    def rebuild(self, user_id: str, memories: Iterable[Dict[str, Any]]) -> None:
+        """Re-index a user from scratch, e.g. after some of their memories were removed."""
+        self._users.pop(user_id, None)
+        for memory in memories:
+            self.add(memory)
+
+    def memories(self, user_id: str) -> List[Dict[str, Any]]:
+        """Return a user's memories in insertion order."""
+        user_index = self._users.get(user_id)
+        return user_index.memories if user_index else []
+
+    def count(self, user_id: str) -> int:
+        user_index = self._users.get(user_id)
+        return len(user_index.memories) if user_index else 0
+
+    def user_counts(self) -> Dict[str, int]:
+        """Number of indexed memories per user."""
+        return {user_id: len(user_index.memories) for user_id, user_index in self._users.items()}
+
+    def search(
+        self,
+        query: str,
+        user_id: str,
+        limit: int,
+        ranker: Optional[HybridRanker] = None,
+        now: Optional[float] = None,
+        keep: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Rank a user's memories against ``query``.
+
+        Candidates come from the posting lists of the query tokens. Without
+        a ranker the top ``limit`` by BM25 are selected with a bounded heap;
+        with one, all candidates are scored at once from the precomputed
+        features (see ``memory_ranker``). Counting the results as recalls is
+        up to the caller (see ``memory_ranker.record_recall``).
+
+        Args:
+            query: Query text
+            user_id: User whose memories are searched
+            limit: Number of results
+            ranker: Hybrid ranker to combine BM25 with the memory features
+            now: Unix time to score recency against (defaults to the current time)
+            keep: Predicate a memory must pass to be returned (e.g. not expired)
+
+        Returns:
+            List of ``(memory, score)`` pairs, best first
+        """
+        return self.search_many([query], user_id, limit, ranker=ranker, now=now, keep=keep)[0]
+
+    def search_many(
+        self,
+        queries: List[str],
+        user_id: str,
+        limit: int,
+        ranker: Optional[HybridRanker] = None,
+        now: Optional[float] = None,
+        keep: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Rank a user's memories against several queries at once, each as in ``search``.
+
+        Returns:
+            One ``search`` result per query, in order
+        """
+        user_index = self._users.get(user_id)
+        if user_index is None:
+            return [[] for _ in queries]
+
+        all_scores = [user_index.score(tokenize(query)) for query in queries]
+        if ranker is None:
+            results = []
+            for scores in all_scores:
+                # Ties prefer the earlier memory
+                top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+                results.append([(user_index.memories[doc], score) for doc, score in top])
+            return results
+
+        now = time.time() if now is None else now
+        memories = user_index.memories
+        results = []
+        for scores in all_scores:
+            if not scores:
+                results.append([])
+                continue
+            docs = np.fromiter(scores.keys(), dtype=np.int64, count=len(scores))
+            # Candidates in document order, so equal scores keep the earlier memory first
+            docs.sort()
+            lexical = np.fromiter((scores[doc] for doc in docs.tolist()), dtype=np.float64, count=len(docs))
+            order, ranked = ranker.order(lexical, *user_index.features.gather(docs), now)
+            top = select(memories, docs[order], ranked, limit, keep)
+            results.append([(memories[doc], score) for doc, score in top])
+        return results
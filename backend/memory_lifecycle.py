@@ -0,0 +1,195 @@
+"""Retention rules for stored memories: per-type TTLs, per-user quotas and decay scoring."""
+import asyncio
+import logging
+import math
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Tuple, Optional, Callable, TYPE_CHECKING
+
+from memory_record import EPOCH, MemoryRecord
+
+if TYPE_CHECKING:
+    from memory_manager import MemoryManager
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400.0
+
+
+def last_seen(memory: Mapping) -> float:
+    """Unix time a memory was last stored or mentioned again."""
+    value = (memory.get("metadata") or {}).get("last_seen")
+    if isinstance(value, str) and value:
+        try:
+            return (datetime.fromisoformat(value) - EPOCH).total_seconds()
+        except (TypeError, ValueError):
+            pass
+    if isinstance(memory, MemoryRecord):
+        return memory.timestamp_seconds
+    try:
+        return (datetime.fromisoformat(memory.get("timestamp")) - EPOCH).total_seconds()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _count(memory: Mapping, key: str, default: float) -> float:
+    """A numeric bookkeeping value of a memory's metadata, ``default`` if missing or malformed."""
+    value = (memory.get("metadata") or {}).get(key, default)
+    try:
+        count = float(value)
+    except (TypeError, ValueError):
+        return default
+    return max(default, count) if math.isfinite(count) else default
+
+
+def mention_count(memory: Mapping) -> float:
+    """How often a memory was stored; at least 1, whatever a stored record holds."""
+    return _count(memory, "mentions", 1.0)
+
+
+def recall_count(memory: Mapping) -> float:
+    """How often a memory was returned by recall, as counted in its metadata."""
+    return _count(memory, "recalls", 0.0)
+
+
+class RetentionPolicy:
+    """
+    How long memories live.
+
+    Memories older than the TTL of their ``metadata["type"]`` are expired,
+    and a user over ``user_quota`` loses the memories with the lowest decay
+    score, conversation memories before explicit ones. The decay score is
+    recency, halving every ``half_life_days`` since a memory was last seen,
+    with repeated mentions slowing the decay: ``1 - (1 - recency) / mentions``.
+    """
+
+    def __init__(
+        self,
+        ttl_days: Optional[Dict[str, float]] = None,
+        user_quota: int = 0,
+        half_life_days: float = 30.0
+    ):
+        """
+        Args:
+            ttl_days: Memory type -> days to keep; types not listed never expire
+            user_quota: Maximum memories per user; 0 means unlimited
+            half_life_days: Days for the recency part of the decay score to halve
+        """
+        self.ttl = {memory_type: days * DAY for memory_type, days in (ttl_days or {}).items() if days > 0}
+        self.user_quota = user_quota
+        self.half_life = half_life_days * DAY
+
+    def decay(self, memory: Mapping, now: float) -> float:
+        age = max(0.0, now - last_seen(memory))
+        recency = 0.5 ** (age / self.half_life) if self.half_life > 0 else 1.0
+        return 1.0 - (1.0 - recency) / mention_count(memory)
+
+    def expired(self, memory: Mapping, now: float) -> bool:
+        if not self.ttl:
+            return False
+        ttl = self.ttl.get((memory.get("metadata") or {}).get("type"))
+        return ttl is not None and now - last_seen(memory) > ttl
+
+    def cutoffs(self, now: float) -> Dict[str, str]:
+        """Memory type -> ISO time; memories of the type last seen before it are expired at ``now``."""
+        return {
+            memory_type: (EPOCH + timedelta(seconds=now - ttl)).isoformat()
+            for memory_type, ttl in self.ttl.items()
+        }
+
+    def live(self, now: float) -> Optional[Callable[[Mapping], bool]]:
+        """Predicate for memories not expired at ``now``, or None when nothing can expire."""
+        if not self.ttl:
+            return None
+        return lambda memory: not self.expired(memory, now)
+
+    def removals(self, memories: List[Mapping], now: Optional[float] = None) -> Tuple[List[Mapping], List[Mapping]]:
+        """
+        What a sweep removes from one user's memories.
+
+        Returns:
+            ``(expired, evicted)``: memories past their TTL, and the
+            lowest-scoring of the rest beyond ``user_quota``
+        """
+        now = time.time() if now is None else now
+        expired, live = [], []
+        for memory in memories:
+            (expired if self.expired(memory, now) else live).append(memory)
+        evicted = []
+        if self.user_quota and len(live) > self.user_quota:
+            live.sort(key=lambda m: ((m.get("metadata") or {}).get("type") == "explicit", self.decay(m, now)))
+            evicted = live[:len(live) - self.user_quota]
+        return expired, evicted
+
+
+class MemorySweeper:
+    """
+    Removes expired and over-quota memories a few users at a time.
+
+    Every ``interval`` seconds the next ``batch_users`` users (in a
+    round-robin over all users) are passed to ``MemoryManager.sweep`` in a
+    worker thread, so no pass ever locks the whole store.
+    """
+
+    def __init__(self, memory_manager: "MemoryManager", interval: float = 60.0, batch_users: int = 100):
+        self.memory_manager = memory_manager
+        self.interval = interval
+        self.batch_users = batch_users
+        self._task: Optional[asyncio.Task] = None
+        self._pending: List[str] = []
+
+        self.batches = 0
+        self.cycles = 0
+        self.scanned = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def start(self) -> None:
+        """Start sweeping on the running event loop (no-op if ``interval`` is 0)."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run(), name="memory-sweeper")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def sweep_batch(self) -> Dict[str, int]:
+        """Sweep the next batch of users."""
+        if not self._pending:
+            # Start a new cycle over the users that exist now
+            self._pending = sorted(await asyncio.to_thread(self.memory_manager.user_counts), reverse=True)
+            self.cycles += 1
+        batch = [self._pending.pop() for _ in range(min(self.batch_users, len(self._pending)))]
+        result = await asyncio.to_thread(self.memory_manager.sweep, batch)
+        self.batches += 1
+        self.scanned += result["scanned"]
+        self.expired += result["expired"]
+        self.evicted += result["evicted"]
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep_batch()
+            except Exception as e:
+                logger.error(f"Error sweeping memories: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_seconds": self.interval,
+            "batch_users": self.batch_users,
+            "cycles": self.cycles,
+            "batches": self.batches,
+            "users_pending": len(self._pending),
+            "memories_scanned": self.scanned,
+            "memories_expired": self.expired,
+            "memories_evicted": self.evicted,
+        }
@@ -1,38 +1,225 @@
-"""Simplified memory management using JSON file storage."""
-import json
-import re
+"""Simplified memory management backed by a pluggable storage engine."""
+import logging
+import threading
+import time
 import uuid
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple, Iterable
 from datetime import datetime
 from pathlib import Path
 
+from metrics import (
+    MEMORIES_DELETED, MEMORIES_EVICTED, MEMORIES_EXPIRED, MEMORIES_MERGED, MEMORIES_RECLAIMED,
+    MEMORIES_STORED, MEMORY_WRITE_SECONDS
+)
+from storage import MemoryStorage, JSONFileStorage
+from memory_dedup import DEFAULT_THRESHOLD, DedupIndex, find_duplicates, fingerprint_of, merge_metadata
+from memory_index import InvertedIndex
+from memory_lifecycle import RetentionPolicy
+from memory_ranker import RERANK_POOL, HybridRanker, record_recall
+from memory_record import MemoryRecord, conversation_source
+from semantic_index import SemanticIndex
+from memory_detector import MemoryDetector
+
+logger = logging.getLogger(__name__)
+
 
 class MemoryManager:
-    """Manages long-term memory storage using JSON files."""
+    """Manages long-term memory storage on top of a storage engine."""
     
-    def __init__(self, storage_path: str = "./memories.json"):
-        """Initialize memory manager with JSON file storage."""
+    def __init__(
+        self,
+        storage_path: str = "./memories.json",
+        storage: Optional[MemoryStorage] = None,
+        vector_path: Optional[str] = None,
+        detector: Optional[MemoryDetector] = None,
+        dedup_threshold: Optional[float] = DEFAULT_THRESHOLD,
+        retention: Optional[RetentionPolicy] = None,
+        ranker: Optional[HybridRanker] = None
+    ):
+        """
+        Initialize memory manager.
+        
+        Args:
+            storage_path: Path of the memory file (used by the default JSON engine)
+            storage: Storage engine to use; defaults to a single JSON file
+            vector_path: Where to persist semantic embeddings; None keeps them in memory
+            detector: Memory-worthiness detector; defaults to the built-in patterns
+            dedup_threshold: Shingle similarity at which a new memory is merged into
+                a stored near-duplicate (see ``memory_dedup``); None disables
+                deduplication on write
+            retention: TTLs and per-user quota; defaults to keeping everything
+            ranker: Combines relevance with recency, type and frequency on
+                recall; defaults to ``HybridRanker()``
+        """
         self.storage_path = Path(storage_path)
-        self.memories = self._load_memories()
+        self.storage = storage or JSONFileStorage(storage_path)
+        self.detector = detector or MemoryDetector()
+        self.dedup_threshold = dedup_threshold
+        self.retention = retention or RetentionPolicy()
+        self.ranker = ranker or HybridRanker()
+        self._vector_path = vector_path
+        # Callers may run in worker threads: _lock guards the in-memory state,
+        # _write_lock serializes writes to the storage engine.
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self.memories = self._by_id(self._load_memories())
+        self._reindex()
+        # Memories recalled since the last flush_recalls, by id
+        self._recalled: Dict[str, MemoryRecord] = {}
+        # Timestamp of the most recent write; memories are kept in write order
+        self.last_update: Optional[str] = (
+            next(reversed(self.memories.values()))["timestamp"] if self.memories else None
+        )
         
-    def _load_memories(self) -> List[Dict[str, Any]]:
-        """Load memories from JSON file."""
-        if self.storage_path.exists():
-            try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"Error loading memories: {e}")
-                return []
-        return []
+    def _load_memories(self) -> List[MemoryRecord]:
+        """Load memories from the storage engine as compact records."""
+        return [MemoryRecord.from_dict(memory) for memory in self.storage.load()]
+    
+    @staticmethod
+    def _by_id(records: Iterable[MemoryRecord]) -> Dict[Any, MemoryRecord]:
+        """Key records by their packed id, keeping write order, so one can be found or removed in O(1)."""
+        return {record.id_key: record for record in records}
+    
+    def _reindex(self) -> None:
+        """Rebuild the keyword, semantic and duplicate indexes from ``self.memories``."""
+        self.index = InvertedIndex(self.memories.values())
+        self.semantic_index = SemanticIndex(self.index.memories, path=self._vector_path)
+        self.dedup = DedupIndex(self.index.memories, self.dedup_threshold) if self.dedup_threshold else None
     
     def _save_memories(self) -> None:
-        """Save memories to JSON file."""
-        try:
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                json.dump(self.memories, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"Error saving memories: {e}")
+        """Rewrite the full memory list to the storage engine."""
+        with self._write_lock:
+            self.storage.rewrite(self.memories.values())
+    
+    def _persist(self, records: List[Dict[str, Any]]) -> None:
+        """Persist newly added memories."""
+        with self._write_lock:
+            try:
+                with MEMORY_WRITE_SECONDS.time():
+                    self.storage.append(records, self.memories.values())
+            except Exception:
+                logger.exception(f"Error saving {len(records)} memories")
+    
+    def _delete_stored(self, memory_ids: List[str]) -> None:
+        """Persist the removal of memories already dropped from ``self.memories``."""
+        with self._write_lock:
+            try:
+                with MEMORY_WRITE_SECONDS.time():
+                    self.storage.delete(memory_ids, self.memories.values())
+            except Exception:
+                logger.exception(f"Error deleting {len(memory_ids)} memories")
+    
+    def _sync(self) -> None:
+        """Pick up memories written or deleted by other processes sharing the storage."""
+        if not self.storage.shared:
+            return
+        with self._write_lock:
+            reloaded, entries = self.storage.refresh()
+            if not reloaded and not entries:
+                return
+            with self._lock:
+                if reloaded:
+                    records = [MemoryRecord.from_dict(memory) for memory in entries]
+                    if records:
+                        self.last_update = records[-1]["timestamp"]
+                    self.memories = self._by_id(records)
+                    self._reindex()
+                    return
+                # Users who lost memories are re-indexed once, after the batch
+                removed_from: Dict[str, List[str]] = {}
+                for entry in entries:
+                    if entry.get("op") == "delete":
+                        memory = self.memories.pop(MemoryRecord.id_key_of(entry["id"]), None)
+                        if memory is not None:
+                            removed_from.setdefault(memory["user_id"], []).append(entry["id"])
+                        continue
+                    if entry.get("op") != "put":
+                        continue
+                    memory = MemoryRecord.from_dict(entry["data"])
+                    self.last_update = memory["timestamp"]
+                    stored = self.memories.get(memory.id_key)
+                    if stored is not None:
+                        # Another process merged a duplicate into a memory we already have
+                        stored.update_metadata(memory["metadata"])
+                        self.index.update(stored)
+                        continue
+                    self.memories[memory.id_key] = memory
+                    self.index.add(memory)
+                    self.semantic_index.add(memory)
+                    if self.dedup is not None:
+                        self.dedup.add(memory)
+                for user_id, memory_ids in removed_from.items():
+                    self._drop_from_indexes(user_id, memory_ids)
+    
+    @contextmanager
+    def synced(self):
+        """
+        Hold the storage's cross-process lock, caught up with other processes' writes.
+        
+        Nothing is written to the store inside the block, so state derived
+        from ``self.memories`` there matches the files on disk.
+        """
+        with self._write_lock, self.storage.locked():
+            self._sync()
+            yield
+    
+    def _user_snapshot(self, user_id: str) -> List[Dict[str, Any]]:
+        """A snapshot of a user's memories, oldest first."""
+        with self._lock:
+            return list(self.index.memories(user_id))
+    
+    def _drop_from_indexes(self, user_id: str, memory_ids: Iterable[str]) -> None:
+        """Re-index a user after some of their memories left ``self.memories``; caller holds _lock."""
+        remaining = [memory for memory in self.index.memories(user_id) if self.memories.get(memory.id_key) is memory]
+        self.index.rebuild(user_id, remaining)
+        self.semantic_index.remove(user_id, memory_ids)
+        if self.dedup is not None:
+            self.dedup.drop(user_id)
+    
+    def _note_recalls(self, results: List[List[Tuple[Dict[str, Any], float]]]) -> None:
+        """Count one recall of every memory returned by a search; caller holds _lock."""
+        recalled = {id(memory): memory for hits in results for memory, _ in hits}
+        for memory in recalled.values():
+            record_recall(memory)
+            self.index.update(memory)
+            self._recalled[memory["id"]] = memory
+    
+    def flush_recalls(self) -> int:
+        """
+        Persist the recall counts gathered since the last flush.
+        
+        Recalls only update the in-memory records, so the frequency signal
+        survives a restart once they are flushed (see ``MemoryWriter``).
+        
+        Returns:
+            Number of memories written
+        """
+        with self._write_lock:
+            with self._lock:
+                # Skip memories deleted (or reloaded by a sync) since they were recalled
+                pending = [memory for memory in self._recalled.values() if self.memories.get(memory.id_key) is memory]
+                self._recalled = {}
+            if pending:
+                self._persist(pending)
+        return len(pending)
+    
+    def close(self) -> None:
+        """Flush recall counts, persist the semantic index and close the storage engine."""
+        self.flush_recalls()
+        with self._lock:
+            self.semantic_index.save()
+        with self._write_lock:
+            self.storage.close()
+    
+    def _detect_memory_category(self, message: str) -> Optional[str]:
+        """
+        Classify a message as memory-worthy.
+        
+        Returns one of the detector categories (preference, explicit_remember,
+        goal, identity, dislike, or a configured extra one), or None.
+        """
+        return self.detector.detect(message)
     
     def _detect_memory_worthy_content(self, message: str) -> bool:
         """
@@ -44,19 +231,7 @@ class MemoryManager:
         - Long-term goals or habits mentioned (I want to, I'm trying to, I always)
         - Personal information (my name is, I am, I work as)
         """
-        memory_patterns = [
-            r'\b(i like|i love|i prefer|my favorite|i enjoy)\b',
-            r'\b(remember|don\'t forget|keep in mind|note that)\b',
-            r'\b(i want to|i\'m trying to|i always|i never|my goal)\b',
-            r'\b(my name is|i am|i work as|i live in|i\'m from)\b',
-            r'\b(i hate|i dislike|i don\'t like)\b',
-        ]
-        
-        message_lower = message.lower()
-        for pattern in memory_patterns:
-            if re.search(pattern, message_lower):
-                return True
-        return False
+        return self._detect_memory_category(message) is not None
     
     def store_memory(
         self,
@@ -66,7 +241,7 @@ class MemoryManager:
         source: Optional[str] = None
     ) -> str:
         """
-        Store a memory in JSON file.
+        Store a memory.
         
         Args:
             content: The memory content to store
@@ -77,61 +252,307 @@ class MemoryManager:
         Returns:
             Memory ID
         """
-        memory_id = str(uuid.uuid4())
-        timestamp = datetime.utcnow().isoformat()
-        
-        memory = {
-            "id": memory_id,
+        return self.store_memories([{
             "content": content,
             "user_id": user_id,
-            "timestamp": timestamp,
-            "source": source or "",
-            "metadata": metadata or {}
+            "metadata": metadata,
+            "source": source
+        }])[0]
+    
+    def store_memories(self, items: List[Dict[str, Any]]) -> List[str]:
+        """
+        Store several memories with a single persistence flush.
+        
+        Args:
+            items: Dicts with ``content`` and optional ``user_id``, ``metadata``
+                and ``source``, as accepted by ``store_memory``
+            
+        Returns:
+            Memory IDs, in the same order as ``items``
+        """
+        timestamp = datetime.utcnow().isoformat()
+        records = [
+            MemoryRecord(
+                str(uuid.uuid4()),
+                item["content"],
+                item.get("user_id") or "default_user",
+                timestamp,
+                item.get("source") or "",
+                item.get("metadata")
+            )
+            for item in items
+        ]
+        if not records:
+            return []
+        
+        # Hold the write lock across both steps so a concurrent _sync cannot
+        # reload from storage between the in-memory add and the append.
+        with self._write_lock:
+            targets = self._deduplicate(records)
+            with self._lock:
+                for memory, target in zip(records, targets):
+                    if target is memory:
+                        self.memories[memory.id_key] = memory
+                        self.index.add(memory)
+                        self.semantic_index.add(memory)
+                    else:
+                        target.update_metadata(merge_metadata(target, memory))
+                        self.index.update(target)
+                self.last_update = timestamp
+            # A merged record is written again under its own id
+            self._persist(list({id(target): target for target in targets}.values()))
+        
+        stored = sum(target is memory for memory, target in zip(records, targets))
+        MEMORIES_STORED.inc(stored)
+        MEMORIES_MERGED.inc(len(records) - stored)
+        if self.retention.user_quota and stored:
+            self._enforce_quota({memory["user_id"] for memory in records})
+        return [target["id"] for target in targets]
+    
+    def _enforce_quota(self, user_ids: Iterable[str]) -> None:
+        """Evict the lowest-scoring memories of users who went over the quota with a write."""
+        quota = self.retention.user_quota
+        for user_id in user_ids:
+            if self.get_memory_stats(user_id)["total_memories"] <= quota:
+                continue
+            _, evicted = self.retention.removals(self._user_snapshot(user_id))
+            MEMORIES_EVICTED.inc(self._remove(user_id, evicted))
+    
+    def _deduplicate(self, records: List[MemoryRecord]) -> List[MemoryRecord]:
+        """
+        Match new records against stored memories; caller holds _write_lock.
+        
+        Returns:
+            For each record, the stored memory it duplicates, or the record
+            itself if it is new (earlier records of the batch count as stored)
+        """
+        if self.dedup is None:
+            return records
+        targets = []
+        for memory in records:
+            fingerprint = fingerprint_of(memory["content"])
+            target = self.dedup.find(memory, fingerprint)
+            if target is None:
+                self.dedup.add(memory, fingerprint)
+                target = memory
+            targets.append(target)
+        return targets
+    
+    def consolidate(self) -> Dict[str, Any]:
+        """
+        Merge duplicate memories that are already stored, one user at a time.
+        
+        Each group of duplicates is folded into its oldest memory (see
+        ``memory_dedup.merge_metadata``) and the rest are removed; the merged
+        memories and the removals are persisted once at the end. Writes wait
+        while a user is being processed, reads only while its index is swapped.
+        
+        Returns:
+            Users and memories scanned, memories reclaimed and elapsed seconds
+        """
+        start = time.perf_counter()
+        threshold = self.dedup_threshold or DEFAULT_THRESHOLD
+        self._sync()
+        with self._lock:
+            user_ids = list(self.index.user_counts())
+        
+        scanned = 0
+        # Merged memories are written again under their own ids
+        targets: Dict[int, MemoryRecord] = {}
+        removed_ids: List[str] = []
+        for user_id in user_ids:
+            with self._write_lock:
+                memories = list(self.index.memories(user_id))
+                scanned += len(memories)
+                kept, merges = find_duplicates(memories, threshold)
+                if not merges:
+                    continue
+                with self._lock:
+                    for target, duplicate in merges:
+                        target.update_metadata(merge_metadata(target, duplicate))
+                        targets[id(target)] = target
+                        self.memories.pop(duplicate.id_key, None)
+                    self.index.rebuild(user_id, kept)
+                    self.semantic_index.remove(user_id, [duplicate["id"] for _, duplicate in merges])
+                    if self.dedup is not None:
+                        self.dedup.drop(user_id)
+                removed_ids.extend(duplicate["id"] for _, duplicate in merges)
+        
+        if removed_ids:
+            with self._write_lock:
+                self._persist(list(targets.values()))
+                self._delete_stored(removed_ids)
+            MEMORIES_RECLAIMED.inc(len(removed_ids))
+        
+        return {
+            "users": len(user_ids),
+            "scanned": scanned,
+            "reclaimed": len(removed_ids),
+            "seconds": round(time.perf_counter() - start, 3)
         }
+    
+    def _remove(self, user_id: str, memories: List[Dict[str, Any]]) -> int:
+        """
+        Remove some of one user's memories from memory, the indexes and storage.
+        
+        Costs O(that user's memories) in memory; what storage costs depends
+        on the engine (an appended tombstone per memory for the log engine).
         
-        self.memories.append(memory)
-        self._save_memories()
+        Returns:
+            Number of memories removed
+        """
+        if not memories:
+            return 0
+        with self._write_lock:
+            with self._lock:
+                memory_ids = [
+                    memory["id"] for memory in memories
+                    if self.memories.pop(MemoryRecord.id_key_of(memory["id"]), None) is not None
+                ]
+                if not memory_ids:
+                    return 0
+                self._drop_from_indexes(user_id, memory_ids)
+            self._delete_stored(memory_ids)
+        return len(memory_ids)
+    
+    def delete_memories(self, user_id: str, memory_ids: Optional[List[str]] = None) -> int:
+        """
+        Forget memories of a user.
+        
+        Args:
+            user_id: User whose memories are deleted
+            memory_ids: Ids to delete; None deletes all of the user's memories.
+                Ids that do not belong to the user are ignored.
+            
+        Returns:
+            Number of memories deleted
+        """
+        self._sync()
+        memories = self._user_snapshot(user_id)
+        if memory_ids is not None:
+            wanted = set(memory_ids)
+            memories = [memory for memory in memories if memory["id"] in wanted]
+        deleted = self._remove(user_id, memories)
+        MEMORIES_DELETED.inc(deleted)
+        return deleted
+    
+    def sweep(self, user_ids: List[str]) -> Dict[str, int]:
+        """
+        Apply the retention policy to some users: drop expired memories and
+        evict the lowest-scoring ones of users over the quota.
         
-        return memory_id
+        Args:
+            user_ids: Users to sweep; each is locked only while it is processed
+            
+        Returns:
+            Users and memories scanned, and memories expired and evicted
+        """
+        self._sync()
+        now = time.time()
+        scanned = expired_count = evicted_count = 0
+        for user_id in user_ids:
+            memories = self._user_snapshot(user_id)
+            scanned += len(memories)
+            expired, evicted = self.retention.removals(memories, now)
+            expired_count += self._remove(user_id, expired)
+            evicted_count += self._remove(user_id, evicted)
+        MEMORIES_EXPIRED.inc(expired_count)
+        MEMORIES_EVICTED.inc(evicted_count)
+        return {"users": len(user_ids), "scanned": scanned, "expired": expired_count, "evicted": evicted_count}
     
     def retrieve_memories(
         self,
         query: str,
         user_id: str = "default_user",
-        limit: int = 5
+        limit: int = 5,
+        mode: str = "keyword"
     ) -> List[Dict[str, Any]]:
         """
-        Retrieve relevant memories based on keyword matching.
+        Retrieve relevant memories for a query.
         
         Args:
             query: Query text to search for
             user_id: User identifier to filter memories
             limit: Maximum number of memories to retrieve
+            mode: "keyword" for BM25 ranking or "semantic" for embedding similarity
             
         Returns:
-            List of memory dictionaries with content and metadata
+            List of memory dictionaries with content, metadata and the
+            hybrid ranking score (see ``memory_ranker.HybridRanker``)
         """
-        # Filter by user_id
-        user_memories = [m for m in self.memories if m.get("user_id") == user_id]
-        
-        # Simple keyword matching (case-insensitive)
-        query_lower = query.lower()
-        query_words = set(query_lower.split())
+        self._sync()
+        with self._lock:
+            results = self._search([query], user_id, limit, mode)[0]
+        return [{**memory, "score": round(score, 4)} for memory, score in results]
+    
+    def retrieve_memories_bulk(
+        self,
+        queries: List[str],
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Answer several recall queries for one user in a single pass.
         
-        # Score memories by keyword overlap
-        scored_memories = []
-        for memory in user_memories:
-            content_lower = memory["content"].lower()
-            content_words = set(content_lower.split())
+        Args:
+            queries: Query texts
+            user_id: User identifier to filter memories
+            limit: Maximum number of memories per query
+            mode: "keyword" for BM25 ranking or "semantic" for embedding similarity
             
-            # Calculate overlap score
-            overlap = len(query_words & content_words)
-            if overlap > 0 or query_lower in content_lower:
-                scored_memories.append((memory, overlap))
-        
-        # Sort by score and return top results
-        scored_memories.sort(key=lambda x: x[1], reverse=True)
-        return [m[0] for m in scored_memories[:limit]]
+        Returns:
+            One ``retrieve_memories`` result per query, in order
+        """
+        self._sync()
+        with self._lock:
+            results = self._search(queries, user_id, limit, mode)
+        return [
+            [{**memory, "score": round(score, 4)} for memory, score in hits]
+            for hits in results
+        ]
+    
+    def _search(
+        self,
+        queries: List[str],
+        user_id: str,
+        limit: int,
+        mode: str
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Rank a user's live memories for each query with the hybrid ranker; caller holds _lock."""
+        now = time.time()
+        keep = self.retention.live(now)
+        if mode == "semantic":
+            # Fetch extra candidates so the hybrid score can promote one past the cut
+            pools = self.semantic_index.search_many(queries, user_id=user_id, limit=limit * RERANK_POOL)
+            results = [self.ranker.rank(hits, limit, now, keep) for hits in pools]
+        else:
+            results = self.index.search_many(
+                queries, user_id=user_id, limit=limit, ranker=self.ranker, now=now, keep=keep
+            )
+        self._note_recalls(results)
+        return results
+    
+    def _conversation_memory(
+        self,
+        user_message: str,
+        assistant_response: str,
+        user_id: str
+    ) -> Optional[Dict[str, Any]]:
+        """Build the memory for a conversation turn, or None if it is not memory-worthy."""
+        category = self._detect_memory_category(user_message)
+        if category is None:
+            return None
+        return {
+            "content": user_message,
+            "user_id": user_id,
+            "metadata": {
+                "type": "conversation",
+                "category": category,
+                "assistant_response": assistant_response[:200]
+            },
+            "source": conversation_source(user_message)
+        }
     
     def process_conversation_for_memory(
         self,
@@ -150,19 +571,33 @@ class MemoryManager:
         Returns:
             Memory ID if stored, None otherwise
         """
-        if self._detect_memory_worthy_content(user_message):
-            source = f"User: {user_message[:100]}..."
-            metadata = {
-                "type": "conversation",
-                "assistant_response": assistant_response[:200]
-            }
-            return self.store_memory(
-                content=user_message,
-                user_id=user_id,
-                metadata=metadata,
-                source=source
+        item = self._conversation_memory(user_message, assistant_response, user_id)
+        if item is None:
+            return None
+        return self.store_memories([item])[0]
+    
+    def process_conversations_for_memory(
+        self,
+        conversations: List[Tuple[str, str, str]]
+    ) -> List[str]:
+        """
+        Analyze a batch of conversation turns and store the memory-worthy ones
+        with a single persistence flush.
+        
+        Args:
+            conversations: ``(user_message, assistant_response, user_id)`` tuples
+            
+        Returns:
+            IDs of the memories stored
+        """
+        items = [
+            item for item in (
+                self._conversation_memory(user_message, assistant_response, user_id)
+                for user_message, assistant_response, user_id in conversations
             )
-        return None
+            if item is not None
+        ]
+        return self.store_memories(items)
     
     def get_memory_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -174,13 +609,21 @@ class MemoryManager:
         Returns:
             Dictionary with memory statistics
         """
+        self._sync()
         if user_id:
-            count = len([m for m in self.memories if m.get("user_id") == user_id])
+            count = self.index.count(user_id)
         else:
             count = len(self.memories)
         
         return {
             "total_memories": count,
             "user_id": user_id,
+            "last_update": self.last_update,
             "status": "operational"
         }
+    
+    def user_counts(self) -> Dict[str, int]:
+        """Number of stored memories per user."""
+        self._sync()
+        with self._lock:
+            return self.index.user_counts()
@@ -0,0 +1,190 @@
+"""Hybrid ranking of recall candidates: lexical relevance, recency, memory type and access frequency."""
+import time
+from array import array
+from collections.abc import Mapping
+from typing import List, Tuple, Optional, Callable, Sequence
+
+import numpy as np
+
+from memory_lifecycle import DAY, last_seen, mention_count, recall_count
+
+# Candidates fetched per requested result by rankers that are not feature-aware
+# (semantic search, SQLite), so the hybrid score can reorder them
+RERANK_POOL = 3
+# Mentions plus recalls at which the frequency signal reaches one half
+FREQUENCY_HALF = 4.0
+
+Hit = Tuple[Mapping, float]
+
+
+def is_explicit(memory: Mapping) -> bool:
+    """Whether a memory was stored through /remember rather than inferred from a conversation."""
+    return (memory.get("metadata") or {}).get("type") == "explicit"
+
+
+def frequency(memory: Mapping) -> float:
+    """How often a memory was mentioned plus how often it was recalled."""
+    return mention_count(memory) + recall_count(memory)
+
+
+def record_recall(memory) -> None:
+    """Count one recall of a ``MemoryRecord`` in its metadata; caller holds the lock readers use."""
+    metadata = dict(memory.get("metadata") or {})
+    metadata["recalls"] = int(recall_count(memory)) + 1
+    memory.update_metadata(metadata)
+
+
+class MemoryFeatures:
+    """
+    Ranking features of one user's memories, as columns indexed by position.
+
+    Filled in when a memory is indexed and refreshed when its metadata
+    changes (a merge, a recall), so ranking only gathers the rows of its
+    candidates. Everything is derived from the memory's metadata, so a
+    rebuilt index starts from the same values. Columns are ``array.array``
+    (cheap to append) and read through temporary numpy views.
+    """
+
+    def __init__(self):
+        self.last_seen = array("d")
+        self.explicit = array("b")
+        self.frequency = array("f")
+
+    @staticmethod
+    def row(memory: Mapping) -> Tuple[float, bool, float]:
+        """A memory's ``(last_seen, explicit, frequency)``, computed before any column is touched."""
+        return last_seen(memory), is_explicit(memory), frequency(memory)
+
+    def append(self, row: Tuple[float, bool, float]) -> None:
+        seen, explicit, count = row
+        self.last_seen.append(seen)
+        self.explicit.append(explicit)
+        self.frequency.append(count)
+
+    def update(self, doc: int, memory: Mapping) -> None:
+        """Refresh a memory's row after its metadata changed (e.g. a merged duplicate)."""
+        self.last_seen[doc], self.explicit[doc], self.frequency[doc] = self.row(memory)
+
+    def gather(self, docs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """``(last_seen, explicit, frequency)`` of the given rows."""
+        return (
+            np.frombuffer(self.last_seen, dtype=np.float64)[docs],
+            np.frombuffer(self.explicit, dtype=np.int8)[docs],
+            np.frombuffer(self.frequency, dtype=np.float32)[docs]
+        )
+
+
+class HybridRanker:
+    """
+    Scores candidates as a weighted sum of four signals, each in [0, 1]:
+
+    - lexical: the candidate's relevance divided by the best candidate's
+    - recency: ``0.5 ** (days since last seen / half_life_days)``
+    - type: 1 for explicit memories, 0 for ones inferred from conversation
+    - frequency: repeated mentions plus recalls ``n``, as ``n / (n + 4)``
+
+    Ties go to the more recently seen memory, then to the earlier candidate.
+    """
+
+    def __init__(
+        self,
+        lexical_weight: float = 1.0,
+        recency_weight: float = 0.2,
+        type_weight: float = 0.15,
+        frequency_weight: float = 0.1,
+        half_life_days: float = 30.0
+    ):
+        """
+        Args:
+            lexical_weight: Weight of BM25 (keyword) or cosine (semantic) relevance
+            recency_weight: Weight of how recently a memory was stored or mentioned
+            type_weight: Bonus for explicit memories over conversational ones
+            frequency_weight: Weight of how often a memory was mentioned or recalled
+            half_life_days: Days for the recency signal to halve
+        """
+        self.lexical_weight = lexical_weight
+        self.recency_weight = recency_weight
+        self.type_weight = type_weight
+        self.frequency_weight = frequency_weight
+        self.half_life = half_life_days * DAY
+
+    def score(
+        self,
+        lexical: np.ndarray,
+        seen: np.ndarray,
+        explicit: np.ndarray,
+        frequency: np.ndarray,
+        now: float
+    ) -> np.ndarray:
+        top = lexical.max() if len(lexical) else 0.0
+        scores = self.lexical_weight * (lexical / top if top > 0 else np.zeros_like(lexical))
+        if self.recency_weight and self.half_life > 0:
+            age = np.maximum(now - seen, 0.0)
+            scores = scores + self.recency_weight * np.exp2(-age / self.half_life)
+        if self.type_weight:
+            scores = scores + self.type_weight * explicit
+        if self.frequency_weight:
+            repeats = np.maximum(frequency - 1.0, 0.0)
+            scores = scores + self.frequency_weight * repeats / (repeats + FREQUENCY_HALF)
+        return scores
+
+    def order(
+        self,
+        lexical: np.ndarray,
+        seen: np.ndarray,
+        explicit: np.ndarray,
+        frequency: np.ndarray,
+        now: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Candidate positions best first, and their scores."""
+        scores = self.score(lexical.astype(np.float64), seen, explicit, frequency, now)
+        # lexsort sorts by the last key first: score, then recency, then position
+        order = np.lexsort((np.arange(len(scores)), -seen, -scores))
+        return order, scores[order]
+
+    def rank(
+        self,
+        hits: List[Hit],
+        limit: int,
+        now: Optional[float] = None,
+        keep: Optional[Callable[[Mapping], bool]] = None
+    ) -> List[Hit]:
+        """
+        Rerank ``(memory, relevance)`` pairs whose features are not precomputed.
+
+        Args:
+            hits: Candidates from a relevance-only search
+            limit: Number of results to return
+            now: Unix time to score recency against (defaults to the current time)
+            keep: Predicate a memory must pass to be returned (e.g. not expired)
+        """
+        if not hits:
+            return []
+        now = time.time() if now is None else now
+        memories = [memory for memory, _ in hits]
+        order, scores = self.order(
+            np.fromiter((score for _, score in hits), dtype=np.float64, count=len(hits)),
+            np.fromiter((last_seen(m) for m in memories), dtype=np.float64, count=len(hits)),
+            np.fromiter((is_explicit(m) for m in memories), dtype=np.int8, count=len(hits)),
+            np.fromiter((frequency(m) for m in memories), dtype=np.float32, count=len(hits)),
+            now
+        )
+        return [(memories[position], score) for position, score in select(memories, order, scores, limit, keep)]
+
+
+def select(
+    memories: Sequence[Mapping],
+    order: np.ndarray,
+    scores: np.ndarray,
+    limit: int,
+    keep: Optional[Callable[[Mapping], bool]] = None
+) -> List[Tuple[int, float]]:
+    """The first ``limit`` positions in ``order`` whose memory passes ``keep``, with their scores."""
+    results = []
+    for position, score in zip(order.tolist(), scores.tolist()):
+        if keep is not None and not keep(memories[position]):
+            continue
+        results.append((position, score))
+        if len(results) == limit:
+            break
+    return results
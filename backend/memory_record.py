@@ -0,0 +1,181 @@
+"""Compact in-memory representation of a stored memory."""
+import sys
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+KEYS = ("id", "content", "user_id", "timestamp", "source", "metadata")
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Metadata strings up to this length (types, categories, keys) are interned
+INTERN_MAX_LENGTH = 32
+
+# Distinct metadata key tuples, shared by every record with that shape
+_METADATA_SHAPES: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def conversation_source(content: str) -> str:
+    """The ``source`` recorded for memories extracted from a conversation turn."""
+    return f"User: {content[:100]}..."
+
+
+def _format_id(packed: bytes) -> str:
+    h = packed.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _pack_id(memory_id: str) -> Union[bytes, str]:
+    """16 raw bytes for canonical (lowercase, hyphenated) UUID strings, otherwise the string itself."""
+    if len(memory_id) != 36:
+        return memory_id
+    try:
+        packed = bytes.fromhex(memory_id.replace("-", ""))
+    except ValueError:
+        return memory_id
+    return packed if len(packed) == 16 and _format_id(packed) == memory_id else memory_id
+
+
+def _pack_timestamp(timestamp: str) -> Union[int, str]:
+    """Microseconds since the epoch for naive ISO timestamps that round-trip exactly."""
+    try:
+        value = datetime.fromisoformat(timestamp)
+    except (ValueError, TypeError):
+        return timestamp
+    if value.tzinfo is not None or value.isoformat() != timestamp:
+        return timestamp
+    return (value - EPOCH) // MICROSECOND
+
+
+@lru_cache(maxsize=4096)
+def _format_timestamp(micros: int) -> str:
+    # Cached because memories stored in one batch share a timestamp
+    return (EPOCH + micros * MICROSECOND).isoformat()
+
+
+def _intern(value: Any) -> Any:
+    if isinstance(value, str) and len(value) <= INTERN_MAX_LENGTH:
+        return sys.intern(value)
+    return value
+
+
+def _pack_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    """``(shared key tuple, *values)``, or None for empty metadata."""
+    if not metadata:
+        return None
+    keys = tuple(metadata)
+    shape = _METADATA_SHAPES.get(keys)
+    if shape is None:
+        shape = _METADATA_SHAPES[keys] = tuple(sys.intern(key) for key in keys)
+    return (shape, *(_intern(value) for value in metadata.values()))
+
+
+class MemoryRecord(Mapping):
+    """
+    Mapping with the same keys and values as a stored memory dict.
+
+    Fields are kept in a compact form and converted back on access: the id
+    as 16 UUID bytes, the timestamp as integer microseconds, ``user_id`` and
+    short metadata strings interned, metadata as a tuple of values sharing
+    one key tuple per distinct set of keys, and ``source`` omitted when it is
+    the one derived from ``content`` by ``conversation_source``. Values that
+    do not round-trip exactly through the compact form are stored as given.
+    Being a ``Mapping``, a record works with ``memory["content"]``,
+    ``memory.get(...)``, ``dict(memory)`` and ``{**memory}``; ``metadata``
+    is rebuilt as a new dict on each access, so changing it has no effect.
+    Records are read-only except through ``update_metadata``, which the
+    memory manager uses to fold a duplicate into a stored record.
+    """
+
+    __slots__ = ("_id", "content", "user_id", "_timestamp", "_source", "_metadata")
+
+    def __init__(
+        self,
+        id: str,
+        content: str,
+        user_id: str,
+        timestamp: str,
+        source: str = "",
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self._id = _pack_id(id)
+        self.content = content
+        self.user_id = sys.intern(user_id)
+        self._timestamp = _pack_timestamp(timestamp)
+        self._source = None if source == conversation_source(content) else sys.intern(source)
+        self._metadata = _pack_metadata(metadata)
+
+    @classmethod
+    def from_dict(cls, memory: Mapping) -> "MemoryRecord":
+        if isinstance(memory, cls):
+            return memory
+        return cls(
+            memory["id"],
+            memory["content"],
+            memory.get("user_id") or "default_user",
+            memory.get("timestamp") or "",
+            memory.get("source") or "",
+            memory.get("metadata")
+        )
+
+    @property
+    def id(self) -> str:
+        return _format_id(self._id) if isinstance(self._id, bytes) else self._id
+
+    @property
+    def timestamp(self) -> str:
+        if isinstance(self._timestamp, int):
+            return _format_timestamp(self._timestamp)
+        return self._timestamp
+
+    @property
+    def timestamp_seconds(self) -> float:
+        """The timestamp as Unix time (timestamps are naive UTC); 0.0 if it cannot be parsed."""
+        if isinstance(self._timestamp, int):
+            return self._timestamp / 1e6
+        try:
+            return (datetime.fromisoformat(self._timestamp) - EPOCH).total_seconds()
+        except (TypeError, ValueError):
+            return 0.0
+
+    @property
+    def id_key(self) -> Union[bytes, str]:
+        """Compact hashable form of ``id``, for keying records without formatting the id."""
+        return self._id
+
+    @staticmethod
+    def id_key_of(memory_id: str) -> Union[bytes, str]:
+        """The ``id_key`` a record with ``memory_id`` has."""
+        return _pack_id(memory_id)
+
+    @property
+    def source(self) -> str:
+        return conversation_source(self.content) if self._source is None else self._source
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            return {}
+        return dict(zip(self._metadata[0], self._metadata[1:]))
+
+    def update_metadata(self, metadata: Optional[Dict[str, Any]]) -> None:
+        """Replace the metadata in place; the caller must hold the lock readers use."""
+        self._metadata = _pack_metadata(metadata)
+
+    def __getitem__(self, key: str) -> Any:
+        # Content is read on every search, so check it before the generic path
+        if key == "content":
+            return self.content
+        if key in KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(KEYS)
+
+    def __len__(self) -> int:
+        return len(KEYS)
+
+    def __repr__(self) -> str:
+        return f"MemoryRecord({dict(self)!r})"
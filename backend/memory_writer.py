@@ -0,0 +1,126 @@
+"""Background queue that extracts and persists memories off the request path."""
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional
+
+from memory_manager import MemoryManager
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryWriter:
+    """
+    Batches post-response memory extraction on an asyncio worker task.
+
+    Conversation turns are queued by ``submit`` and the worker drains every
+    pending turn (up to ``batch_size``) into one call to
+    ``MemoryManager.process_conversations_for_memory``, run in a worker
+    thread, so a burst of chats costs one storage flush.
+
+    Every ``recall_flush_interval`` seconds the worker also persists the
+    recall counts gathered by the manager (``MemoryManager.flush_recalls``),
+    so the frequency signal of recall ranking survives a restart.
+    """
+
+    def __init__(self, memory_manager: MemoryManager, batch_size: int = 100, recall_flush_interval: float = 30.0):
+        self.memory_manager = memory_manager
+        self.batch_size = batch_size
+        self.recall_flush_interval = recall_flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._next_recall_flush = 0.0
+
+        self.recalls_flushed = 0
+        self.batches_flushed = 0
+        self.conversations_processed = 0
+        self.memories_stored = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+
+    def start(self) -> None:
+        """Start the worker task on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="memory-writer")
+
+    def submit(self, user_message: str, assistant_response: str, user_id: str) -> None:
+        """Queue a conversation turn for memory extraction."""
+        self._queue.put_nowait((user_message, assistant_response, user_id))
+
+    async def flush(self) -> None:
+        """Wait for every turn queued so far to be persisted; the worker keeps running."""
+        if self._task is None:
+            return
+        await self._queue.join()
+
+    async def drain(self) -> None:
+        """Wait for every queued turn to be persisted, then stop the worker."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _recall_flush_due(self) -> Optional[float]:
+        """Seconds until recall counts are due to be flushed; None if they are only flushed on close."""
+        if self.recall_flush_interval <= 0:
+            return None
+        return max(0.0, self._next_recall_flush - time.monotonic())
+
+    async def _flush_recalls(self) -> None:
+        self._next_recall_flush = time.monotonic() + self.recall_flush_interval
+        try:
+            self.recalls_flushed += await asyncio.to_thread(self.memory_manager.flush_recalls)
+        except Exception as e:
+            logger.error(f"Error flushing recall counts: {e}")
+
+    async def _run(self) -> None:
+        self._next_recall_flush = time.monotonic() + self.recall_flush_interval
+        while True:
+            try:
+                batch = [await asyncio.wait_for(self._queue.get(), timeout=self._recall_flush_due())]
+            except asyncio.TimeoutError:
+                await self._flush_recalls()
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            start = time.perf_counter()
+            try:
+                stored = await asyncio.to_thread(self.memory_manager.process_conversations_for_memory, batch)
+                self.memories_stored += len(stored)
+            except Exception as e:
+                logger.error(f"Error writing memory batch of {len(batch)}: {e}")
+            finally:
+                elapsed = time.perf_counter() - start
+                self.batches_flushed += 1
+                self.conversations_processed += len(batch)
+                self.last_flush_seconds = elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+                self._total_flush_seconds += elapsed
+                for _ in batch:
+                    self._queue.task_done()
+            if self._recall_flush_due() == 0:
+                await self._flush_recalls()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and flush latency, for spotting a writer that falls behind."""
+        avg = self._total_flush_seconds / self.batches_flushed if self.batches_flushed else 0.0
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches_flushed": self.batches_flushed,
+            "conversations_processed": self.conversations_processed,
+            "memories_stored": self.memories_stored,
+            "recalls_flushed": self.recalls_flushed,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "avg_flush_ms": round(avg * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+        }
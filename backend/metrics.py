@@ -0,0 +1,274 @@
+"""In-process metrics exposed in the Prometheus text format on /metrics."""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans cache hits (sub-millisecond) to slow model calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base for a named metric family with optional labels.
+
+    Instead of being updated on the hot path, a metric can be given a
+    ``function`` that returns ``{label values: value}`` (or a bare number
+    when it has no labels); it is called only when /metrics is scraped.
+    """
+
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], object]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def set_function(self, function: Callable[[], object]) -> None:
+        self.function = function
+
+    def _collect(self) -> Dict[LabelValues, float]:
+        if self.function is None:
+            with self._lock:
+                return dict(self._values)
+        values = self.function()
+        if isinstance(values, dict):
+            return {tuple(str(v) for v in (key if isinstance(key, tuple) else (key,))): value
+                    for key, value in values.items()}
+        return {(): values}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets, with sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [count per bucket (+Inf last), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe the wall time spent in the ``with`` block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        names = self.labelnames + ("le",)
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The set of metrics rendered by /metrics."""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # A failing collection function must not take down the whole scrape
+                lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Updated on the hot path
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "memora_http_request_duration_seconds",
+    "Time to produce the response of an HTTP request (for streams, until the stream starts).",
+    ["method", "endpoint", "status"]
+))
+CHAT_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "memora_chat_stage_duration_seconds",
+    "Time spent in each stage of the chat pipeline.",
+    ["stage"]
+))
+TOOL_CALL_SECONDS = REGISTRY.register(Histogram(
+    "memora_tool_call_duration_seconds",
+    "Duration of tool calls made by the model.",
+    ["tool", "status"]
+))
+GEMINI_QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    "memora_gemini_queue_wait_seconds",
+    "Time Gemini calls waited for the rate limiter.",
+    ["priority"]
+))
+GEMINI_RATE_LIMITED = REGISTRY.register(Counter(
+    "memora_gemini_rate_limited_total",
+    "Gemini calls answered with 429."
+))
+GEMINI_RETRIES = REGISTRY.register(Counter(
+    "memora_gemini_retries_total",
+    "Gemini calls retried after a 429."
+))
+GEMINI_REJECTED = REGISTRY.register(Counter(
+    "memora_gemini_rejected_total",
+    "Gemini calls refused by the rate limiter (503 to the client).",
+    ["priority"]
+))
+MEMORY_WRITE_SECONDS = REGISTRY.register(Histogram(
+    "memora_memory_write_duration_seconds",
+    "Time to persist a batch of new memories to storage."
+))
+MEMORIES_STORED = REGISTRY.register(Counter(
+    "memora_memories_stored_total",
+    "Memories stored since startup."
+))
+MEMORIES_MERGED = REGISTRY.register(Counter(
+    "memora_memories_merged_total",
+    "New memories merged into a stored duplicate instead of being stored."
+))
+MEMORIES_RECLAIMED = REGISTRY.register(Counter(
+    "memora_memories_reclaimed_total",
+    "Stored duplicate memories removed by consolidation."
+))
+MEMORIES_DELETED = REGISTRY.register(Counter(
+    "memora_memories_deleted_total",
+    "Memories deleted on request through the forget endpoints."
+))
+MEMORIES_EXPIRED = REGISTRY.register(Counter(
+    "memora_memories_expired_total",
+    "Memories removed for outliving the TTL of their type."
+))
+MEMORIES_EVICTED = REGISTRY.register(Counter(
+    "memora_memories_evicted_total",
+    "Memories evicted to keep a user within the memory quota."
+))
+
+# Collected when scraped; main.py supplies the functions at startup
+CACHE_HITS = REGISTRY.register(Counter(
+    "memora_cache_hits_total",
+    "Cache lookups answered from the cache.",
+    ["cache"]
+))
+CACHE_MISSES = REGISTRY.register(Counter(
+    "memora_cache_misses_total",
+    "Cache lookups that had to compute the value.",
+    ["cache"]
+))
+MEMORIES = REGISTRY.register(Gauge(
+    "memora_memories",
+    "Memories currently stored."
+))
+USERS = REGISTRY.register(Gauge(
+    "memora_users",
+    "Users with at least one stored memory."
+))
+USER_MEMORIES = REGISTRY.register(Gauge(
+    "memora_user_memories",
+    "Memories stored per user, for the users with the most memories.",
+    ["user_id"]
+))
+LAST_WRITE = REGISTRY.register(Gauge(
+    "memora_memory_last_write_timestamp_seconds",
+    "Unix time of the most recent memory write."
+))
+CHAT_SESSIONS = REGISTRY.register(Gauge(
+    "memora_chat_sessions",
+    "Per-user chat sessions currently cached."
+))
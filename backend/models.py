@@ -1,5 +1,5 @@
 """Pydantic models for API request/response validation."""
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal, Annotated
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -39,14 +39,55 @@ class RecallRequest(BaseModel):
     query: str = Field(..., min_length=1, description="Query to search memories")
     user_id: str = Field(default="default_user", description="User identifier")
     limit: int = Field(default=5, ge=1, le=20, description="Maximum number of memories to retrieve")
+    mode: Literal["keyword", "semantic"] = Field(default="keyword", description="Retrieval mode: BM25 keyword ranking or embedding similarity")
 
 
 class RecallResponse(BaseModel):
     """Response model for recall endpoint."""
-    memories: List[Dict[str, Any]] = Field(..., description="Retrieved memories with metadata")
+    memories: List[Dict[str, Any]] = Field(..., description="Retrieved memories with metadata and relevance score")
     count: int = Field(..., description="Number of memories found")
 
 
+class RememberItem(BaseModel):
+    """One memory in a bulk remember request."""
+    key: str = Field(..., min_length=1, description="Memory key/category")
+    value: str = Field(..., min_length=1, description="Memory content")
+    metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
+
+
+class BulkRememberRequest(BaseModel):
+    """Request model for storing many memories with one persistence flush."""
+    items: List[RememberItem] = Field(..., min_length=1, max_length=10000, description="Memories to store")
+    user_id: str = Field(default="default_user", description="User identifier")
+
+
+class BulkRememberResponse(BaseModel):
+    """Response model for bulk remember endpoint."""
+    success: bool = Field(..., description="Whether the memories were stored successfully")
+    memory_ids: List[str] = Field(..., description="Identifiers of the stored memories, in request order")
+    count: int = Field(..., description="Number of distinct memories the items were stored as")
+
+
+class BulkRecallRequest(BaseModel):
+    """Request model for answering many recall queries for one user."""
+    queries: List[Annotated[str, Field(min_length=1)]] = Field(..., min_length=1, max_length=100, description="Queries to search memories")
+    user_id: str = Field(default="default_user", description="User identifier")
+    limit: int = Field(default=5, ge=1, le=20, description="Maximum number of memories per query")
+    mode: Literal["keyword", "semantic"] = Field(default="keyword", description="Retrieval mode: BM25 keyword ranking or embedding similarity")
+
+
+class BulkRecallResponse(BaseModel):
+    """Response model for bulk recall endpoint."""
+    results: List[RecallResponse] = Field(..., description="One recall result per query, in request order")
+
+
+class ForgetResponse(BaseModel):
+    """Response model for the forget endpoints."""
+    success: bool = Field(..., description="Whether the request was carried out")
+    deleted: int = Field(..., description="Number of memories deleted")
+    message: str = Field(..., description="Status message")
+
+
 class StatusResponse(BaseModel):
     """Response model for status endpoint."""
     status: str = Field(default="operational", description="Service status")
@@ -0,0 +1,689 @@
+"""Memory manager that memory-maps a per-user packed store and loads users on demand."""
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Iterable, Set
+
+from memory_manager import MemoryManager
+from memory_dedup import DEFAULT_THRESHOLD, DedupIndex, find_duplicates, merge_metadata
+from memory_detector import MemoryDetector
+from memory_index import InvertedIndex
+from memory_lifecycle import RetentionPolicy
+from memory_ranker import HybridRanker
+from memory_record import MemoryRecord
+from metrics import MEMORIES_MERGED, MEMORIES_RECLAIMED, MEMORIES_STORED, MEMORY_WRITE_SECONDS
+from semantic_index import SemanticIndex
+from storage import JSONFileStorage
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MEMPACK1"
+# Trailer: offset of the JSON offset table, then MAGIC
+FOOTER = struct.Struct("<Q8s")
+SEGMENT_PATTERN = re.compile(r"\.pack-wal\.(\d+)\.jsonl$")
+
+
+def _encode(memory: Dict[str, Any]) -> bytes:
+    """One pack line; ``user_id`` is implied by the block the line lives in."""
+    row = [
+        memory["id"], memory["content"], memory["timestamp"],
+        memory.get("source") or "", memory.get("metadata") or {}
+    ]
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def _decode(line: bytes, user_id: str) -> MemoryRecord:
+    memory_id, content, timestamp, source, metadata = json.loads(line)
+    return MemoryRecord(memory_id, content, user_id, timestamp, source, metadata)
+
+
+def _meta_line(memory: Dict[str, Any]) -> str:
+    """A segment record replacing a stored memory's metadata (a merge or new recall counts)."""
+    return json.dumps(
+        {"op": "meta", "id": memory["id"], "user_id": memory["user_id"], "metadata": memory["metadata"]},
+        ensure_ascii=False
+    ) + "\n"
+
+
+def write_pack(
+    path: Path,
+    blocks: Iterable[Tuple[str, List[bytes], int]],
+    segment: int,
+    last_update: Optional[str] = None
+) -> None:
+    """
+    Atomically write a pack file.
+
+    Args:
+        path: Destination; replaced only once the new file is complete
+        blocks: ``(user_id, encoded lines, count)`` per user
+        segment: Highest write-ahead segment folded into this pack
+        last_update: Timestamp of the newest memory in the pack
+    """
+    users = {}
+    tmp_path = path.with_suffix(".pack.tmp")
+    with open(tmp_path, 'wb') as f:
+        for user_id, chunks, count in blocks:
+            offset = f.tell()
+            for chunk in chunks:
+                f.write(chunk)
+            users[user_id] = [offset, f.tell() - offset, count]
+        index_offset = f.tell()
+        table = {"segment": segment, "last_update": last_update, "users": users}
+        f.write(json.dumps(table, ensure_ascii=False).encode("utf-8"))
+        f.write(FOOTER.pack(index_offset, MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _group_by_user(memories: Iterable[Dict[str, Any]]) -> List[Tuple[str, List[bytes], int]]:
+    grouped: Dict[str, List[bytes]] = {}
+    for memory in memories:
+        grouped.setdefault(memory.get("user_id") or "default_user", []).append(_encode(memory))
+    return [(user_id, lines, len(lines)) for user_id, lines in grouped.items()]
+
+
+class PackFile:
+    """
+    Read-only, memory-mapped pack: each user's memories stored as one
+    contiguous block of JSON lines, followed by a ``user_id -> (offset,
+    length, count)`` table. Opening a pack only parses that table.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, magic = FOOTER.unpack(self._map[-FOOTER.size:])
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a memory pack")
+        table = json.loads(self._map[index_offset:len(self._map) - FOOTER.size])
+        self.segment: int = table["segment"]
+        self.last_update: Optional[str] = table.get("last_update")
+        self.users: Dict[str, List[int]] = table["users"]
+        self.total = sum(entry[2] for entry in self.users.values())
+
+    def count(self, user_id: str) -> int:
+        entry = self.users.get(user_id)
+        return entry[2] if entry else 0
+
+    def block(self, user_id: str) -> bytes:
+        """Raw encoded lines of a user's memories."""
+        entry = self.users.get(user_id)
+        if entry is None:
+            return b""
+        offset, length, _ = entry
+        return self._map[offset:offset + length]
+
+    def read(self, user_id: str) -> List[MemoryRecord]:
+        """Decode a user's memories, oldest first."""
+        return [_decode(line, user_id) for line in self.block(user_id).splitlines()]
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class PackedMemoryManager(MemoryManager):
+    """
+    MemoryManager that starts without loading any memories.
+
+    Memories live in a memory-mapped pack file (see ``PackFile``); startup
+    only reads its offset table and replays the small write-ahead segments
+    not yet folded into it. A user's memories are decoded and indexed the
+    first time that user is queried, and only the ``max_hot_users`` most
+    recently queried users are kept in RAM.
+
+    New memories are appended to ``<name>.pack-wal.<n>.jsonl``. Once
+    ``compact_threshold`` of them have accumulated, the pack is rewritten on
+    a background thread by copying each user's existing block and appending
+    their new lines, so compaction never decodes the stored memories.
+
+    A new memory that duplicates a stored one is merged into it (see
+    ``memory_dedup.merge_metadata``): the segment gets a ``meta`` record
+    with the stored memory's new metadata, applied whenever the memory is
+    loaded and folded into the next pack, and the stored memory's id is
+    returned. ``consolidate`` rewrites the pack with each user's memories
+    decoded and merges duplicates already stored. Deleting a memory appends
+    a tombstone to the segment; deleted memories are skipped when a user is
+    loaded and left out of the next pack.
+    """
+
+    def __init__(
+        self,
+        pack_path: str = "./memories.pack",
+        import_path: Optional[str] = None,
+        vector_path: Optional[str] = None,
+        detector: Optional[MemoryDetector] = None,
+        max_hot_users: int = 1000,
+        compact_threshold: int = 10000,
+        fsync: bool = False,
+        dedup_threshold: Optional[float] = DEFAULT_THRESHOLD,
+        retention: Optional[RetentionPolicy] = None,
+        ranker: Optional[HybridRanker] = None
+    ):
+        """
+        Initialize packed memory manager.
+
+        Args:
+            pack_path: Pack file
+            import_path: Legacy JSON memory file imported when no pack exists yet
+            vector_path: Where to persist semantic embeddings; None keeps them in memory
+            detector: Memory-worthiness detector; defaults to the built-in patterns
+            max_hot_users: Number of users whose memories stay decoded in RAM
+            compact_threshold: Unpacked memories that trigger a pack rewrite
+            fsync: Fsync the write-ahead segment after every write
+            dedup_threshold: Near-duplicate similarity for merging on write; None disables it
+            retention: TTLs and per-user quota (see ``MemoryManager``)
+            ranker: Hybrid recall ranker; defaults to ``HybridRanker()``
+        """
+        self.storage_path = Path(pack_path)
+        self.detector = detector or MemoryDetector()
+        self.max_hot_users = max_hot_users
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.dedup_threshold = dedup_threshold
+        self.retention = retention or RetentionPolicy()
+        self.ranker = ranker or HybridRanker()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._wal_file = None
+        self._compaction: Optional[threading.Thread] = None
+
+        if not self.storage_path.exists():
+            memories = []
+            if import_path and Path(import_path).exists():
+                memories = JSONFileStorage(import_path).load()
+                logger.info(f"Packing {len(memories)} memories from {import_path} into {self.storage_path}")
+            last_update = max((m.get("timestamp") or "" for m in memories), default="") or None
+            write_pack(self.storage_path, _group_by_user(memories), segment=0, last_update=last_update)
+        self._pack = PackFile(self.storage_path)
+
+        # Memories not yet in the pack: segment -> user_id -> memories
+        self._segments: "OrderedDict[int, Dict[str, List[Dict[str, Any]]]]" = OrderedDict()
+        # Deletes not yet applied to the pack: segment -> user_id -> memory ids
+        self._tombstones: Dict[int, Dict[str, Set[str]]] = {}
+        # Merged metadata not yet applied to the pack: segment -> user_id -> memory id -> metadata
+        self._updates: Dict[int, Dict[str, Dict[str, Dict[str, Any]]]] = {}
+        self._replay_segments()
+        self._active_segment = max(self._segments, default=self._pack.segment) + 1
+        unpacked = sum(len(m) for users in self._segments.values() for m in users.values())
+        # WAL records not yet in the pack, which decide when to compact
+        self._unpacked = unpacked + sum(len(updates) for users in self._updates.values() for updates in users.values())
+        self._total = self._pack.total + unpacked - sum(
+            len(ids) for users in self._tombstones.values() for ids in users.values()
+        )
+        self.last_update = self._pack.last_update
+        for users in self._segments.values():
+            for memories in users.values():
+                if memories and memories[-1]["timestamp"] > (self.last_update or ""):
+                    self.last_update = memories[-1]["timestamp"]
+
+        self.index = InvertedIndex()
+        self._hot: "OrderedDict[str, None]" = OrderedDict()
+        self._recalled: Dict[str, MemoryRecord] = {}
+        self.semantic_index = SemanticIndex(self._user_memories, path=vector_path)
+        self.dedup = DedupIndex(self._user_memories, dedup_threshold) if dedup_threshold else None
+
+    # ------------------------------------------------------------------
+    # Write-ahead segments
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.storage_path.with_suffix(f".pack-wal.{segment}.jsonl")
+
+    def _segment_files(self) -> List[Tuple[int, Path]]:
+        files = []
+        for path in self.storage_path.parent.glob(f"{self.storage_path.stem}.pack-wal.*.jsonl"):
+            match = SEGMENT_PATTERN.search(path.name)
+            if match:
+                files.append((int(match.group(1)), path))
+        return sorted(files)
+
+    def _replay_segments(self) -> None:
+        for segment, path in self._segment_files():
+            if segment <= self._pack.segment:
+                # Already folded into the pack; left behind by an interrupted compaction
+                path.unlink(missing_ok=True)
+                continue
+            users = self._segments.setdefault(segment, {})
+            tombstones = self._tombstones.setdefault(segment, {})
+            updates = self._updates.setdefault(segment, {})
+            with open(path, 'rb') as f:
+                for raw in f:
+                    if not raw.endswith(b"\n"):
+                        logger.warning(f"Discarding torn tail of {path}")
+                        break
+                    entry = json.loads(raw)
+                    if entry.get("op") == "put":
+                        memory = MemoryRecord.from_dict(entry["data"])
+                        users.setdefault(memory["user_id"], []).append(memory)
+                    elif entry.get("op") == "delete":
+                        tombstones.setdefault(entry["user_id"], set()).add(entry["id"])
+                    elif entry.get("op") == "meta":
+                        updates.setdefault(entry["user_id"], {})[entry["id"]] = entry["metadata"]
+
+    def _open_wal(self):
+        if self._wal_file is None:
+            self._wal_file = open(self._segment_path(self._active_segment), 'a', encoding='utf-8')
+        return self._wal_file
+
+    def _close_wal(self) -> None:
+        if self._wal_file is not None:
+            self._wal_file.close()
+            self._wal_file = None
+
+    def _append_wal(self, lines: str) -> None:
+        """Append records to the active segment; caller holds _write_lock."""
+        with MEMORY_WRITE_SECONDS.time():
+            f = self._open_wal()
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _record_updates(self, memories: Iterable[Dict[str, Any]]) -> None:
+        """Note the ``meta`` records just written for ``memories``; caller holds both locks."""
+        updates = self._updates.setdefault(self._active_segment, {})
+        for memory in memories:
+            updates.setdefault(memory["user_id"], {})[memory["id"]] = memory["metadata"]
+            self._unpacked += 1
+
+    # ------------------------------------------------------------------
+    # Hot users
+    # ------------------------------------------------------------------
+
+    def _sync(self) -> None:
+        """Only this process writes the pack, so there is nothing to pick up."""
+
+    def _user_memories(self, user_id: str) -> List[Dict[str, Any]]:
+        """Return a user's memories, loading them if the user is cold; caller holds _lock."""
+        self._touch(user_id)
+        return self.index.memories(user_id)
+
+    def _deleted(self, user_id: str) -> Set[str]:
+        """Ids of a user's memories deleted since the pack was written."""
+        deleted = set()
+        for users in self._tombstones.values():
+            deleted.update(users.get(user_id, ()))
+        return deleted
+
+    def _read_user(self, user_id: str) -> List[MemoryRecord]:
+        """Decode a user's live memories from the pack and segments; caller holds _lock."""
+        memories = self._pack.read(user_id)
+        for users in self._segments.values():
+            memories.extend(users.get(user_id, ()))
+        deleted = self._deleted(user_id)
+        if deleted:
+            memories = [memory for memory in memories if memory["id"] not in deleted]
+        updates = self._pending_updates(user_id)
+        if updates:
+            for memory in memories:
+                metadata = updates.get(memory["id"])
+                if metadata is not None:
+                    # The latest merge, so applying it to a shared segment record changes nothing
+                    memory.update_metadata(metadata)
+        return memories
+
+    def _pending_updates(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """Latest merged metadata of a user's memories since the pack was written."""
+        updates: Dict[str, Dict[str, Any]] = {}
+        for segment in sorted(self._updates):
+            updates.update(self._updates[segment].get(user_id, {}))
+        return updates
+
+    def _user_snapshot(self, user_id: str) -> List[Dict[str, Any]]:
+        """A user's memories, read without making a cold user hot."""
+        with self._lock:
+            if user_id in self._hot:
+                return list(self.index.memories(user_id))
+            return self._read_user(user_id)
+
+    def _touch(self, user_id: str) -> None:
+        """Make ``user_id`` the most recently used hot user, evicting the coldest."""
+        if user_id in self._hot:
+            self._hot.move_to_end(user_id)
+            return
+
+        for memory in self._read_user(user_id):
+            self.index.add(memory)
+        self._hot[user_id] = None
+
+        while len(self._hot) > self.max_hot_users:
+            cold, _ = self._hot.popitem(last=False)
+            self.index.drop(cold)
+            self.semantic_index.drop(cold)
+            if self.dedup is not None:
+                self.dedup.drop(cold)
+
+    def _count(self, user_id: str) -> int:
+        return (
+            self._pack.count(user_id)
+            + sum(len(users.get(user_id, ())) for users in self._segments.values())
+            - sum(len(users.get(user_id, ())) for users in self._tombstones.values())
+        )
+
+    # ------------------------------------------------------------------
+    # MemoryManager API
+    # ------------------------------------------------------------------
+
+    def store_memories(self, items: List[Dict[str, Any]]) -> List[str]:
+        timestamp = datetime.utcnow().isoformat()
+        records = [
+            MemoryRecord(
+                str(uuid.uuid4()),
+                item["content"],
+                item.get("user_id") or "default_user",
+                timestamp,
+                item.get("source") or "",
+                item.get("metadata")
+            )
+            for item in items
+        ]
+        if not records:
+            return []
+
+        with self._write_lock:
+            # Dedup state follows the hot users, so it is guarded by _lock here
+            with self._lock:
+                targets = self._deduplicate(records)
+                # Stored memories whose metadata a duplicate was merged into
+                merged: Dict[int, MemoryRecord] = {}
+                for memory, target in zip(records, targets):
+                    if target is not memory:
+                        target.update_metadata(merge_metadata(target, memory))
+                        self.index.update(target)
+                        merged[id(target)] = target
+            new = [memory for memory, target in zip(records, targets) if target is memory]
+            # A target from this batch is written once, already merged
+            for memory in new:
+                merged.pop(id(memory), None)
+            lines = "".join(
+                json.dumps({"op": "put", "data": dict(memory)}, ensure_ascii=False) + "\n"
+                for memory in new
+            ) + "".join(_meta_line(target) for target in merged.values())
+            self._append_wal(lines)
+
+            with self._lock:
+                users = self._segments.setdefault(self._active_segment, {})
+                for memory in new:
+                    users.setdefault(memory["user_id"], []).append(memory)
+                    if memory["user_id"] in self._hot:
+                        self.index.add(memory)
+                        self.semantic_index.add(memory)
+                self._record_updates(merged.values())
+                self._total += len(new)
+                self._unpacked += len(new)
+                self.last_update = timestamp
+
+                if self._unpacked >= self.compact_threshold and not self._compacting():
+                    self._start_compaction()
+
+        MEMORIES_STORED.inc(len(new))
+        MEMORIES_MERGED.inc(len(records) - len(new))
+        if self.retention.user_quota and new:
+            self._enforce_quota({memory["user_id"] for memory in new})
+        return [target["id"] for target in targets]
+
+    def _remove(self, user_id: str, memories: List[Dict[str, Any]]) -> int:
+        if not memories:
+            return 0
+        with self._write_lock:
+            with self._lock:
+                live = {memory["id"] for memory in self._user_snapshot(user_id)}
+                memory_ids = [memory["id"] for memory in memories if memory["id"] in live]
+                if not memory_ids:
+                    return 0
+            lines = "".join(
+                json.dumps({"op": "delete", "id": memory_id, "user_id": user_id}, ensure_ascii=False) + "\n"
+                for memory_id in memory_ids
+            )
+            self._append_wal(lines)
+
+            with self._lock:
+                users = self._tombstones.setdefault(self._active_segment, {})
+                users.setdefault(user_id, set()).update(memory_ids)
+                self._total -= len(memory_ids)
+                if user_id in self._hot:
+                    removed = set(memory_ids)
+                    self.index.rebuild(user_id, [m for m in self.index.memories(user_id) if m["id"] not in removed])
+                self.semantic_index.remove(user_id, memory_ids)
+                if self.dedup is not None:
+                    self.dedup.drop(user_id)
+        return len(memory_ids)
+
+    def retrieve_memories(
+        self,
+        query: str,
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._touch(user_id)
+            results = self._search([query], user_id, limit, mode)[0]
+        return [{**memory, "score": round(score, 4)} for memory, score in results]
+
+    def retrieve_memories_bulk(
+        self,
+        queries: List[str],
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[List[Dict[str, Any]]]:
+        with self._lock:
+            self._touch(user_id)
+            results = self._search(queries, user_id, limit, mode)
+        return [
+            [{**memory, "score": round(score, 4)} for memory, score in hits]
+            for hits in results
+        ]
+
+    def get_memory_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            count = self._count(user_id) if user_id else self._total
+
+        return {
+            "total_memories": count,
+            "user_id": user_id,
+            "last_update": self.last_update,
+            "status": "operational"
+        }
+
+    def user_counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {user_id: entry[2] for user_id, entry in self._pack.users.items()}
+            for users in self._segments.values():
+                for user_id, memories in users.items():
+                    counts[user_id] = counts.get(user_id, 0) + len(memories)
+            for users in self._tombstones.values():
+                for user_id, memory_ids in users.items():
+                    counts[user_id] -= len(memory_ids)
+        return {user_id: count for user_id, count in counts.items() if count > 0}
+
+    def consolidate(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        while True:
+            self.wait_for_compaction()
+            with self._write_lock, self._lock:
+                if not self._compacting():
+                    stats = self._start_compaction(consolidate=True)
+                    break
+        self.wait_for_compaction()
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    def flush_recalls(self) -> int:
+        """Write the recall counts gathered since the last flush as ``meta`` records."""
+        with self._write_lock:
+            with self._lock:
+                pending = []
+                deleted: Dict[str, Set[str]] = {}
+                for memory in self._recalled.values():
+                    user_id = memory["user_id"]
+                    if user_id not in deleted:
+                        deleted[user_id] = self._deleted(user_id)
+                    if memory["id"] not in deleted[user_id]:
+                        pending.append(memory)
+                self._recalled = {}
+            if not pending:
+                return 0
+            self._append_wal("".join(_meta_line(memory) for memory in pending))
+            with self._lock:
+                self._record_updates(pending)
+                if self._unpacked >= self.compact_threshold and not self._compacting():
+                    self._start_compaction()
+        return len(pending)
+
+    def close(self) -> None:
+        self.flush_recalls()
+        self.wait_for_compaction()
+        with self._write_lock:
+            self._close_wal()
+        with self._lock:
+            self.semantic_index.save()
+            self._pack.close()
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def _start_compaction(self, consolidate: bool = False) -> Dict[str, int]:
+        """
+        Seal the active segment and fold all sealed segments into a new pack; caller holds both locks.
+
+        With ``consolidate`` every user's memories are decoded and duplicates
+        merged (see ``memory_dedup.find_duplicates``); the returned stats are
+        filled in by the background thread.
+        """
+        self._close_wal()
+        sealed = self._active_segment
+        self._active_segment += 1
+        self._unpacked = 0
+        pack = self._pack
+        overlays = [users for segment, users in self._segments.items() if segment <= sealed]
+        tombstones = [users for segment, users in self._tombstones.items() if segment <= sealed]
+        updates = [self._updates[segment] for segment in sorted(self._updates) if segment <= sealed]
+        last_update = self.last_update
+        threshold = self.dedup_threshold or DEFAULT_THRESHOLD
+        stats = {"users": 0, "scanned": 0, "reclaimed": 0}
+
+        def read(user_id: str) -> List[Dict[str, Any]]:
+            memories = pack.read(user_id)
+            for users in overlays:
+                memories.extend(users.get(user_id, ()))
+            deleted = set()
+            for users in tombstones:
+                deleted.update(users.get(user_id, ()))
+            merged: Dict[str, Dict[str, Any]] = {}
+            for users in updates:
+                merged.update(users.get(user_id, {}))
+            # Copies: overlay records are shared with the hot index, which may hold newer metadata
+            return [
+                {**memory, "metadata": merged[memory["id"]]} if memory["id"] in merged else memory
+                for memory in memories if memory["id"] not in deleted
+            ]
+
+        def consolidated(user_id: str) -> Tuple[str, List[bytes], int]:
+            memories = read(user_id)
+            kept, merges = find_duplicates(memories, threshold)
+            # Merged metadata goes into copies: overlay records are shared with the hot index
+            merged: Dict[int, Dict[str, Any]] = {}
+            for target, duplicate in merges:
+                merged[id(target)] = {**target, "metadata": merge_metadata(merged.get(id(target), target), duplicate)}
+            stats["users"] += 1
+            stats["scanned"] += len(memories)
+            stats["reclaimed"] += len(merges)
+            return user_id, [_encode(merged.get(id(memory), memory)) for memory in kept], len(kept)
+
+        def blocks():
+            user_ids = dict.fromkeys(pack.users)
+            for users in overlays:
+                user_ids.update(dict.fromkeys(users))
+            for user_id in user_ids:
+                if consolidate:
+                    yield consolidated(user_id)
+                    continue
+                if any(user_id in users for users in tombstones) or any(user_id in users for users in updates):
+                    # Deletes and merges mean decoding this user's lines to leave out or change some
+                    memories = read(user_id)
+                    if memories:
+                        yield user_id, [_encode(memory) for memory in memories], len(memories)
+                    continue
+                chunks = [pack.block(user_id)]
+                count = pack.count(user_id)
+                for users in overlays:
+                    memories = users.get(user_id, ())
+                    chunks.extend(_encode(memory) for memory in memories)
+                    count += len(memories)
+                yield user_id, chunks, count
+
+        def compact():
+            try:
+                write_pack(self.storage_path, blocks(), segment=sealed, last_update=last_update)
+                new_pack = PackFile(self.storage_path)
+                with self._lock:
+                    self._pack = new_pack
+                    for segment in [s for s in self._segments if s <= sealed]:
+                        del self._segments[segment]
+                    for segment in [s for s in self._tombstones if s <= sealed]:
+                        del self._tombstones[segment]
+                    for segment in [s for s in self._updates if s <= sealed]:
+                        del self._updates[segment]
+                    if consolidate:
+                        # Hot users still hold the removed duplicates; reload them from the new pack
+                        for user_id in self._hot:
+                            self.semantic_index.drop(user_id)
+                            if self.dedup is not None:
+                                self.dedup.drop(user_id)
+                        self._hot.clear()
+                        self.index = InvertedIndex()
+                        self._total = new_pack.total + sum(
+                            len(m) for users in self._segments.values() for m in users.values()
+                        ) - sum(
+                            len(ids) for users in self._tombstones.values() for ids in users.values()
+                        )
+                        MEMORIES_RECLAIMED.inc(stats["reclaimed"])
+                pack.close()
+                for segment, path in self._segment_files():
+                    if segment <= sealed:
+                        path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.error(f"Error compacting memory pack: {e}")
+
+        self._compaction = threading.Thread(target=compact, name="memory-pack-compaction", daemon=True)
+        self._compaction.start()
+        return stats
+
+    def wait_for_compaction(self) -> None:
+        """Block until any running compaction has finished."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON memory file into a memory pack.")
+    parser.add_argument("json_path", help="Existing memories.json")
+    parser.add_argument("pack_path", help="Pack file to create (must not exist)")
+    args = parser.parse_args()
+
+    if Path(args.pack_path).exists():
+        parser.error(f"{args.pack_path} already exists")
+    manager = PackedMemoryManager(args.pack_path, import_path=args.json_path)
+    print(f"Packed {manager.get_memory_stats()['total_memories']} memories into {args.pack_path}")
+    manager.close()
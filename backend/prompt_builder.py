@@ -0,0 +1,144 @@
+"""Token-budgeted prompt assembly for chat requests."""
+import math
+import threading
+from dataclasses import dataclass
+from typing import List, Dict, Any
+
+# Rough size of a Gemini token for English text; avoids a count_tokens round trip
+CHARS_PER_TOKEN = 4
+# Don't bother truncating a memory into less room than this
+MIN_TRUNCATED_TOKENS = 12
+
+MEMORY_HEADER = "Here's what I remember about our previous conversations:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text``."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class BuiltPrompt:
+    """A user turn ready to send, with its accounting."""
+    text: str
+    memories: List[Dict[str, Any]]
+    input_tokens: int
+    history_tokens: int
+    tokens_saved: int
+    memories_dropped: int
+    memories_truncated: int
+
+
+class PromptBuilder:
+    """
+    Builds the per-request user turn; the system prompt is not part of it.
+
+    The system prompt is given to the model once as its system instruction,
+    so each turn only carries the memory context and the message. Memories
+    are added best-ranked first until ``memory_token_budget`` is used up;
+    the memory that crosses the budget is truncated to fit if enough room is
+    left, and lower-ranked ones are dropped. ``input_tokens`` counts the
+    system instruction, the chat history sent with the turn and the turn
+    itself. ``tokens_saved`` compares that with the old prompt, which had no
+    history but repeated the system prompt as user text and included every
+    retrieved memory.
+    """
+
+    def __init__(self, system_prompt: str, memory_token_budget: int = 400):
+        self.system_instruction = system_prompt
+        self.memory_token_budget = memory_token_budget
+        self._system_tokens = estimate_tokens(system_prompt)
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.input_tokens = 0
+        self.history_tokens = 0
+        self.tokens_saved = 0
+        self.memories_dropped = 0
+        self.memories_truncated = 0
+
+    @staticmethod
+    def _memory_line(index: int, memory: Dict[str, Any], content: str) -> str:
+        timestamp = memory.get('timestamp') or 'unknown time'
+        return f"{index}. {content} (from {timestamp[:10]})"
+
+    def _legacy_tokens(self, user_message: str, memories: List[Dict[str, Any]]) -> int:
+        """Token estimate of the prompt the handler used to send."""
+        text = self.system_instruction
+        if memories:
+            lines = [self._memory_line(i, m, m['content']) for i, m in enumerate(memories, 1)]
+            text += "\n\n" + MEMORY_HEADER + "\n" + "\n".join(lines)
+        text += f"\n\nUser: {user_message}\n\nAssistant:"
+        return estimate_tokens(text)
+
+    def build(self, user_message: str, memories: List[Dict[str, Any]], history_tokens: int = 0) -> BuiltPrompt:
+        """
+        Assemble the user turn for ``user_message``.
+
+        Args:
+            user_message: The user's message
+            memories: Retrieved memories, best first
+            history_tokens: Approximate tokens of chat history sent with the turn
+
+        Returns:
+            The prompt text and the memories that made it in
+        """
+        lines = []
+        included = []
+        truncated = 0
+        remaining = self.memory_token_budget - estimate_tokens(MEMORY_HEADER)
+
+        for memory in memories:
+            line = self._memory_line(len(lines) + 1, memory, memory['content'])
+            cost = estimate_tokens(line) + 1
+            if cost <= remaining:
+                lines.append(line)
+                included.append(memory)
+                remaining -= cost
+                continue
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                overhead = len(self._memory_line(len(lines) + 1, memory, "…"))
+                room = (remaining - 1) * CHARS_PER_TOKEN - overhead
+                lines.append(self._memory_line(len(lines) + 1, memory, memory['content'][:room].rstrip() + "…"))
+                included.append(memory)
+                truncated += 1
+            break
+
+        text = user_message
+        if lines:
+            text = MEMORY_HEADER + "\n".join(lines) + f"\n\nUser: {user_message}"
+
+        input_tokens = self._system_tokens + history_tokens + estimate_tokens(text)
+        tokens_saved = max(0, self._legacy_tokens(user_message, memories) - input_tokens)
+        prompt = BuiltPrompt(
+            text=text,
+            memories=included,
+            input_tokens=input_tokens,
+            history_tokens=history_tokens,
+            tokens_saved=tokens_saved,
+            memories_dropped=len(memories) - len(included),
+            memories_truncated=truncated
+        )
+
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.history_tokens += history_tokens
+            self.tokens_saved += tokens_saved
+            self.memories_dropped += prompt.memories_dropped
+            self.memories_truncated += truncated
+        return prompt
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.requests
+        return {
+            "requests": requests,
+            "memory_token_budget": self.memory_token_budget,
+            "system_instruction_tokens": self._system_tokens,
+            "avg_input_tokens": round(self.input_tokens / requests, 1) if requests else 0.0,
+            "avg_history_tokens": round(self.history_tokens / requests, 1) if requests else 0.0,
+            "avg_tokens_saved": round(self.tokens_saved / requests, 1) if requests else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "memories_dropped": self.memories_dropped,
+            "memories_truncated": self.memories_truncated,
+        }
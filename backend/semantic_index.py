@@ -0,0 +1,253 @@
+"""Offline semantic recall using hashed embeddings and a per-user vector index."""
+import itertools
+import logging
+import math
+import zlib
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Callable
+
+import numpy as np
+
+from memory_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Users with fewer vectors than this are searched exhaustively
+ANN_THRESHOLD = 5000
+# Number of IVF lists probed per query
+N_PROBE = 8
+KMEANS_ITERATIONS = 8
+KMEANS_SAMPLE = 20000
+
+
+class HashingEmbedder:
+    """
+    CPU-only text embedder based on the hashing trick.
+
+    Words and their character trigrams are hashed into a fixed number of
+    signed buckets and the result is L2-normalised, so cosine similarity
+    rewards shared words and, more weakly, shared word fragments. Hashes use
+    CRC32 so vectors are stable across processes and can be persisted.
+    """
+
+    def __init__(self, dim: int = 512, trigram_weight: float = 0.5):
+        self.dim = dim
+        self.trigram_weight = trigram_weight
+
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        for word in tokenize(text):
+            yield word, 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                yield "#" + padded[i:i + 3], self.trigram_weight
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += weight if h & 0x80000000 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class UserVectors:
+    """Contiguous embedding matrix for one user, with an optional IVF index."""
+
+    def __init__(self, dim: int):
+        self.matrix = np.zeros((16, dim), dtype=np.float32)
+        self.size = 0
+        self.memories: List[Dict[str, Any]] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._trained_size = 0
+
+    def add(self, memory: Dict[str, Any], vector: np.ndarray) -> None:
+        if self.size == len(self.matrix):
+            grown = np.zeros((len(self.matrix) * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        row = self.size
+        self.matrix[row] = vector
+        self.memories.append(memory)
+        self.size += 1
+        if self._centroids is not None:
+            self._lists[int(np.argmax(self._centroids @ vector))].append(row)
+
+    def _train(self) -> None:
+        """Cluster the vectors with spherical k-means and build inverted lists."""
+        vectors = self.matrix[:self.size]
+        n_lists = max(1, int(math.sqrt(self.size)))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(self.size, min(self.size, KMEANS_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+
+        for _ in range(KMEANS_ITERATIONS):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assignment == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm > 0 else centroid
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        self._lists = [[] for _ in range(n_lists)]
+        for row, c in enumerate(assignment.tolist()):
+            self._lists[c].append(row)
+        self._centroids = centroids
+        self._trained_size = self.size
+
+    def _candidates(self, query: np.ndarray) -> Optional[np.ndarray]:
+        """Rows to score for ``query``; ``None`` means all rows."""
+        if self.size < ANN_THRESHOLD:
+            return None
+        # Retrain whenever the user's store has doubled since the last build
+        if self._centroids is None or self.size >= 2 * self._trained_size:
+            self._train()
+        probe = np.argsort(self._centroids @ query)[-N_PROBE:]
+        return np.fromiter(
+            itertools.chain.from_iterable(self._lists[c] for c in probe.tolist()),
+            dtype=np.int64
+        )
+
+    def search(self, query: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        rows = self._candidates(query)
+        if rows is None:
+            return self._top(np.arange(self.size), self.matrix[:self.size] @ query, limit)
+        return self._top(rows, self.matrix[rows] @ query, limit)
+
+    def search_many(self, queries: np.ndarray, limit: int) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Search a ``(n_queries, dim)`` batch; small users are scored with one matrix product."""
+        if self.size >= ANN_THRESHOLD:
+            return [self.search(query, limit) for query in queries]
+        rows = np.arange(self.size)
+        scores = self.matrix[:self.size] @ queries.T
+        return [self._top(rows, scores[:, i], limit) for i in range(len(queries))]
+
+    def _top(self, rows: np.ndarray, scores: np.ndarray, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (self.memories[int(rows[i])], float(scores[i]))
+            for i in top
+            if scores[i] > 0
+        ]
+
+
+class SemanticIndex:
+    """
+    Per-user vector index over memory embeddings, persisted as ``.npz``.
+
+    A user's matrix is built the first time that user is searched, reusing
+    persisted vectors where available; after that new memories are embedded
+    as they are stored.
+    """
+
+    def __init__(
+        self,
+        user_memories: Callable[[str], List[Dict[str, Any]]],
+        path: Optional[str] = None,
+        embedder: Optional[HashingEmbedder] = None
+    ):
+        """
+        Args:
+            user_memories: Returns the stored memories of a user, oldest first
+            path: Where to persist embeddings; ``None`` keeps them in memory only
+            embedder: Text embedder (defaults to ``HashingEmbedder``)
+        """
+        self.user_memories = user_memories
+        self.path = Path(path) if path else None
+        self.embedder = embedder or HashingEmbedder()
+        self._users: Dict[str, UserVectors] = {}
+        self._persisted: Optional[Dict[str, np.ndarray]] = None
+
+    def _load_vectors(self) -> Dict[str, np.ndarray]:
+        """Load persisted embeddings keyed by memory id (once)."""
+        if self._persisted is not None:
+            return self._persisted
+        self._persisted = {}
+        if self.path and self.path.exists():
+            try:
+                with np.load(self.path, allow_pickle=False) as data:
+                    if int(data["dim"]) == self.embedder.dim:
+                        self._persisted = dict(zip(data["ids"].tolist(), data["vectors"]))
+            except Exception as e:
+                logger.error(f"Error loading semantic index: {e}")
+        return self._persisted
+
+    def _user(self, user_id: str) -> UserVectors:
+        user_vectors = self._users.get(user_id)
+        if user_vectors is None:
+            persisted = self._load_vectors()
+            user_vectors = UserVectors(self.embedder.dim)
+            for memory in self.user_memories(user_id):
+                vector = persisted.pop(memory["id"], None)
+                if vector is None:
+                    vector = self.embedder.embed(memory["content"])
+                user_vectors.add(memory, vector)
+            self._users[user_id] = user_vectors
+        return user_vectors
+
+    def add(self, memory: Dict[str, Any]) -> None:
+        """Embed a newly stored memory if its user's index is already built."""
+        user_vectors = self._users.get(memory.get("user_id"))
+        if user_vectors is not None:
+            user_vectors.add(memory, self.embedder.embed(memory["content"]))
+
+    def drop(self, user_id: str) -> None:
+        """Release a user's matrix; it is rebuilt on that user's next search."""
+        self._users.pop(user_id, None)
+
+    def remove(self, user_id: str, memory_ids: Iterable[str]) -> None:
+        """
+        Forget the embeddings of deleted memories.
+
+        The user's matrix is released; embeddings of their remaining
+        memories go back to the persisted set, so the rebuild on the next
+        search does not re-embed them.
+        """
+        memory_ids = set(memory_ids)
+        persisted = self._load_vectors()
+        for memory_id in memory_ids:
+            persisted.pop(memory_id, None)
+        user_vectors = self._users.pop(user_id, None)
+        if user_vectors is not None:
+            for row, memory in enumerate(user_vectors.memories):
+                if memory["id"] not in memory_ids:
+                    persisted[memory["id"]] = user_vectors.matrix[row]
+
+    def search(self, query: str, user_id: str, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to ``limit`` ``(memory, cosine similarity)`` pairs, best first."""
+        user_vectors = self._user(user_id)
+        if not user_vectors.size:
+            return []
+        return user_vectors.search(self.embedder.embed(query), limit)
+
+    def search_many(self, queries: List[str], user_id: str, limit: int) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """Like ``search`` for several queries against the same user."""
+        user_vectors = self._user(user_id)
+        if not user_vectors.size:
+            return [[] for _ in queries]
+        return user_vectors.search_many(np.stack([self.embedder.embed(query) for query in queries]), limit)
+
+    def save(self) -> None:
+        """Persist all known embeddings next to the memory store."""
+        if not self.path or (not self._users and not self._persisted):
+            return
+        persisted = self._persisted or {}
+        ids = [m["id"] for user in self._users.values() for m in user.memories] + list(persisted)
+        blocks = [user.matrix[:user.size] for user in self._users.values()]
+        if persisted:
+            blocks.append(np.stack(list(persisted.values())))
+        vectors = np.concatenate(blocks) if blocks else np.zeros((0, self.embedder.dim), dtype=np.float32)
+        tmp_path = self.path.with_suffix(".tmp.npz")
+        try:
+            np.savez(tmp_path, ids=np.array(ids, dtype=str), vectors=vectors, dim=self.embedder.dim)
+            tmp_path.replace(self.path)
+        except Exception as e:
+            logger.error(f"Error saving semantic index: {e}")
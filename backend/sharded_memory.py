@@ -0,0 +1,424 @@
+"""Memory manager that splits the store into per-user-hash shards, each with its own file and locks."""
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+
+from memory_manager import MemoryManager
+from memory_dedup import DEFAULT_THRESHOLD
+from memory_detector import MemoryDetector
+from memory_lifecycle import RetentionPolicy
+from memory_ranker import HybridRanker
+from storage import create_storage
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "shards.json"
+SHARD_PATTERN = re.compile(r"^shard-(\d+)\.")
+
+
+def shard_of(user_id: str, shards: int) -> int:
+    """Shard holding ``user_id``; crc32 rather than ``hash()``, which differs between processes."""
+    return zlib.crc32(user_id.encode("utf-8")) % shards
+
+
+def shard_path(shard_dir: Path, shard: int) -> Path:
+    return shard_dir / f"shard-{shard:04d}.json"
+
+
+def stats_path(shard_dir: Path, shard: int) -> Path:
+    return shard_dir / f"shard-{shard:04d}.stats.json"
+
+
+def read_shard_stats(shard_dir: Path, shard: int) -> Optional[Dict[str, Any]]:
+    """Per-user counts, last write and last consolidation of a shard, or None if not recorded."""
+    try:
+        return json.loads(stats_path(shard_dir, shard).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_shard_stats(
+    shard_dir: Path,
+    shard: int,
+    users: Dict[str, int],
+    last_update: Optional[str],
+    consolidated: Optional[str] = None
+) -> Dict[str, Any]:
+    """Record a shard's stats next to it, so whole-store queries need not open the shard."""
+    stats = {"users": users, "last_update": last_update, "consolidated": consolidated}
+    # Per-process temporary file, as processes sharing a store write the same sidecar
+    tmp_path = stats_path(shard_dir, shard).with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(stats), encoding="utf-8")
+    tmp_path.replace(stats_path(shard_dir, shard))
+    return stats
+
+
+def read_manifest(shard_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads((shard_dir / MANIFEST).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(shard_dir: Path, shards: int, backend: str) -> None:
+    """Record the layout; written last, so a directory without it holds no complete store."""
+    tmp_path = shard_dir / (MANIFEST + ".tmp")
+    tmp_path.write_text(json.dumps({"shards": shards, "backend": backend, "hash": "crc32"}), encoding="utf-8")
+    tmp_path.replace(shard_dir / MANIFEST)
+
+
+def load_source(path: str, backend: str = "json") -> Iterable[Dict[str, Any]]:
+    """
+    Yield the memories of an existing store.
+
+    Args:
+        path: Single memory file, or the directory of a sharded store
+        backend: Engine of a single-file store ("json" or "log")
+    """
+    source = Path(path)
+    manifest = read_manifest(source) if source.is_dir() else None
+    if manifest is None:
+        storage = create_storage(backend, path)
+        yield from storage.load()
+        storage.close()
+        return
+    for shard in range(manifest["shards"]):
+        storage = create_storage(manifest["backend"], str(shard_path(source, shard)))
+        yield from storage.load()
+        storage.close()
+
+
+def reshard(
+    memories: Iterable[Dict[str, Any]],
+    shard_dir: str,
+    shards: int,
+    backend: str = "json"
+) -> Dict[str, int]:
+    """
+    Write ``memories`` into a new sharded store.
+
+    Args:
+        memories: Memories to distribute, e.g. from ``load_source``
+        shard_dir: Directory to create; must not already hold a sharded store
+        shards: Number of shards
+        backend: Engine of each shard file ("json" or "log")
+
+    Returns:
+        Memories, users and non-empty shards written
+    """
+    target = Path(shard_dir)
+    if read_manifest(target) is not None:
+        raise ValueError(f"{target} already holds a sharded memory store")
+    target.mkdir(parents=True, exist_ok=True)
+
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    users = set()
+    for memory in memories:
+        user_id = memory.get("user_id") or "default_user"
+        users.add(user_id)
+        grouped.setdefault(shard_of(user_id, shards), []).append(memory)
+
+    for shard, shard_memories in grouped.items():
+        storage = create_storage(backend, str(shard_path(target, shard)))
+        storage.rewrite(shard_memories)
+        storage.close()
+        counts: Dict[str, int] = {}
+        for memory in shard_memories:
+            user_id = memory.get("user_id") or "default_user"
+            counts[user_id] = counts.get(user_id, 0) + 1
+        write_shard_stats(target, shard, counts, max(m.get("timestamp") or "" for m in shard_memories) or None)
+    write_manifest(target, shards, backend)
+    return {
+        "memories": sum(len(shard_memories) for shard_memories in grouped.values()),
+        "users": len(users),
+        "shards": len(grouped)
+    }
+
+
+class ShardedMemoryManager(MemoryManager):
+    """
+    MemoryManager that splits memories into ``shards`` by a hash of ``user_id``.
+
+    Each shard is a plain ``MemoryManager`` over its own file (JSON or log
+    engine) with its own locks and indexes, opened the first time one of
+    its users is read or written. A write therefore rewrites or appends to
+    one shard's file and only waits for writers of the same shard, and
+    recall for a user loads only that user's shard.
+
+    Each shard's per-user counts, last write and last consolidation are
+    kept in a ``shard-NNNN.stats.json`` sidecar, rewritten after every
+    change to the shard. Totals, per-user counts and ``last_update`` are
+    answered from the sidecars without opening shards. Sweeps only open
+    shards the retention policy could remove memories from, and
+    consolidation only those written since they were last consolidated.
+
+    The shard count is fixed when the store is created (see ``shards.json``);
+    changing it means rewriting the store with ``reshard``.
+    """
+
+    def __init__(
+        self,
+        shard_dir: str = "./memories.shards",
+        shards: int = 64,
+        backend: str = "json",
+        import_path: Optional[str] = None,
+        persist_vectors: bool = True,
+        detector: Optional[MemoryDetector] = None,
+        dedup_threshold: Optional[float] = DEFAULT_THRESHOLD,
+        retention: Optional[RetentionPolicy] = None,
+        compact_threshold: int = 10000,
+        shared: bool = False,
+        ranker: Optional[HybridRanker] = None
+    ):
+        """
+        Initialize sharded memory manager.
+
+        Args:
+            shard_dir: Directory holding the shard files
+            shards: Number of shards for a new store; an existing store keeps its own
+            backend: Storage engine of each shard ("json" or "log")
+            import_path: Single-file store (of the same engine) resharded into a new store
+            persist_vectors: Keep each shard's semantic embeddings next to its file
+            detector: Memory-worthiness detector; defaults to the built-in patterns
+            dedup_threshold: Near-duplicate similarity for merging on write; None disables it
+            retention: TTLs and per-user quota (see ``MemoryManager``)
+            compact_threshold: Log records per shard that trigger a snapshot (log engine)
+            shared: Let several processes share the shards (log engine only)
+            ranker: Hybrid recall ranker shared by the shards; defaults to ``HybridRanker()``
+        """
+        self.storage_path = Path(shard_dir)
+        self.detector = detector or MemoryDetector()
+        self.dedup_threshold = dedup_threshold
+        self.retention = retention or RetentionPolicy()
+        self.ranker = ranker or HybridRanker()
+        self.persist_vectors = persist_vectors
+        self.compact_threshold = compact_threshold
+        self.shared = shared
+
+        manifest = read_manifest(self.storage_path)
+        if manifest is None:
+            if import_path and Path(import_path).exists():
+                stats = reshard(load_source(import_path, backend), shard_dir, shards, backend)
+                logger.info(f"Sharded {stats['memories']} memories from {import_path} into {stats['shards']} shards")
+            else:
+                self.storage_path.mkdir(parents=True, exist_ok=True)
+                write_manifest(self.storage_path, shards, backend)
+            manifest = read_manifest(self.storage_path)
+        elif manifest["shards"] != shards or manifest["backend"] != backend:
+            logger.warning(
+                f"{shard_dir} has {manifest['shards']} {manifest['backend']} shards; using them "
+                f"instead of {shards} {backend} shards (run sharded_memory.py to reshard)"
+            )
+        self.shards: int = manifest["shards"]
+        self.backend: str = manifest["backend"]
+
+        self._shards: Dict[int, MemoryManager] = {}
+        # One lock per shard, so opening a cold shard only blocks its own users
+        self._open_locks = [threading.Lock() for _ in range(self.shards)]
+        # shard -> (sidecar mtime, stats) as last read or written
+        self._stats: Dict[int, Tuple[Optional[int], Dict[str, Any]]] = {}
+
+    def _shard(self, shard: int) -> MemoryManager:
+        """Return a shard's manager, loading the shard on first use."""
+        manager = self._shards.get(shard)
+        if manager is not None:
+            return manager
+        with self._open_locks[shard]:
+            manager = self._shards.get(shard)
+            if manager is None:
+                path = shard_path(self.storage_path, shard)
+                manager = MemoryManager(
+                    storage_path=str(path),
+                    storage=create_storage(
+                        self.backend, str(path), compact_threshold=self.compact_threshold, shared=self.shared
+                    ),
+                    vector_path=str(path.with_suffix(".vectors.npz")) if self.persist_vectors else None,
+                    detector=self.detector,
+                    dedup_threshold=self.dedup_threshold,
+                    retention=self.retention,
+                    ranker=self.ranker
+                )
+                self._shards[shard] = manager
+        return manager
+
+    def _user_shard(self, user_id: str) -> MemoryManager:
+        return self._shard(shard_of(user_id, self.shards))
+
+    def _stored_shards(self) -> List[int]:
+        """Shards with a file on disk or open in this process."""
+        stored = set(self._shards)
+        for path in self.storage_path.iterdir():
+            match = SHARD_PATTERN.match(path.name)
+            if match and int(match.group(1)) < self.shards:
+                stored.add(int(match.group(1)))
+        return sorted(stored)
+
+    def _record(self, shard: int, consolidated: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rewrite a shard's sidecar from its (opened) manager.
+
+        The sidecar is written under the shard's storage lock, after catching
+        up with writes by other processes sharing it, so the last sidecar
+        written always has the shard's latest counts.
+        """
+        manager = self._shard(shard)
+        with manager.synced():
+            if consolidated is None:
+                consolidated = (read_shard_stats(self.storage_path, shard) or {}).get("consolidated")
+            stats = write_shard_stats(
+                self.storage_path, shard, manager.user_counts(), manager.last_update, consolidated
+            )
+            self._stats[shard] = (stats_path(self.storage_path, shard).stat().st_mtime_ns, stats)
+        return stats
+
+    def _shard_stats(self, shard: int) -> Dict[str, Any]:
+        """A shard's sidecar, re-read only when another writer replaced it."""
+        try:
+            mtime = stats_path(self.storage_path, shard).stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        cached = self._stats.get(shard)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        stats = read_shard_stats(self.storage_path, shard) if mtime is not None else None
+        if stats is None:
+            # Shard written before sidecars existed: count it once
+            return self._record(shard)
+        self._stats[shard] = (mtime, stats)
+        return stats
+
+    @property
+    def last_update(self) -> Optional[str]:
+        """Most recent write to any shard."""
+        return max(
+            (stats["last_update"] for stats in map(self._shard_stats, self._stored_shards()) if stats["last_update"]),
+            default=None
+        )
+
+    def store_memories(self, items: List[Dict[str, Any]]) -> List[str]:
+        by_shard: Dict[int, List[int]] = {}
+        for position, item in enumerate(items):
+            user_id = item.get("user_id") or "default_user"
+            by_shard.setdefault(shard_of(user_id, self.shards), []).append(position)
+
+        memory_ids: List[Optional[str]] = [None] * len(items)
+        for shard, positions in by_shard.items():
+            stored = self._shard(shard).store_memories([items[position] for position in positions])
+            for position, memory_id in zip(positions, stored):
+                memory_ids[position] = memory_id
+            self._record(shard)
+        return memory_ids
+
+    def retrieve_memories(
+        self,
+        query: str,
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[Dict[str, Any]]:
+        return self._user_shard(user_id).retrieve_memories(query, user_id=user_id, limit=limit, mode=mode)
+
+    def retrieve_memories_bulk(
+        self,
+        queries: List[str],
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[List[Dict[str, Any]]]:
+        return self._user_shard(user_id).retrieve_memories_bulk(queries, user_id=user_id, limit=limit, mode=mode)
+
+    def delete_memories(self, user_id: str, memory_ids: Optional[List[str]] = None) -> int:
+        shard = shard_of(user_id, self.shards)
+        deleted = self._shard(shard).delete_memories(user_id, memory_ids)
+        if deleted:
+            self._record(shard)
+        return deleted
+
+    def sweep(self, user_ids: List[str]) -> Dict[str, int]:
+        by_shard: Dict[int, List[str]] = {}
+        for user_id in user_ids:
+            by_shard.setdefault(shard_of(user_id, self.shards), []).append(user_id)
+        totals = {"users": len(user_ids), "scanned": 0, "expired": 0, "evicted": 0}
+        quota = self.retention.user_quota
+        for shard, shard_users in by_shard.items():
+            if not self.retention.ttl and shard not in self._shards:
+                # Without TTLs only users over the quota can lose memories, and the sidecar knows who they are
+                counts = self._shard_stats(shard)["users"] if quota else {}
+                if not any(counts.get(user_id, 0) > quota for user_id in shard_users):
+                    continue
+            result = self._shard(shard).sweep(shard_users)
+            for key in ("scanned", "expired", "evicted"):
+                totals[key] += result[key]
+            if result["expired"] or result["evicted"]:
+                self._record(shard)
+        return totals
+
+    def consolidate(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        totals = {"users": 0, "scanned": 0, "reclaimed": 0}
+        for shard in self._stored_shards():
+            stats = self._shard_stats(shard)
+            if stats.get("consolidated") and stats["consolidated"] >= (stats["last_update"] or ""):
+                # Nothing written since the last pass, so nothing new to merge
+                continue
+            result = self._shard(shard).consolidate()
+            for key in totals:
+                totals[key] += result[key]
+            self._record(shard, consolidated=datetime.utcnow().isoformat())
+        totals["seconds"] = round(time.perf_counter() - start, 3)
+        return totals
+
+    def get_memory_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        if user_id:
+            count = self._shard_stats(shard_of(user_id, self.shards))["users"].get(user_id, 0)
+        else:
+            count = sum(sum(self._shard_stats(shard)["users"].values()) for shard in self._stored_shards())
+
+        return {
+            "total_memories": count,
+            "user_id": user_id,
+            "last_update": self.last_update,
+            "status": "operational"
+        }
+
+    def user_counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for shard in self._stored_shards():
+            counts.update(self._shard_stats(shard)["users"])
+        return counts
+
+    def flush_recalls(self) -> int:
+        return sum(self._shards[shard].flush_recalls() for shard in sorted(self._shards))
+
+    def close(self) -> None:
+        for shard in sorted(self._shards):
+            self._shards[shard].close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reshard a memory store: split a single-file store (or a sharded one) into a new sharded store."
+    )
+    parser.add_argument("source", help="Existing memories.json / log store, or sharded store directory")
+    parser.add_argument("shard_dir", help="Directory of the new sharded store")
+    parser.add_argument("--shards", type=int, default=64)
+    parser.add_argument("--backend", choices=["json", "log"], default="json", help="engine of the new shards")
+    parser.add_argument("--source-backend", choices=["json", "log"], default="json",
+                        help="engine of a single-file source")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        result = reshard(load_source(args.source, args.source_backend), args.shard_dir, args.shards, args.backend)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Wrote {result['memories']} memories of {result['users']} users into "
+          f"{result['shards']} of {args.shards} shards in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,416 @@
+"""SQLite-backed memory manager with indexed per-user queries."""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from memory_manager import MemoryManager
+from memory_dedup import DEFAULT_THRESHOLD, DedupIndex, find_duplicates, merge_metadata
+from memory_detector import MemoryDetector
+from memory_index import MIN_PREFIX, tokenize
+from memory_lifecycle import RetentionPolicy
+from memory_ranker import RERANK_POOL, HybridRanker
+from metrics import MEMORIES_MERGED, MEMORIES_RECLAIMED, MEMORIES_STORED, MEMORY_WRITE_SECONDS
+from semantic_index import SemanticIndex
+from storage import JSONFileStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    user_id TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    source TEXT NOT NULL DEFAULT '',
+    metadata TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_memories_user_timestamp ON memories (user_id, timestamp);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+    user_id, content, content='memories', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS memories_ai AFTER INSERT ON memories BEGIN
+    INSERT INTO memories_fts (rowid, user_id, content) VALUES (new.rowid, new.user_id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS memories_ad AFTER DELETE ON memories BEGIN
+    INSERT INTO memories_fts (memories_fts, rowid, user_id, content)
+    VALUES ('delete', old.rowid, old.user_id, old.content);
+END;
+"""
+
+COLUMNS = "m.id, m.content, m.user_id, m.timestamp, m.source, m.metadata"
+# When a memory was last stored or mentioned, as ``memory_lifecycle.last_seen`` reads it
+LAST_SEEN = (
+    "CASE WHEN json_type(m.metadata, '$.last_seen') = 'text' AND json_extract(m.metadata, '$.last_seen') != '' "
+    "THEN json_extract(m.metadata, '$.last_seen') ELSE m.timestamp END"
+)
+
+
+def _fts_phrase(text: str) -> str:
+    """Quote text as an FTS5 phrase."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _fts_term(token: str) -> str:
+    """A query token as an FTS5 term, matching longer words too once it is long enough."""
+    return _fts_phrase(token) + ("*" if len(token) >= MIN_PREFIX else "")
+
+
+class SQLiteMemoryManager(MemoryManager):
+    """
+    MemoryManager that keeps memories in SQLite instead of an in-process list.
+
+    The database runs in WAL mode so readers never block the writer. Per-user
+    counts and listings use the ``(user_id, timestamp)`` index, keyword recall
+    is answered by an FTS5 table ranked with its built-in BM25, and only the
+    semantic vectors of users that are actually searched are held in memory.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "./memories.db",
+        import_path: Optional[str] = None,
+        vector_path: Optional[str] = None,
+        detector: Optional[MemoryDetector] = None,
+        dedup_threshold: Optional[float] = DEFAULT_THRESHOLD,
+        retention: Optional[RetentionPolicy] = None,
+        ranker: Optional[HybridRanker] = None
+    ):
+        """
+        Initialize SQLite memory manager.
+
+        Args:
+            db_path: SQLite database file
+            import_path: Legacy JSON memory file imported when the database is empty
+            vector_path: Where to persist semantic embeddings; None keeps them in memory
+            detector: Memory-worthiness detector; defaults to the built-in patterns
+            dedup_threshold: Near-duplicate similarity for merging on write; None disables it
+            retention: TTLs and per-user quota (see ``MemoryManager``)
+            ranker: Hybrid recall ranker; defaults to ``HybridRanker()``
+        """
+        self.storage_path = Path(db_path)
+        self.detector = detector or MemoryDetector()
+        self.dedup_threshold = dedup_threshold
+        self.retention = retention or RetentionPolicy()
+        self.ranker = ranker or HybridRanker()
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self.last_update: Optional[str] = None
+        # Recalls not yet added to the stored counts: memory id -> recalls
+        self._recalls: Dict[str, int] = {}
+
+        self._db().executescript(SCHEMA)
+        if import_path and Path(import_path).exists() and not self.get_memory_stats()["total_memories"]:
+            self.import_memories(JSONFileStorage(import_path).load())
+        self.last_update = self._db().execute("SELECT MAX(timestamp) FROM memories").fetchone()[0]
+
+        self.semantic_index = SemanticIndex(self._user_memories, path=vector_path)
+        # Fingerprints of the users written to, loaded from the database on first write
+        self.dedup = DedupIndex(self._user_memories, dedup_threshold) if dedup_threshold else None
+
+    def _db(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.storage_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _sync(self) -> None:
+        """Every query reads the database, so writes by other processes are always visible."""
+
+    @staticmethod
+    def _row_to_memory(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "content": row["content"],
+            "user_id": row["user_id"],
+            "timestamp": row["timestamp"],
+            "source": row["source"],
+            "metadata": json.loads(row["metadata"])
+        }
+
+    def _user_memories(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self._db().execute(
+            f"SELECT {COLUMNS} FROM memories m WHERE m.user_id = ? ORDER BY m.timestamp, m.rowid",
+            (user_id,)
+        )
+        return [self._row_to_memory(row) for row in rows]
+
+    def _user_snapshot(self, user_id: str) -> List[Dict[str, Any]]:
+        return self._user_memories(user_id)
+
+    def import_memories(self, memories: List[Dict[str, Any]]) -> int:
+        """
+        Insert existing memory records (e.g. from ``memories.json``), keeping their ids.
+
+        Returns:
+            Number of records inserted; records whose id already exists are skipped
+        """
+        rows = [
+            (
+                m["id"], m.get("user_id") or "default_user", m["content"],
+                m.get("timestamp") or datetime.utcnow().isoformat(),
+                m.get("source") or "", json.dumps(m.get("metadata") or {}, ensure_ascii=False)
+            )
+            for m in memories
+        ]
+        with self._write_lock:
+            conn = self._db()
+            with conn:
+                before = conn.total_changes
+                conn.executemany(
+                    "INSERT OR IGNORE INTO memories (id, user_id, content, timestamp, source, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                return conn.total_changes - before
+
+    def store_memories(self, items: List[Dict[str, Any]]) -> List[str]:
+        timestamp = datetime.utcnow().isoformat()
+        records = [
+            {
+                "id": str(uuid.uuid4()),
+                "content": item["content"],
+                "user_id": item.get("user_id") or "default_user",
+                "timestamp": timestamp,
+                "source": item.get("source") or "",
+                "metadata": item.get("metadata") or {}
+            }
+            for item in items
+        ]
+        if not records:
+            return []
+
+        with self._write_lock:
+            targets = self._deduplicate(records)
+            new = [memory for memory, target in zip(records, targets) if target is memory]
+            merged = {}
+            for memory, target in zip(records, targets):
+                if target is not memory:
+                    target["metadata"] = merge_metadata(target, memory)
+                    merged[id(target)] = target
+            with MEMORY_WRITE_SECONDS.time():
+                self.import_memories(new)
+                # Records of this batch already went in with their merged metadata
+                inserted = {id(memory) for memory in new}
+                self._update_metadata(
+                    [target for key, target in merged.items() if key not in inserted], keep_recalls=True
+                )
+        with self._lock:
+            for memory in new:
+                self.semantic_index.add(memory)
+            self.last_update = timestamp
+        MEMORIES_STORED.inc(len(new))
+        MEMORIES_MERGED.inc(len(records) - len(new))
+        if self.retention.user_quota and new:
+            self._enforce_quota({memory["user_id"] for memory in new})
+        return [target["id"] for target in targets]
+
+    def _update_metadata(self, memories: List[Dict[str, Any]], keep_recalls: bool = False) -> None:
+        """
+        Write back the metadata of merged memories.
+
+        With ``keep_recalls`` the stored recall count wins over the one in
+        ``memories``, whose copies (e.g. the dedup index's) may predate the
+        latest ``flush_recalls``.
+        """
+        if not memories:
+            return
+        statement = "UPDATE memories SET metadata = ? WHERE id = ?"
+        if keep_recalls:
+            statement = (
+                "UPDATE memories SET metadata = CASE WHEN json_type(metadata, '$.recalls') IS NULL THEN ?1 "
+                "ELSE json_set(?1, '$.recalls', json_extract(metadata, '$.recalls')) END WHERE id = ?2"
+            )
+        conn = self._db()
+        with conn:
+            conn.executemany(
+                statement,
+                [(json.dumps(memory["metadata"], ensure_ascii=False), memory["id"]) for memory in memories]
+            )
+
+    def _note_recalls(self, results: List[List[Tuple[Dict[str, Any], float]]]) -> None:
+        """Count one recall of every memory returned by a search."""
+        recalled = {memory["id"] for hits in results for memory, _ in hits}
+        with self._lock:
+            for memory_id in recalled:
+                self._recalls[memory_id] = self._recalls.get(memory_id, 0) + 1
+
+    def flush_recalls(self) -> int:
+        """Add the recalls gathered since the last flush to the stored counts in one transaction."""
+        with self._lock:
+            pending, self._recalls = self._recalls, {}
+        if not pending:
+            return 0
+        with self._write_lock:
+            conn = self._db()
+            with conn:
+                # Incremented in SQL, so recalls flushed by other processes add up
+                conn.executemany(
+                    "UPDATE memories SET metadata = json_set(metadata, '$.recalls', "
+                    "coalesce(json_extract(metadata, '$.recalls'), 0) + ?) WHERE id = ?",
+                    [(count, memory_id) for memory_id, count in pending.items()]
+                )
+        return len(pending)
+
+    def _remove(self, user_id: str, memories: List[Dict[str, Any]]) -> int:
+        if not memories:
+            return 0
+        memory_ids = [memory["id"] for memory in memories]
+        with self._write_lock:
+            conn = self._db()
+            with conn:
+                removed = conn.executemany(
+                    "DELETE FROM memories WHERE id = ? AND user_id = ?",
+                    [(memory_id, user_id) for memory_id in memory_ids]
+                ).rowcount
+            if self.dedup is not None:
+                self.dedup.drop(user_id)
+        with self._lock:
+            self.semantic_index.remove(user_id, memory_ids)
+        return removed
+
+    def consolidate(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        threshold = self.dedup_threshold or DEFAULT_THRESHOLD
+        user_ids = [row[0] for row in self._db().execute("SELECT DISTINCT user_id FROM memories")]
+
+        scanned = reclaimed = 0
+        for user_id in user_ids:
+            with self._write_lock:
+                memories = self._user_memories(user_id)
+                scanned += len(memories)
+                kept, merges = find_duplicates(memories, threshold)
+                if not merges:
+                    continue
+                targets = {}
+                for target, duplicate in merges:
+                    target["metadata"] = merge_metadata(target, duplicate)
+                    targets[id(target)] = target
+                self._update_metadata(list(targets.values()))
+                conn = self._db()
+                with conn:
+                    conn.executemany("DELETE FROM memories WHERE id = ?", [(duplicate["id"],) for _, duplicate in merges])
+                reclaimed += len(merges)
+                if self.dedup is not None:
+                    self.dedup.drop(user_id)
+            with self._lock:
+                self.semantic_index.drop(user_id)
+
+        MEMORIES_RECLAIMED.inc(reclaimed)
+        return {
+            "users": len(user_ids),
+            "scanned": scanned,
+            "reclaimed": reclaimed,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+
+    def retrieve_memories(
+        self,
+        query: str,
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[Dict[str, Any]]:
+        if mode == "semantic":
+            return self.retrieve_memories_bulk([query], user_id=user_id, limit=limit, mode=mode)[0]
+        results = self._keyword_search(query, user_id, limit)
+        self._note_recalls([results])
+        return [{**memory, "score": round(score, 4)} for memory, score in results]
+
+    def _keyword_search(self, query: str, user_id: str, limit: int) -> List[Tuple[Dict[str, Any], float]]:
+        """Rank a user's live memories against ``query`` with FTS5 and the hybrid ranker."""
+        # Fetch extra candidates so the hybrid score can promote one past the cut
+        pool = limit * RERANK_POOL
+        now = time.time()
+        conn = self._db()
+        results = []
+        tokens = tokenize(query)
+        if tokens:
+            # Prefix terms stand in for the old substring scan: "recip" finds "recipes"
+            match = f"user_id : {_fts_phrase(user_id)} AND content : ({' OR '.join(map(_fts_term, tokens))})"
+            # Expired memories are left out before the LIMIT, so they cannot crowd live ones out of the pool
+            live, params = "", []
+            for memory_type, cutoff in self.retention.cutoffs(now).items():
+                live += f" AND NOT (json_extract(m.metadata, '$.type') IS ? AND {LAST_SEEN} < ?)"
+                params += [memory_type, cutoff]
+            rows = conn.execute(
+                f"SELECT {COLUMNS}, -bm25(memories_fts) AS score "
+                "FROM memories_fts JOIN memories m ON m.rowid = memories_fts.rowid "
+                f"WHERE memories_fts MATCH ? AND m.user_id = ?{live} "
+                "ORDER BY bm25(memories_fts), m.rowid LIMIT ?",
+                (match, user_id, *params, pool)
+            )
+            results = [(self._row_to_memory(row), row["score"]) for row in rows]
+        return self.ranker.rank(results, limit, now, self.retention.live(now))
+
+    def retrieve_memories_bulk(
+        self,
+        queries: List[str],
+        user_id: str = "default_user",
+        limit: int = 5,
+        mode: str = "keyword"
+    ) -> List[List[Dict[str, Any]]]:
+        if mode == "semantic":
+            with self._lock:
+                pools = self.semantic_index.search_many(queries, user_id=user_id, limit=limit * RERANK_POOL)
+            now = time.time()
+            keep = self.retention.live(now)
+            results = [self.ranker.rank(hits, limit, now, keep) for hits in pools]
+        else:
+            # Each FTS5 query is an index lookup, so there is no shared scan to batch
+            results = [self._keyword_search(query, user_id, limit) for query in queries]
+        self._note_recalls(results)
+        return [
+            [{**memory, "score": round(score, 4)} for memory, score in hits]
+            for hits in results
+        ]
+
+    def get_memory_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        conn = self._db()
+        if user_id:
+            count = conn.execute("SELECT COUNT(*) FROM memories WHERE user_id = ?", (user_id,)).fetchone()[0]
+        else:
+            count = conn.execute("SELECT COUNT(*) FROM memories").fetchone()[0]
+
+        return {
+            "total_memories": count,
+            "user_id": user_id,
+            "last_update": self.last_update,
+            "status": "operational"
+        }
+
+    def user_counts(self) -> Dict[str, int]:
+        rows = self._db().execute("SELECT user_id, COUNT(*) FROM memories GROUP BY user_id")
+        return {user_id: count for user_id, count in rows}
+
+    def close(self) -> None:
+        self.flush_recalls()
+        with self._lock:
+            self.semantic_index.save()
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import a JSON memory file into a SQLite memory database.")
+    parser.add_argument("json_path", help="Existing memories.json")
+    parser.add_argument("db_path", help="SQLite database to create or extend")
+    args = parser.parse_args()
+
+    manager = SQLiteMemoryManager(args.db_path)
+    inserted = manager.import_memories(JSONFileStorage(args.json_path).load())
+    print(f"Imported {inserted} memories into {args.db_path}")
+    manager.close()
@@ -0,0 +1,485 @@
+"""Storage engines for persisting memories to disk."""
+import json
+import logging
+import os
+import shutil
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStorage:
+    """Base class for memory storage engines."""
+
+    # True when other processes may write to the same files
+    shared = False
+
+    def load(self) -> List[Dict[str, Any]]:
+        """Load all persisted memories."""
+        raise NotImplementedError
+
+    def append(self, records: List[Dict[str, Any]], memories: Iterable[Dict[str, Any]]) -> None:
+        """
+        Persist newly stored or updated memories.
+
+        Args:
+            records: Memories added or changed since the last call
+            memories: Full in-memory collection, already including ``records``
+        """
+        raise NotImplementedError
+
+    def delete(self, ids: List[str], memories: Iterable[Dict[str, Any]]) -> None:
+        """
+        Persist the removal of memories.
+
+        Args:
+            ids: Ids of the removed memories
+            memories: Full in-memory collection, already without them
+        """
+        raise NotImplementedError
+
+    def rewrite(self, memories: Iterable[Dict[str, Any]]) -> None:
+        """Replace the persisted state with ``memories``."""
+        raise NotImplementedError
+
+    def refresh(self) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Return ``(reloaded, records)`` written by other processes since the
+        last call, where ``records`` are log entries (``{"op": "put",
+        "data": memory}`` or ``{"op": "delete", "id": ...}``) unless the
+        store was reloaded. Single-process engines have nothing to report.
+        """
+        return False, []
+
+    def locked(self):
+        """
+        Context in which no other process writes the store, for keeping
+        files derived from it (e.g. shard stats) consistent. Re-entrant
+        within a thread; a no-op for single-process engines.
+        """
+        return nullcontext()
+
+    def close(self) -> None:
+        """Flush pending work and release file handles."""
+
+
+class JSONFileStorage(MemoryStorage):
+    """Stores all memories in a single JSON array, rewritten on every write."""
+
+    def __init__(self, path: str = "./memories.json"):
+        self.path = Path(path)
+
+    def load(self) -> List[Dict[str, Any]]:
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error loading memories: {e}")
+                return []
+        return []
+
+    def append(self, records: List[Dict[str, Any]], memories: Iterable[Dict[str, Any]]) -> None:
+        self.rewrite(memories)
+
+    def delete(self, ids: List[str], memories: Iterable[Dict[str, Any]]) -> None:
+        self.rewrite(memories)
+
+    def rewrite(self, memories: Iterable[Dict[str, Any]]) -> None:
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump([dict(memory) for memory in memories], f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"Error saving memories: {e}")
+
+
+class LogStorage(MemoryStorage):
+    """
+    Append-only write-ahead log with periodic snapshot compaction.
+
+    Each write appends one JSON line per memory to ``<name>.wal.jsonl`` (a
+    ``put``, or a ``delete`` naming a removed id), so write cost is
+    independent of store size. Once the log holds
+    ``compact_threshold`` records it is rotated aside and folded into
+    ``<name>.snapshot.jsonl`` on a background thread. On startup the snapshot
+    is loaded and any remaining log segments are replayed on top of it;
+    a torn final line left by a crash is discarded.
+
+    With ``shared=True`` several processes (e.g. uvicorn workers) can use the
+    same files. Appends and compaction take an exclusive ``flock`` on
+    ``<name>.lock``; each process remembers how far into the log it has read
+    and ``refresh`` returns only the records other processes appended since.
+    Compaction runs inline under the lock, bumps the generation number in
+    ``<name>.gen`` and keeps the compacted log as ``<name>.wal.<gen>.jsonl``
+    until the next compaction, so a process one generation behind can still
+    catch up incrementally; anything further behind reloads in full.
+    """
+
+    def __init__(
+        self,
+        path: str = "./memories.json",
+        compact_threshold: int = 10000,
+        fsync: bool = False,
+        shared: bool = False
+    ):
+        if shared and fcntl is None:
+            raise RuntimeError("Shared log storage requires fcntl (POSIX)")
+
+        base = Path(path)
+        self.legacy_path = base
+        self.snapshot_path = base.with_suffix(".snapshot.jsonl")
+        self.log_path = base.with_suffix(".wal.jsonl")
+        self.compacting_path = base.with_suffix(".wal.compacting.jsonl")
+        self.lock_path = base.with_suffix(".lock")
+        self.generation_path = base.with_suffix(".gen")
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        # Depth of the cross-process lock held by the current thread
+        self._held = threading.local()
+        self._log_file = None
+        self._log_records = 0
+        self._compaction: Optional[threading.Thread] = None
+
+        # Multi-process state: generation and byte offset of the log we have read
+        self._generation = 0
+        self._offset = 0
+        self._pending: List[Dict[str, Any]] = []
+        self._stale = False
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold the cross-process lock (no-op unless shared); re-entrant within a thread."""
+        depth = getattr(self._held, "depth", 0)
+        if not self.shared or depth:
+            self._held.depth = depth + 1
+            try:
+                yield
+            finally:
+                self._held.depth = depth
+            return
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            self._held.depth = 1
+            try:
+                yield
+            finally:
+                self._held.depth = 0
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def locked(self):
+        return self._file_lock()
+
+    def _read_generation(self) -> int:
+        try:
+            return int(self.generation_path.read_text() or 0)
+        except FileNotFoundError:
+            return 0
+
+    # ------------------------------------------------------------------
+    # Loading / replay
+    # ------------------------------------------------------------------
+
+    def load(self) -> List[Dict[str, Any]]:
+        with self._file_lock():
+            return self._load()
+
+    def _load(self) -> List[Dict[str, Any]]:
+        records: Dict[str, Dict[str, Any]] = {}
+        self._generation = self._read_generation()
+
+        if self.snapshot_path.exists():
+            for memory in self._read_lines(self.snapshot_path):
+                records[memory["id"]] = memory
+        elif self.legacy_path.exists() and not self.log_path.exists():
+            records = self._migrate_legacy()
+
+        # A leftover compacting segment means we crashed mid-compaction; replaying
+        # it is safe because records are keyed by id.
+        for segment in (self.compacting_path, self.log_path):
+            if segment.exists():
+                count = 0
+                for entry in self._read_lines(segment):
+                    self._apply(records, entry)
+                    count += 1
+                if segment == self.log_path:
+                    self._log_records = count
+
+        self._offset = self.log_path.stat().st_size if self.log_path.exists() else 0
+        self._pending = []
+        self._stale = False
+        return list(records.values())
+
+    def refresh(self) -> Tuple[bool, List[Dict[str, Any]]]:
+        """
+        Pick up writes made by other processes.
+
+        Returns:
+            ``(False, entries)`` with the log entries appended since the last
+            call, or ``(True, all_records)`` when a compaction elsewhere means
+            the store had to be reloaded in full
+        """
+        if not self.shared:
+            return False, []
+        with self._lock, self._file_lock():
+            if not self._catch_up():
+                return True, self._load()
+            entries, self._pending = self._pending, []
+
+        return False, entries
+
+    def _catch_up(self) -> bool:
+        """
+        Queue log entries other processes wrote since our last read; caller
+        holds both locks.
+
+        Returns:
+            False if we fell too far behind and must reload in full
+        """
+        if self._stale:
+            return False
+        generation = self._read_generation()
+        if generation != self._generation:
+            retired = self._retired_log_path(self._generation)
+            if generation != self._generation + 1 or not retired.exists():
+                return False
+            self._pending.extend(self._read_from_offset(retired))
+            self._generation = generation
+            self._offset = 0
+            self._log_records = 0
+
+        fresh = self._read_from_offset(self.log_path)
+        self._log_records += len(fresh)
+        self._pending.extend(fresh)
+        return True
+
+    def _retired_log_path(self, generation: int) -> Path:
+        return self.log_path.with_suffix(f".{generation}.jsonl")
+
+    def _read_from_offset(self, path: Path) -> List[Dict[str, Any]]:
+        """Read complete log lines past our offset; a line still being written is left for later."""
+        entries = []
+        if not path.exists() or path.stat().st_size <= self._offset:
+            return entries
+        with open(path, 'rb') as f:
+            f.seek(self._offset)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                entries.append(json.loads(raw))
+                self._offset += len(raw)
+        return entries
+
+    def _migrate_legacy(self) -> Dict[str, Dict[str, Any]]:
+        """Import a legacy ``memories.json`` array into a fresh snapshot."""
+        legacy = JSONFileStorage(str(self.legacy_path)).load()
+        logger.info(f"Migrating {len(legacy)} memories from {self.legacy_path} to {self.snapshot_path}")
+        self._write_snapshot(legacy)
+        return {memory["id"]: memory for memory in legacy}
+
+    @staticmethod
+    def _apply(records: Dict[str, Dict[str, Any]], entry: Dict[str, Any]) -> None:
+        op = entry.get("op")
+        if op == "put":
+            memory = entry["data"]
+            records[memory["id"]] = memory
+        elif op == "delete":
+            records.pop(entry["id"], None)
+        else:
+            logger.warning(f"Skipping unknown log operation: {op}")
+
+    def _read_lines(self, path: Path) -> List[Dict[str, Any]]:
+        """Read a JSON Lines file, truncating a torn trailing record."""
+        entries = []
+        valid_bytes = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    entries.append(json.loads(raw))
+                except ValueError:
+                    break
+                valid_bytes += len(raw)
+
+        if valid_bytes < path.stat().st_size:
+            logger.warning(f"Discarding torn tail of {path} at byte {valid_bytes}")
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+        return entries
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, records: List[Dict[str, Any]], memories: Iterable[Dict[str, Any]]) -> None:
+        self._write_entries([{"op": "put", "data": dict(memory)} for memory in records], memories)
+
+    def delete(self, ids: List[str], memories: Iterable[Dict[str, Any]]) -> None:
+        self._write_entries([{"op": "delete", "id": memory_id} for memory_id in ids], memories)
+
+    def _write_entries(self, entries: List[Dict[str, Any]], memories: Iterable[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        if self.shared:
+            self._append_shared(lines, len(entries))
+            return
+
+        with self._lock:
+            f = self._open_log()
+            f.write(lines)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+            self._log_records += len(entries)
+
+            if self._log_records >= self.compact_threshold and not self._compacting():
+                self._start_compaction(list(memories))
+
+    def _append_shared(self, lines: str, count: int) -> None:
+        with self._lock, self._file_lock():
+            # Collect what other processes wrote so our offset can move past our own lines
+            if not self._catch_up():
+                # Our offset is meaningless until the next refresh reloads
+                self._stale = True
+
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                end = f.tell()
+
+            if not self._stale:
+                self._offset = end
+                self._log_records += count
+                if self._log_records >= self.compact_threshold:
+                    self._compact_shared()
+
+    def _compact_shared(self) -> None:
+        """Fold the log into the snapshot while holding the file lock."""
+        records: Dict[str, Dict[str, Any]] = {}
+        if self.snapshot_path.exists():
+            for memory in self._read_lines(self.snapshot_path):
+                records[memory["id"]] = memory
+        for entry in self._read_lines(self.log_path):
+            self._apply(records, entry)
+
+        self._write_snapshot(list(records.values()))
+        os.replace(self.log_path, self._retired_log_path(self._generation))
+        self._retired_log_path(self._generation - 1).unlink(missing_ok=True)
+        generation = self._generation + 1
+        self._write_generation(generation)
+
+        self._generation = generation
+        self._offset = 0
+        self._log_records = 0
+
+    def rewrite(self, memories: Iterable[Dict[str, Any]]) -> None:
+        self.wait_for_compaction()
+        with self._lock, self._file_lock():
+            self._close_log()
+            self._write_snapshot(memories)
+            for segment in (self.compacting_path, self.log_path):
+                segment.unlink(missing_ok=True)
+            self._log_records = 0
+            if self.shared:
+                # Drop the retired log so lagging processes reload in full
+                generation = self._read_generation()
+                self._retired_log_path(generation - 1).unlink(missing_ok=True)
+                self._write_generation(generation + 1)
+                self._generation = generation + 1
+                self._offset = 0
+                self._pending = []
+
+    def _write_generation(self, generation: int) -> None:
+        tmp_path = self.generation_path.with_suffix(".tmp")
+        tmp_path.write_text(str(generation))
+        os.replace(tmp_path, self.generation_path)
+
+    def close(self) -> None:
+        self.wait_for_compaction()
+        with self._lock:
+            self._close_log()
+
+    def _open_log(self):
+        if self._log_file is None:
+            self._log_file = open(self.log_path, 'a', encoding='utf-8')
+        return self._log_file
+
+    def _close_log(self) -> None:
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _write_snapshot(self, memories: List[Dict[str, Any]]) -> None:
+        """Atomically replace the snapshot file."""
+        tmp_path = self.snapshot_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for memory in memories:
+                f.write(json.dumps(dict(memory), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def _compacting(self) -> bool:
+        return self._compaction is not None and self._compaction.is_alive()
+
+    def _start_compaction(self, memories: List[Dict[str, Any]]) -> None:
+        """Rotate the live log aside and fold it into a snapshot in the background."""
+        self._close_log()
+        if self.compacting_path.exists():
+            # An earlier compaction failed: its segment is only safe to drop once a snapshot covers it
+            with open(self.log_path, 'rb') as log, open(self.compacting_path, 'ab') as segment:
+                shutil.copyfileobj(log, segment)
+                segment.flush()
+                os.fsync(segment.fileno())
+            self.log_path.unlink()
+        else:
+            os.replace(self.log_path, self.compacting_path)
+        self._log_records = 0
+
+        def compact():
+            try:
+                self._write_snapshot(memories)
+                self.compacting_path.unlink(missing_ok=True)
+            except Exception as e:
+                logger.error(f"Error compacting memory log: {e}")
+
+        self._compaction = threading.Thread(target=compact, name="memory-log-compaction", daemon=True)
+        self._compaction.start()
+
+    def wait_for_compaction(self) -> None:
+        """Block until any running compaction has finished."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+
+def create_storage(
+    backend: str,
+    path: str,
+    compact_threshold: int = 10000,
+    shared: bool = False
+) -> MemoryStorage:
+    """Build the storage engine selected by configuration."""
+    if shared and backend != "log":
+        raise ValueError("Multi-process mode requires the log storage backend")
+    if backend == "json":
+        return JSONFileStorage(path)
+    if backend == "log":
+        return LogStorage(path, compact_threshold=compact_threshold, shared=shared)
+    raise ValueError(f"Unknown memory storage backend: {backend}")
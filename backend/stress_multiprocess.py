@@ -0,0 +1,102 @@
+"""Multi-process stress test for the shared log storage engine.
+
+Usage:
+    python stress_multiprocess.py [--workers 8] [--writes 2000] [--batch 5] [--compact-threshold 500]
+
+Starts --workers processes that each store --writes memories through their
+own MemoryManager on the same files, with a low compaction threshold so
+compactions race with appends. Every worker also recalls between writes to
+exercise the incremental reload. The run fails unless a fresh load, and
+every worker's own view after a final refresh, contain exactly
+workers * writes unique memories.
+"""
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from memory_manager import MemoryManager
+from storage import LogStorage
+
+
+def worker(
+    path: str, worker_id: int, writes: int, batch: int, compact_threshold: int, start, finished, results
+) -> None:
+    manager = MemoryManager(storage=LogStorage(path, compact_threshold=compact_threshold, shared=True))
+    user_id = f"user_{worker_id}"
+    start.wait()
+
+    began = time.perf_counter()
+    for i in range(0, writes, batch):
+        manager.store_memories([
+            {"content": f"worker {worker_id} remembers item {j}", "user_id": user_id}
+            for j in range(i, min(i + batch, writes))
+        ])
+        manager.retrieve_memories("remembers item", user_id=f"user_{(worker_id + 1) % 2}", limit=3)
+    elapsed = time.perf_counter() - began
+
+    # Refresh only once every worker has written, so each view should hold every write
+    finished.wait()
+    results.put((worker_id, elapsed, manager.get_memory_stats()["total_memories"]))
+    manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=5)
+    parser.add_argument("--compact-threshold", type=int, default=500)
+    args = parser.parse_args()
+
+    expected = args.workers * args.writes
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "memories.json")
+        ctx = multiprocessing.get_context("spawn")
+        start = ctx.Event()
+        finished = ctx.Barrier(args.workers)
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(
+                target=worker,
+                args=(path, i, args.writes, args.batch, args.compact_threshold, start, finished, results)
+            )
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        start.set()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+        memories = LogStorage(path, shared=True).load()
+        unique = len({memory["id"] for memory in memories})
+        per_user = {}
+        for memory in memories:
+            per_user[memory["user_id"]] = per_user.get(memory["user_id"], 0) + 1
+
+    slowest = max(elapsed for _, elapsed, _ in reports)
+    print(f"{args.workers} workers x {args.writes} writes in {slowest:.2f}s "
+          f"({expected / slowest:,.0f} writes/s overall)")
+    print(f"on disk: {len(memories)} records, {unique} unique (expected {expected})")
+
+    failures = []
+    if len(memories) != expected or unique != expected:
+        failures.append("records lost or duplicated on disk")
+    if any(count != args.writes for count in per_user.values()) or len(per_user) != args.workers:
+        failures.append(f"uneven per-worker counts: {per_user}")
+    for worker_id, _, seen in sorted(reports):
+        if seen != expected:
+            failures.append(f"worker {worker_id} saw {seen} memories after its final refresh")
+
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK: no writes lost")
+
+
+if __name__ == "__main__":
+    main()
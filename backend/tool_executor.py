@@ -0,0 +1,155 @@
+"""Concurrent execution of the function calls in a model turn."""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+import google.generativeai as genai
+
+from metrics import TOOL_CALL_SECONDS
+
+# Passed with the last message of a turn once the round limit is reached,
+# so the model has to answer in text
+NO_TOOLS = {"function_calling_config": {"mode": "NONE"}}
+
+ROUND_LIMIT_MESSAGE = "Tool call limit reached for this turn; answer with the information you already have."
+
+
+@dataclass
+class ToolResult:
+    """Outcome of one function call."""
+    name: str
+    args: Dict[str, Any]
+    result: str
+    status: str  # "ok", "error", "timeout" or "skipped"
+    latency: float
+
+
+class ToolLatency:
+    __slots__ = ("calls", "errors", "timeouts", "total_seconds", "max_seconds", "last_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        avg = self.total_seconds / self.calls if self.calls else 0.0
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "last_ms": round(self.last_seconds * 1000, 3),
+            "avg_ms": round(avg * 1000, 3),
+            "max_ms": round(self.max_seconds * 1000, 3),
+        }
+
+
+def function_calls(parts: Iterable[Any]) -> List[Any]:
+    """Every function-call part in a model response, in order."""
+    return [part.function_call for part in parts if part.function_call]
+
+
+class ToolExecutor:
+    """
+    Runs the function calls the model asks for and packages their results.
+
+    All calls in one model response run concurrently, each under ``timeout``
+    seconds, and their results go back to the model together in a single
+    message. A call to a tool that is not registered, a call that raises and
+    a call that times out each produce an error result instead of failing
+    the turn. The conversation handler allows at most ``max_rounds`` rounds
+    of tool calls per turn.
+    """
+
+    def __init__(self, timeout: float = 10.0, max_rounds: int = 3):
+        """
+        Args:
+            timeout: Seconds each call may take before it is abandoned
+            max_rounds: Maximum rounds of tool calls in one turn
+        """
+        self.timeout = timeout
+        self.max_rounds = max_rounds
+        self.tools: Dict[str, Callable[..., Awaitable[str]]] = {}
+
+        self._lock = threading.Lock()
+        self._latency: Dict[str, ToolLatency] = {}
+        self.rounds = 0
+        self.round_limit_hits = 0
+
+    def register(self, name: str, function: Callable[..., Awaitable[str]]) -> None:
+        """Make ``function`` callable by the model as ``name``; it receives the call's args as keywords."""
+        self.tools[name] = function
+
+    async def _call(self, function_call: Any) -> ToolResult:
+        name = function_call.name
+        args = dict(function_call.args or {})
+        function = self.tools.get(name)
+        if function is None:
+            return ToolResult(name, args, f"Unknown tool: {name}", "error", 0.0)
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(function(**args), self.timeout)
+            status = "ok"
+        except asyncio.TimeoutError:
+            result, status = f"Tool {name} timed out after {self.timeout:g}s", "timeout"
+        except Exception as e:
+            result, status = f"Error running {name}: {str(e)}", "error"
+        latency = time.perf_counter() - start
+
+        with self._lock:
+            stats = self._latency.setdefault(name, ToolLatency())
+            stats.calls += 1
+            stats.errors += status == "error"
+            stats.timeouts += status == "timeout"
+            stats.total_seconds += latency
+            stats.max_seconds = max(stats.max_seconds, latency)
+            stats.last_seconds = latency
+        TOOL_CALL_SECONDS.observe(latency, tool=name, status=status)
+        return ToolResult(name, args, str(result), status, latency)
+
+    async def run(self, calls: List[Any]) -> List[ToolResult]:
+        """Run ``calls`` concurrently; results are in the same order as the calls."""
+        with self._lock:
+            self.rounds += 1
+        return list(await asyncio.gather(*(self._call(call) for call in calls)))
+
+    def skip(self, calls: List[Any]) -> List[ToolResult]:
+        """Answer ``calls`` without running them, once the round limit is reached."""
+        with self._lock:
+            self.round_limit_hits += 1
+        return [
+            ToolResult(call.name, dict(call.args or {}), ROUND_LIMIT_MESSAGE, "skipped", 0.0)
+            for call in calls
+        ]
+
+    @staticmethod
+    def content(results: List[ToolResult]) -> "genai.protos.Content":
+        """All results as one function-response message for the model."""
+        return genai.protos.Content(
+            parts=[
+                genai.protos.Part(
+                    function_response=genai.protos.FunctionResponse(
+                        name=result.name,
+                        response={"result": result.result}
+                    )
+                )
+                for result in results
+            ]
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            per_tool = {name: stats.stats() for name, stats in self._latency.items()}
+        return {
+            "timeout_seconds": self.timeout,
+            "max_rounds": self.max_rounds,
+            "rounds": self.rounds,
+            "round_limit_hits": self.round_limit_hits,
+            "tools": per_tool,
+        }
@@ -1,5 +1,8 @@
 """Web search functionality using Tavily AI."""
+import asyncio
+from typing import Dict, Any
 from tavily import TavilyClient
+from cache import TTLCache
 from config import settings
 
 
@@ -13,11 +16,26 @@ class WebSearch:
             self.client = None
         else:
             self.client = TavilyClient(api_key=settings.tavily_api_key)
+        
+        # Cache of formatted results keyed on normalized query + max_results
+        self.cache = TTLCache(
+            max_size=settings.web_search_cache_size,
+            ttl_seconds=settings.web_search_cache_ttl,
+            path=settings.web_search_cache_path or None
+        )
+    
+    @staticmethod
+    def _cache_key(query: str, max_results: int) -> str:
+        """Normalize case and whitespace so trivially different queries share an entry."""
+        return f"{' '.join(query.lower().split())}|{max_results}"
     
     def search(self, query: str, max_results: int = 5) -> str:
         """
         Search the web for information.
         
+        Results are served from a TTL/LRU cache when possible; concurrent
+        identical queries share a single Tavily call.
+        
         Args:
             query: Search query
             max_results: Maximum number of results to return
@@ -29,34 +47,51 @@ class WebSearch:
             return "Web search is not available (API key not configured)."
         
         try:
-            # Perform search
-            response = self.client.search(
-                query=query,
-                max_results=max_results,
-                search_depth="basic"
+            return self.cache.get_or_compute(
+                self._cache_key(query, max_results),
+                lambda: self._fetch(query, max_results)
             )
-            
-            # Format results
-            if not response.get("results"):
-                return f"No results found for: {query}"
-            
-            formatted_results = [f"Search results for: {query}\n"]
-            
-            for i, result in enumerate(response["results"][:max_results], 1):
-                title = result.get("title", "No title")
-                content = result.get("content", "No content")
-                url = result.get("url", "")
-                
-                formatted_results.append(
-                    f"{i}. {title}\n"
-                    f"   {content}\n"
-                    f"   Source: {url}\n"
-                )
-            
-            return "\n".join(formatted_results)
-            
         except Exception as e:
             return f"Error performing web search: {str(e)}"
+    
+    def _fetch(self, query: str, max_results: int) -> str:
+        """Call Tavily and format the results."""
+        response = self.client.search(
+            query=query,
+            max_results=max_results,
+            search_depth="basic"
+        )
+        
+        # Format results
+        if not response.get("results"):
+            return f"No results found for: {query}"
+        
+        formatted_results = [f"Search results for: {query}\n"]
+        
+        for i, result in enumerate(response["results"][:max_results], 1):
+            title = result.get("title", "No title")
+            content = result.get("content", "No content")
+            url = result.get("url", "")
+            
+            formatted_results.append(
+                f"{i}. {title}\n"
+                f"   {content}\n"
+                f"   Source: {url}\n"
+            )
+        
+        return "\n".join(formatted_results)
+    
+    async def search_async(self, query: str, max_results: int = 5) -> str:
+        """Run ``search`` in a worker thread so it does not block the event loop."""
+        return await asyncio.to_thread(self.search, query, max_results)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics for the stats endpoint."""
+        return self.cache.stats()
+    
+    def close(self) -> None:
+        """Persist the result cache, if configured."""
+        self.cache.save()
 
 
 # Global web search instance